@@ -3,24 +3,25 @@ This module initializes the flask app
 """
 
 from flask import Flask
-from flask_executor import Executor
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from application.config import Config
 
 
 db = SQLAlchemy()
-executor = Executor()
 ma = Marshmallow()
 
 
 def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+    from application.ingest.upload_utility import WxDataRequest
+
+    # Streams /ingest/single uploads to disk while the request body is parsed
+    app.request_class = WxDataRequest
 
     with app.app_context():
         db.init_app(app)
-        executor.init_app(app)
         ma.init_app(app)
 
         from application.home.routes import HOME
@@ -33,4 +34,15 @@ def create_app(config_class=Config):
         app.register_blueprint(ANALYTICS)
         app.register_blueprint(api, url_prefix="/api")
 
+        # Create tables added since database.db was first generated
+        db.create_all()
+        # Bring tables created by earlier versions to the current layout
+        from application.migrations import migrations_runner
+
+        migrations_runner()
+        # Readers keep querying while ingestion jobs write; the journal mode is persistent,
+        # so it is switched once here
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA journal_mode = WAL")
+
     return app
@@ -0,0 +1,202 @@
+"""
+Contains the optional columnar copy of 'readings' used for scan-heavy analytics
+The store is a Parquet dataset with one file per station, <COLUMNAR_STORE_DIR>/station_id=<station>/,
+holding one row group per year; it requires pyarrow and is skipped when pyarrow is not installed
+"""
+
+import os
+import shutil
+from flask import current_app
+from sqlalchemy import select
+from application import db
+from application.data_model import Readings, READINGS_SCALING_FACTORS
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+COLUMNAR_FILENAME = "readings.parquet"
+COLUMNAR_GROUP_BY = {
+    "year_station": ["year", "station_id"],
+    "station": ["station_id"],
+    "year": ["year"],
+}
+
+
+def columnar_store_available():
+    """
+    True when pyarrow is installed and Config.COLUMNAR_STORE_ENABLED is set
+    """
+    return pa is not None and current_app.config["COLUMNAR_STORE_ENABLED"]
+
+
+def columnar_station_writer(station_directory, station_table):
+    """
+    Atomically replaces a station file with 'station_table', sorted by date, one row group per year
+    Row group statistics let year filters skip the other years of the file
+    """
+    os.makedirs(station_directory, exist_ok=True)
+    # Hidden files are ignored by dataset discovery until they are renamed in place
+    temporary_file_path = f"{station_directory}/.{COLUMNAR_FILENAME}"
+    with pq.ParquetWriter(temporary_file_path, station_table.schema) as writer:
+        offset = 0
+        for year_count in pc.value_counts(station_table["year"]).field("counts"):
+            writer.write_table(station_table.slice(offset, year_count.as_py()))
+            offset = offset + year_count.as_py()
+    os.replace(temporary_file_path, f"{station_directory}/{COLUMNAR_FILENAME}")
+
+
+def columnar_partitions_writer(partitions=None):
+    """
+    Rewrites station files of the columnar store from 'readings'
+    Measurements are kept as the raw wx_data integers, like in 'readings'
+    Params: partitions --> set of (year, station) changed; their whole station files are
+            rewritten. None rebuilds the whole store
+    Returns the number of records written
+    """
+    store_directory = current_app.config["COLUMNAR_STORE_DIR"]
+    if partitions is None:
+        shutil.rmtree(store_directory, ignore_errors=True)
+        stations = [
+            station
+            for (station,) in db.session.query(Readings.station_id)
+            .distinct()
+            .order_by(Readings.station_id)
+        ]
+    else:
+        stations = sorted({station for _, station in partitions})
+    # Plain table columns skip ORM row processing
+    readings_table = Readings.__table__
+    written_records = 0
+    for station in stations:
+        readings_rows = (
+            db.session.connection()
+            .execute(
+                select(
+                    readings_table.c.date,
+                    *[readings_table.c[column] for column in READINGS_SCALING_FACTORS],
+                )
+                .where(readings_table.c.station_id == station)
+                .order_by(readings_table.c.date)
+            )
+            .all()
+        )
+        if len(readings_rows) == 0:
+            continue
+        dates, *measurements = zip(*readings_rows)
+        dates = pa.array(dates, type=pa.int32())
+        station_table = pa.table(
+            {
+                "date": dates,
+                **{
+                    column: pa.array(values, type=pa.int16())
+                    for column, values in zip(READINGS_SCALING_FACTORS, measurements)
+                },
+                "year": pc.divide(dates, 10000),
+            }
+        )
+        columnar_station_writer(
+            station_directory=f"{store_directory}/station_id={station}",
+            station_table=station_table,
+        )
+        written_records = written_records + len(readings_rows)
+    return written_records
+
+
+def columnar_dataset():
+    """
+    Opens the columnar store as a memory-mapped Parquet dataset
+    Returns None when nothing has been written yet
+    """
+    store_directory = current_app.config["COLUMNAR_STORE_DIR"]
+    if not os.path.isdir(store_directory):
+        return None
+    dataset = ds.dataset(
+        store_directory,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("station_id", pa.string())]), flavor="hive"
+        ),
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+    )
+    if len(dataset.files) == 0:
+        return None
+    return dataset
+
+
+def columnar_partition_keys():
+    """
+    Lists the (year, station) partitions of the columnar store, reading the year column only
+    """
+    dataset = columnar_dataset()
+    if dataset is None:
+        return set()
+    partition_keys = (
+        dataset.to_table(columns=["year", "station_id"])
+        .group_by(["year", "station_id"])
+        .aggregate([])
+    )
+    return set(
+        zip(
+            partition_keys["year"].to_pylist(), partition_keys["station_id"].to_pylist()
+        )
+    )
+
+
+def columnar_aggregates(group_by="year_station", stations=None, years=None):
+    """
+    Scans the columnar store into per-group counts and sums of scaled measurements
+    Only the measurement and grouping columns are read (column pruning) and station/year filters
+    skip whole station files and year row groups (predicate pushdown)
+    Params: group_by --> key of COLUMNAR_GROUP_BY
+            stations --> optional iterable of stations to include
+            years --> optional (first year, last year) range to include
+    Returns a list of dicts with the group keys, 'date_count' (days) and
+    '<measurement>_count' / '<measurement>_sum' (non-missing values)
+    """
+    dataset = columnar_dataset()
+    if dataset is None:
+        return []
+    filter_expression = None
+    if stations is not None:
+        filter_expression = ds.field("station_id").isin(list(stations))
+    if years is not None:
+        years_expression = (ds.field("year") >= years[0]) & (
+            ds.field("year") <= years[1]
+        )
+        filter_expression = (
+            years_expression
+            if filter_expression is None
+            else filter_expression & years_expression
+        )
+    group_columns = COLUMNAR_GROUP_BY[group_by]
+    # A single chunk per column: pyarrow 11 group_by crashes on casts of many-chunk columns
+    readings_table = dataset.to_table(
+        columns=group_columns + ["date"] + list(READINGS_SCALING_FACTORS),
+        filter=filter_expression,
+    ).combine_chunks()
+    for column, factor in READINGS_SCALING_FACTORS.items():
+        # Same doubles as the scaled 'readings' columns
+        readings_table = readings_table.set_column(
+            readings_table.schema.get_field_index(column),
+            column,
+            pc.divide(pc.cast(readings_table[column], pa.float64()), factor),
+        )
+    return (
+        readings_table.group_by(group_columns)
+        .aggregate(
+            [("date", "count")]
+            + [
+                (column, aggregation)
+                for column in READINGS_SCALING_FACTORS
+                for aggregation in ("count", "sum")
+            ]
+        )
+        .sort_by([(column, "ascending") for column in group_columns])
+        .to_pylist()
+    )
@@ -0,0 +1,335 @@
+"""
+Contains the registry of per station-year weather metrics stored in 'station_metrics' table
+Metrics are registered with the 'metric' decorator and all of them are computed in a single
+vectorized pass over each station's readings, sorted by date and split into yearly segments
+"""
+
+import numpy as np
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from application import db
+from application.data_model import READINGS_SCALING_FACTORS, Readings, StationMetrics
+
+# Growing degree-days base and cap temperatures (degrees Celsius, corn 50/86 degF method)
+GDD_BASE_TEMPERATURE = 10.0
+GDD_CAP_TEMPERATURE = 30.0
+# Days with at least this precipitation are wet days, other days are dry days
+# (centimeters like 'readings.precipitation', i.e. 1 mm)
+WET_DAY_PRECIPITATION = 0.1
+# Wet-day precipitation percentiles registered as wet_day_precipitation_p<percentile>
+PRECIPITATION_PERCENTILES = (50, 90, 95)
+# metric name --> {"function": metric function, "description": str}
+METRICS_REGISTRY = {}
+
+
+def metric(name, description):
+    """
+    Decorator registering a metric function in METRICS_REGISTRY
+    The function receives a StationSeries and returns one value per yearly segment, NaN
+    where the metric is undefined (stored as NULL)
+    """
+
+    def decorator(metric_function):
+        METRICS_REGISTRY[name] = {
+            "function": metric_function,
+            "description": description,
+        }
+        return metric_function
+
+    return decorator
+
+
+class StationSeries:
+    """
+    Readings of one station sorted by date and split into yearly segments
+    Measurements are scaled floats with NaN for missing values
+    """
+
+    def __init__(self, dates, max_temperature, min_temperature, precipitation):
+        self.dates = dates
+        self.max_temperature = max_temperature
+        self.min_temperature = min_temperature
+        self.precipitation = precipitation
+        self.years, self.segment_starts, self.segment_lengths = np.unique(
+            dates // 10000, return_index=True, return_counts=True
+        )
+        self.segment_ids = np.repeat(
+            np.arange(len(self.years)), repeats=self.segment_lengths
+        )
+
+    def segment_sum(self, values):
+        """
+        Sum of the known values of every segment (0 when none is known)
+        """
+        return np.add.reduceat(np.nan_to_num(values, nan=0.0), self.segment_starts)
+
+    def segment_known_count(self, values):
+        """
+        Number of known (not NaN) values of every segment
+        """
+        return np.add.reduceat(~np.isnan(values), self.segment_starts)
+
+    def segment_count(self, mask, values):
+        """
+        Number of days matching 'mask' in every segment; NaN when no value of 'values' is known
+        """
+        known_count = StationSeries.segment_known_count(self=self, values=values)
+        count = np.add.reduceat(mask & ~np.isnan(values), self.segment_starts)
+        return np.where(known_count > 0, count, np.nan)
+
+    def segment_max(self, values):
+        """
+        Largest known value of every segment
+        """
+        # fmax skips NaN unless the whole segment is NaN
+        return np.fmax.reduceat(values, self.segment_starts)
+
+    def segment_min(self, values):
+        """
+        Smallest known value of every segment
+        """
+        return np.fmin.reduceat(values, self.segment_starts)
+
+    def segment_percentile(self, values, percentile):
+        """
+        Linearly interpolated percentile (numpy's default method) of the known values of every
+        segment, from a single sort of the series by (segment, value)
+        """
+        # NaN sorts last within its segment
+        sorted_values = values[np.lexsort((values, self.segment_ids))]
+        known_count = StationSeries.segment_known_count(self=self, values=values)
+        position = percentile / 100 * np.maximum(known_count - 1, 0)
+        lower_position = np.floor(position).astype(np.int64)
+        upper_position = np.ceil(position).astype(np.int64)
+        lower_value = sorted_values[self.segment_starts + lower_position]
+        upper_value = sorted_values[self.segment_starts + upper_position]
+        percentile_value = lower_value + (upper_value - lower_value) * (
+            position - lower_position
+        )
+        return np.where(known_count > 0, percentile_value, np.nan)
+
+    def segment_longest_run(self, mask):
+        """
+        Longest run of consecutive days matching 'mask' in every segment
+        """
+        positions = np.arange(len(mask))
+        segment_start = np.zeros(len(mask), dtype=bool)
+        segment_start[self.segment_starts] = True
+        # Runs restart after every non-matching day and at every segment start
+        restart_positions = np.where(
+            ~mask, positions, np.where(segment_start, positions - 1, -1)
+        )
+        run_lengths = np.where(
+            mask, positions - np.maximum.accumulate(restart_positions), 0
+        )
+        return np.maximum.reduceat(run_lengths, self.segment_starts)
+
+
+@metric("growing_degree_days", "Sum of daily (capped mean temperature - 10 degC)")
+def growing_degree_days(series):
+    capped_max_temperature = np.clip(
+        series.max_temperature, GDD_BASE_TEMPERATURE, GDD_CAP_TEMPERATURE
+    )
+    capped_min_temperature = np.clip(
+        series.min_temperature, GDD_BASE_TEMPERATURE, GDD_CAP_TEMPERATURE
+    )
+    daily_degrees = (
+        capped_max_temperature + capped_min_temperature
+    ) / 2 - GDD_BASE_TEMPERATURE
+    # Days missing either temperature are skipped
+    return np.where(
+        series.segment_known_count(daily_degrees) > 0,
+        series.segment_sum(daily_degrees),
+        np.nan,
+    )
+
+
+@metric("frost_days", "Number of days with a minimum temperature below 0 degC")
+def frost_days(series):
+    frost_mask = series.min_temperature < 0
+    return series.segment_count(mask=frost_mask, values=series.min_temperature)
+
+
+@metric("highest_max_temperature", "Highest daily maximum temperature (degC)")
+def highest_max_temperature(series):
+    return series.segment_max(series.max_temperature)
+
+
+@metric("lowest_min_temperature", "Lowest daily minimum temperature (degC)")
+def lowest_min_temperature(series):
+    return series.segment_min(series.min_temperature)
+
+
+@metric("wet_days", "Number of days with at least 1 mm of precipitation")
+def wet_days(series):
+    wet_mask = series.precipitation >= WET_DAY_PRECIPITATION
+    return series.segment_count(mask=wet_mask, values=series.precipitation)
+
+
+@metric(
+    "longest_dry_spell",
+    "Longest run of consecutive days with less than 1 mm of precipitation; "
+    "missing values end a run",
+)
+def longest_dry_spell(series):
+    # NaN compares False: missing values end a run
+    dry_mask = series.precipitation < WET_DAY_PRECIPITATION
+    longest_run = series.segment_longest_run(mask=dry_mask)
+    return np.where(
+        series.segment_known_count(series.precipitation) > 0, longest_run, np.nan
+    )
+
+
+def wet_day_percentile_metric(percentile):
+    """
+    Builds the metric function of a wet-day precipitation percentile
+    """
+
+    def wet_day_precipitation_percentile(series):
+        wet_precipitation = np.where(
+            series.precipitation >= WET_DAY_PRECIPITATION, series.precipitation, np.nan
+        )
+        return series.segment_percentile(
+            values=wet_precipitation, percentile=percentile
+        )
+
+    return wet_day_precipitation_percentile
+
+
+for precipitation_percentile in PRECIPITATION_PERCENTILES:
+    metric(
+        f"wet_day_precipitation_p{precipitation_percentile}",
+        f"{precipitation_percentile}th percentile of wet-day precipitation (cm)",
+    )(wet_day_percentile_metric(percentile=precipitation_percentile))
+
+
+def station_series_reader(station, years=None):
+    """
+    Reads the readings of a station, sorted by date, into a StationSeries
+    Params: years --> optional (first year, last year) range
+    Returns None when the station has no readings
+    """
+    # Plain table columns skip ORM row processing
+    readings_table = Readings.__table__
+    readings_query = (
+        select(
+            readings_table.c.date,
+            *[readings_table.c[column] for column in READINGS_SCALING_FACTORS],
+        )
+        .where(readings_table.c.station_id == station)
+        .order_by(readings_table.c.date)
+    )
+    if years is not None:
+        readings_query = readings_query.where(
+            readings_table.c.date.between(
+                years[0] * 10000 + 101, years[1] * 10000 + 1231
+            )
+        )
+    readings_result = db.session.connection().execute(readings_query)
+    # DBAPI rows go straight into one float array; None (missing measurement) becomes NaN
+    readings_array = np.array(readings_result.cursor.fetchall(), dtype=np.float64)
+    readings_result.close()
+    if len(readings_array) == 0:
+        return None
+    return StationSeries(
+        dates=readings_array[:, 0].astype(np.int64),
+        **{
+            column: readings_array[:, column_index] / scaling_factor
+            for column_index, (column, scaling_factor) in enumerate(
+                READINGS_SCALING_FACTORS.items(), start=1
+            )
+        },
+    )
+
+
+def station_metrics_calculator(series, metrics=None):
+    """
+    Computes registered metrics for every year of a StationSeries
+    Params: metrics --> names of METRICS_REGISTRY entries; None computes all of them
+    Returns {metric: array of one value per year of series.years}
+    """
+    return {
+        metric_name: METRICS_REGISTRY[metric_name]["function"](series)
+        for metric_name in (METRICS_REGISTRY if metrics is None else metrics)
+    }
+
+
+def metrics_db_writer(partitions=None):
+    """
+    Recomputes every registered metric and replaces the 'station_metrics' rows of the partitions
+    Params: partitions --> set of (year, station) to recompute; None recomputes every station
+    Returns the number of written rows
+    """
+    if partitions is None:
+        stations_years = {
+            station: None
+            for (station,) in db.session.query(Readings.station_id)
+            .distinct()
+            .order_by(Readings.station_id)
+        }
+        db.session.execute(delete(StationMetrics))
+    else:
+        stations_years = {}
+        for year, station in partitions:
+            stations_years.setdefault(station, set()).add(year)
+        if len(partitions) > 0:
+            db.session.execute(
+                delete(StationMetrics).where(
+                    tuple_(StationMetrics.station_id, StationMetrics.year).in_(
+                        [(station, year) for year, station in partitions]
+                    )
+                )
+            )
+    written_rows = 0
+    for station, years in sorted(stations_years.items()):
+        series = station_series_reader(
+            station=station, years=None if years is None else (min(years), max(years))
+        )
+        if series is None:
+            continue
+        metrics_values = station_metrics_calculator(series=series)
+        metrics_records = [
+            {
+                "station_id": station,
+                "year": int(year),
+                "metric": metric_name,
+                "value": None if np.isnan(value) else round(float(value), 4),
+            }
+            for metric_name, values in metrics_values.items()
+            for year, value in zip(series.years, values)
+            if years is None or year in years
+        ]
+        if len(metrics_records) > 0:
+            db.session.execute(insert(StationMetrics), metrics_records)
+            written_rows = written_rows + len(metrics_records)
+    db.session.commit()
+    return written_rows
+
+
+def station_metrics_reader(keys, metrics):
+    """
+    Reads 'station_metrics' values
+    Params: keys --> iterable of (year, station)
+            metrics --> names of METRICS_REGISTRY entries
+    Returns {(year, station, metric): value}
+    """
+    keys = list(keys)
+    if len(keys) == 0 or len(metrics) == 0:
+        return {}
+    metrics_extract = db.session.execute(
+        select(
+            StationMetrics.year,
+            StationMetrics.station_id,
+            StationMetrics.metric,
+            StationMetrics.value,
+        ).where(
+            tuple_(StationMetrics.station_id, StationMetrics.year).in_(
+                [(station, year) for year, station in keys]
+            ),
+            StationMetrics.metric.in_(metrics),
+        )
+    ).all()
+    return {
+        (year, station, metric_name): value
+        for year, station, metric_name, value in metrics_extract
+    }
@@ -0,0 +1,565 @@
+"""
+Contains the monthly aggregates cube and the time-window rollups served by /api/weather/rollup
+Month, season, year and whole-range windows are answered by summing (station, year, month) cells
+of 'monthly_aggregates', held in memory as a numpy array; only the partial months at the edges of
+a date range and rolling windows read 'readings'
+"""
+
+from datetime import date, timedelta
+import threading
+from time import monotonic
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, select, tuple_, union_all
+from sqlalchemy.dialects.sqlite import insert
+from application import db
+from application.analytics.metrics_engine import station_series_reader
+from application.data_model import (
+    READINGS_SCALING_FACTORS,
+    MonthlyAggregates,
+    Readings,
+)
+
+# Mergeable cell columns of 'monthly_aggregates', in the order the cell selects return them
+MONTHLY_AGGREGATES_COLUMNS = [
+    "days_count",
+    "max_temperature_count",
+    "max_temperature_sum",
+    "min_temperature_count",
+    "min_temperature_sum",
+    "precipitation_count",
+    "precipitation_sum",
+]
+ROLLUP_WINDOWS = ("month", "season", "year", "range", "rolling")
+ROLLUP_GROUP_BY = ("station", "all")
+# Meteorological seasons; December counts towards the next year's winter
+SEASONS = ("DJF", "MAM", "JJA", "SON")
+# Days of a rolling window when none is given
+ROLLING_DEFAULT_DAYS = 30
+
+
+def monthly_cells_select(year, month, station_id, measurements):
+    """
+    Core select of (year, month, station_id) cells in MONTHLY_AGGREGATES_COLUMNS order
+    Params: measurements --> scaled max temperature, min temperature and precipitation columns
+    """
+    return select(
+        year,
+        month,
+        station_id,
+        func.count(),
+        *[
+            aggregate
+            for measurement in measurements
+            for aggregate in (func.count(measurement), func.total(measurement))
+        ],
+    ).group_by(year, month, station_id)
+
+
+def readings_cells_select():
+    """
+    Core select of 'readings' grouped into monthly cells
+    """
+    return monthly_cells_select(
+        year=Readings.year,
+        month=Readings.month,
+        station_id=Readings.station_id,
+        measurements=[
+            Readings.max_temperature,
+            Readings.min_temperature,
+            Readings.precipitation,
+        ],
+    )
+
+
+def monthly_aggregates_upsert_statement():
+    """
+    INSERT ... ON CONFLICT DO UPDATE statement adding cells of new readings to the cube
+    """
+    upsert_statement = insert(MonthlyAggregates)
+    return upsert_statement.on_conflict_do_update(
+        index_elements=[
+            MonthlyAggregates.station_id,
+            MonthlyAggregates.year,
+            MonthlyAggregates.month,
+        ],
+        set_={
+            column: getattr(MonthlyAggregates, column)
+            + upsert_statement.excluded[column]
+            for column in MONTHLY_AGGREGATES_COLUMNS
+        },
+    )
+
+
+def monthly_records_builder(monthly_cells):
+    """
+    Converts (year, month, station_id, *MONTHLY_AGGREGATES_COLUMNS) rows into cube records
+    """
+    return [
+        dict(
+            zip(
+                ["year", "month", "station_id"] + MONTHLY_AGGREGATES_COLUMNS,
+                monthly_cell,
+            )
+        )
+        for monthly_cell in monthly_cells
+    ]
+
+
+def monthly_aggregates_rebuilder(partitions=None):
+    """
+    Recomputes 'monthly_aggregates' cells from 'readings'
+    Params: partitions --> optional set of (year, station) to rebuild; None rebuilds the cube
+    Commit is left to the caller
+    """
+    monthly_delete = delete(MonthlyAggregates)
+    cells_select = readings_cells_select()
+    if partitions is not None:
+        partition_keys = [(station, year) for year, station in partitions]
+        monthly_delete = monthly_delete.where(
+            tuple_(MonthlyAggregates.station_id, MonthlyAggregates.year).in_(
+                partition_keys
+            )
+        )
+        cells_select = cells_select.where(
+            Readings.year.in_({year for year, _ in partitions}),
+            Readings.station_id.in_({station for _, station in partitions}),
+        ).having(tuple_(Readings.station_id, Readings.year).in_(partition_keys))
+    db.session.execute(monthly_delete)
+    db.session.execute(
+        insert(MonthlyAggregates).from_select(
+            ["year", "month", "station_id"] + MONTHLY_AGGREGATES_COLUMNS, cells_select
+        )
+    )
+
+
+class MonthlyCube:
+    """
+    In-process copy of 'monthly_aggregates' as a (column, station, month) numpy array
+    Reloaded on first use after 'invalidate' (ingestion and rebuilds in this process) or once
+    older than 'ROLLUP_CUBE_CACHE_SECONDS' (writers in other processes)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cube = None
+        self.loaded_at = None
+
+    def loader(self):
+        """
+        Reads 'monthly_aggregates' into {"stations": sorted station ids array, "first_month":
+        month index (year * 12 + month - 1) of the first cell, "values": array of shape
+        (MONTHLY_AGGREGATES_COLUMNS, stations, months), 0 where there is no cell}
+        Returns None when the cube is empty
+        """
+        cells_result = db.session.connection().execute(
+            select(
+                MonthlyAggregates.station_id,
+                MonthlyAggregates.year * 12 + MonthlyAggregates.month - 1,
+                *[
+                    getattr(MonthlyAggregates, column)
+                    for column in MONTHLY_AGGREGATES_COLUMNS
+                ],
+            )
+        )
+        cells_rows = cells_result.cursor.fetchall()
+        cells_result.close()
+        if len(cells_rows) == 0:
+            return None
+        stations, station_indexes = np.unique(
+            np.array([cell_row[0] for cell_row in cells_rows]), return_inverse=True
+        )
+        cells_array = np.array(
+            [cell_row[1:] for cell_row in cells_rows], dtype=np.float64
+        )
+        month_indexes = cells_array[:, 0].astype(np.int64)
+        first_month = int(month_indexes.min())
+        values = np.zeros(
+            (
+                len(MONTHLY_AGGREGATES_COLUMNS),
+                len(stations),
+                int(month_indexes.max()) - first_month + 1,
+            )
+        )
+        values[:, station_indexes, month_indexes - first_month] = cells_array[:, 1:].T
+        return {"stations": stations, "first_month": first_month, "values": values}
+
+    def get(self):
+        """
+        Returns the cube dict of 'loader', reloading it when invalidated or expired
+        """
+        with self.lock:
+            if (
+                self.loaded_at is None
+                or monotonic() - self.loaded_at
+                >= current_app.config["ROLLUP_CUBE_CACHE_SECONDS"]
+            ):
+                self.cube = MonthlyCube.loader(self=self)
+                self.loaded_at = monotonic()
+            return self.cube
+
+    def invalidate(self):
+        """
+        Drops the in-memory cube after 'monthly_aggregates' changed
+        """
+        with self.lock:
+            self.cube = None
+            self.loaded_at = None
+
+
+MONTHLY_CUBE = MonthlyCube()
+
+
+def date_parser(value):
+    """
+    Parses a YYYYMMDD integer into a date
+    """
+    return date(value // 10000, value // 100 % 100, value % 100)
+
+
+def date_formatter(value):
+    """
+    Formats a date as a YYYYMMDD integer
+    """
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def full_months_splitter(start_date, end_date):
+    """
+    Splits a date range into the whole months it covers and the partial months at its edges
+    Params: start_date, end_date --> YYYYMMDD integers or None for an open end
+    Returns (first and last YYYYMM of the whole months, either None for an open end, or None
+             when no month is whole, list of (first, last) YYYYMMDD ranges read from 'readings')
+    """
+    first_month = None
+    last_month = None
+    edge_ranges = []
+    if start_date is not None:
+        first_month = start_date // 100
+        if start_date % 100 != 1:
+            next_month_start = (
+                date_parser(start_date).replace(day=1) + timedelta(days=31)
+            ).replace(day=1)
+            first_month = next_month_start.year * 100 + next_month_start.month
+            edge_end = date_formatter(next_month_start - timedelta(days=1))
+            edge_ranges.append(
+                (start_date, edge_end if end_date is None else min(edge_end, end_date))
+            )
+    if end_date is not None:
+        last_month = end_date // 100
+        if (date_parser(end_date) + timedelta(days=1)).day != 1:
+            previous_month_end = date_parser(end_date).replace(day=1) - timedelta(
+                days=1
+            )
+            last_month = previous_month_end.year * 100 + previous_month_end.month
+            edge_start = end_date // 100 * 100 + 1
+            # Unless the first partial month already reaches end_date
+            if len(edge_ranges) == 0 or edge_start > edge_ranges[0][1]:
+                edge_ranges.append((edge_start, end_date))
+    if first_month is not None and last_month is not None and first_month > last_month:
+        return None, edge_ranges
+    return (first_month, last_month), edge_ranges
+
+
+def month_index(year_month):
+    """
+    Converts a YYYYMM integer into a month index (year * 12 + month - 1)
+    """
+    return year_month // 100 * 12 + year_month % 100 - 1
+
+
+def edge_cells_reader(edge_ranges, stations):
+    """
+    Reads the monthly cells of the partial months at the edges of a date range from 'readings'
+    Params: edge_ranges --> list of (first, last) YYYYMMDD ranges of 'full_months_splitter'
+            stations --> sorted list of station ids
+    Returns an object array of (station_id, YYYYMM, *MONTHLY_AGGREGATES_COLUMNS) rows
+    """
+    # One select per range keeps every station lookup on the (station_id, date) primary key;
+    # raw integer columns are summed and scaled afterwards
+    readings_table = Readings.__table__
+    year_month = readings_table.c.date // 100
+    edge_select = union_all(
+        *[
+            select(
+                readings_table.c.station_id,
+                year_month,
+                func.count(),
+                *[
+                    aggregate
+                    for column in READINGS_SCALING_FACTORS
+                    for aggregate in (
+                        func.count(readings_table.c[column]),
+                        func.total(readings_table.c[column]),
+                    )
+                ],
+            )
+            .where(
+                readings_table.c.station_id.in_(stations),
+                readings_table.c.date.between(edge_start, edge_end),
+            )
+            .group_by(readings_table.c.station_id, year_month)
+            for edge_start, edge_end in edge_ranges
+        ]
+    )
+    edge_result = db.session.connection().execute(edge_select)
+    edge_cells = np.array(edge_result.cursor.fetchall(), dtype=object).reshape(
+        -1, len(MONTHLY_AGGREGATES_COLUMNS) + 2
+    )
+    edge_result.close()
+    for column_index, scaling_factor in enumerate(READINGS_SCALING_FACTORS.values()):
+        edge_cells[:, 4 + 2 * column_index] /= scaling_factor
+    return edge_cells
+
+
+def window_keys(window, month_indexes):
+    """
+    Key of the window every month index belongs to; keys never decrease along month indexes
+    """
+    years = month_indexes // 12
+    months = month_indexes % 12 + 1
+    if window == "month":
+        return years * 100 + months
+    if window == "season":
+        # YYYY0 (DJF) to YYYY3 (SON)
+        return (years + (months == 12)) * 10 + months % 12 // 3
+    if window == "year":
+        return years
+    return np.zeros(len(month_indexes), dtype=np.int64)
+
+
+def window_label(window, window_key, start_date=None, end_date=None):
+    """
+    Readable label of a window key: 1990-01, 1990-DJF, 1990 or the date range
+    """
+    if window == "range":
+        return f"{start_date or ''}-{end_date or ''}"
+    if window == "month":
+        return f"{window_key // 100}-{window_key % 100:02d}"
+    if window == "season":
+        return f"{window_key // 10}-{SEASONS[window_key % 10]}"
+    return f"{window_key}"
+
+
+def window_statistics(
+    days_count,
+    max_temperature_count,
+    max_temperature_sum,
+    min_temperature_count,
+    min_temperature_sum,
+    precipitation_count,
+    precipitation_sum,
+):
+    """
+    Reads the statistics of a window out of its merged sums and counts, like
+    'aggregates_statistics': missing averages are None and precipitation without values is 0
+    """
+    return {
+        "days_count": days_count,
+        "avg_max_temperature": round(max_temperature_sum / max_temperature_count, 4)
+        if max_temperature_count > 0
+        else None,
+        "avg_min_temperature": round(min_temperature_sum / min_temperature_count, 4)
+        if min_temperature_count > 0
+        else None,
+        "total_accumulated_precipitation": round(precipitation_sum, 4)
+        if precipitation_count > 0
+        else 0,
+    }
+
+
+def window_rollups(
+    window, start_date=None, end_date=None, stations=None, group_by="station"
+):
+    """
+    Aggregates month, season, year or whole-range windows by summing the in-memory cube cells of
+    whole months and 'readings' cells of the partial edge months along the month axis
+    Params: window --> month, season, year or range
+            start_date, end_date --> YYYYMMDD integers or None for an open end
+            stations --> optional list of station ids
+            group_by --> station (one row per station and window) or all (merged stations)
+    Returns a list of dicts sorted by station and window
+    """
+    cube = MONTHLY_CUBE.get()
+    if cube is None:
+        return []
+    full_months, edge_ranges = full_months_splitter(
+        start_date=start_date, end_date=end_date
+    )
+    # Months of the range held by the cube
+    span_first = cube["first_month"]
+    span_last = cube["first_month"] + cube["values"].shape[2] - 1
+    if start_date is not None:
+        span_first = max(span_first, month_index(start_date // 100))
+    if end_date is not None:
+        span_last = min(span_last, month_index(end_date // 100))
+    if span_first > span_last:
+        return []
+    station_indexes = np.arange(len(cube["stations"]))
+    if stations is not None:
+        station_indexes = np.flatnonzero(np.isin(cube["stations"], stations))
+        if len(station_indexes) == 0:
+            return []
+    values = np.zeros(
+        (
+            len(MONTHLY_AGGREGATES_COLUMNS),
+            len(station_indexes),
+            span_last - span_first + 1,
+        )
+    )
+    if full_months is not None:
+        full_first = span_first
+        full_last = span_last
+        if full_months[0] is not None:
+            full_first = max(full_first, month_index(full_months[0]))
+        if full_months[1] is not None:
+            full_last = min(full_last, month_index(full_months[1]))
+        if full_first <= full_last:
+            values[:, :, full_first - span_first : full_last - span_first + 1] = cube[
+                "values"
+            ][:, station_indexes][
+                :,
+                :,
+                full_first - cube["first_month"] : full_last - cube["first_month"] + 1,
+            ]
+    if len(edge_ranges) > 0:
+        selected_stations = cube["stations"][station_indexes]
+        edge_cells = edge_cells_reader(
+            edge_ranges=edge_ranges, stations=selected_stations.tolist()
+        )
+        if len(edge_cells) > 0:
+            edge_months = edge_cells[:, 1].astype(np.int64)
+            edge_months = edge_months // 100 * 12 + edge_months % 100 - 1
+            in_span = (edge_months >= span_first) & (edge_months <= span_last)
+            np.add.at(
+                values,
+                (
+                    slice(None),
+                    np.searchsorted(selected_stations, edge_cells[in_span, 0]),
+                    edge_months[in_span] - span_first,
+                ),
+                edge_cells[in_span, 2:].astype(np.float64).T,
+            )
+    keys = window_keys(
+        window=window, month_indexes=np.arange(span_first, span_last + 1)
+    )
+    window_starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    window_values = np.add.reduceat(values, window_starts, axis=2)
+    output_stations = cube["stations"][station_indexes].tolist()
+    if group_by == "all":
+        window_values = window_values.sum(axis=1, keepdims=True)
+    window_labels = [
+        window_label(
+            window=window,
+            window_key=int(window_key),
+            start_date=start_date,
+            end_date=end_date,
+        )
+        for window_key in keys[window_starts]
+    ]
+    # Statistics of every window at once; rows are then read out of plain lists
+    days_counts = window_values[0].astype(np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_temperature_averages = window_values[2] / window_values[1]
+        min_temperature_averages = window_values[4] / window_values[3]
+    rollups = []
+    # Windows without any record (days_count 0) are left out
+    station_positions, window_positions = np.nonzero(days_counts)
+    for (
+        station_position,
+        window_position,
+        days_count,
+        max_average,
+        min_average,
+        precipitation_count,
+        precipitation_sum,
+    ) in zip(
+        station_positions.tolist(),
+        window_positions.tolist(),
+        days_counts[station_positions, window_positions].tolist(),
+        max_temperature_averages[station_positions, window_positions].tolist(),
+        min_temperature_averages[station_positions, window_positions].tolist(),
+        window_values[5][station_positions, window_positions].tolist(),
+        window_values[6][station_positions, window_positions].tolist(),
+    ):
+        rollup = {}
+        if group_by == "station":
+            rollup["station_id"] = output_stations[station_position]
+        rollup["window"] = window_labels[window_position]
+        rollup["days_count"] = days_count
+        rollup["avg_max_temperature"] = (
+            None if max_average != max_average else round(max_average, 4)
+        )
+        rollup["avg_min_temperature"] = (
+            None if min_average != min_average else round(min_average, 4)
+        )
+        rollup["total_accumulated_precipitation"] = (
+            round(precipitation_sum, 4) if precipitation_count > 0 else 0
+        )
+        rollups.append(rollup)
+    return rollups
+
+
+def rolling_rollups(stations, start_date, end_date, days=ROLLING_DEFAULT_DAYS):
+    """
+    Aggregates the 'days' consecutive daily records ending on every date of the range, per station,
+    from cumulative sums over the station's 'readings'
+    Params: stations --> list of station ids
+            start_date, end_date --> YYYYMMDD integers or None for an open end
+    Returns a list of dicts sorted by station and date
+    """
+    rollups = []
+    for station in stations:
+        # Records before the range fill the first windows
+        first_year = None
+        if start_date is not None:
+            first_year = (date_parser(start_date) - timedelta(days=days)).year
+        series = station_series_reader(
+            station=station,
+            years=None
+            if first_year is None and end_date is None
+            else (first_year or 0, 9999 if end_date is None else end_date // 10000),
+        )
+        if series is None:
+            continue
+        measurements_sums = {}
+        measurements_counts = {}
+        for column in ("max_temperature", "min_temperature", "precipitation"):
+            values = getattr(series, column)
+            # Leading 0 so window sums are differences of cumulative sums
+            cumulative_sums = np.concatenate(([0.0], np.nancumsum(values)))
+            cumulative_counts = np.concatenate(([0], np.cumsum(~np.isnan(values))))
+            measurements_sums[column] = cumulative_sums[days:] - cumulative_sums[:-days]
+            measurements_counts[column] = (
+                cumulative_counts[days:] - cumulative_counts[:-days]
+            )
+        window_end_dates = series.dates[days - 1 :]
+        in_range = np.ones(len(window_end_dates), dtype=bool)
+        if start_date is not None:
+            in_range &= window_end_dates >= start_date
+        if end_date is not None:
+            in_range &= window_end_dates <= end_date
+        for window_index in np.flatnonzero(in_range).tolist():
+            rollup = {
+                "station_id": station,
+                "window": f"{series.dates[window_index]}-{window_end_dates[window_index]}",
+            }
+            rollup.update(
+                window_statistics(
+                    days,
+                    *[
+                        value
+                        for column in (
+                            "max_temperature",
+                            "min_temperature",
+                            "precipitation",
+                        )
+                        for value in (
+                            int(measurements_counts[column][window_index]),
+                            float(measurements_sums[column][window_index]),
+                        )
+                    ],
+                )
+            )
+            rollups.append(rollup)
+    return rollups
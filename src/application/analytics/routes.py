@@ -4,6 +4,7 @@ Routes file for '/analytics' url paths
 
 import os
 import json
+import click
 from flask import (
     Blueprint,
     render_template,
@@ -13,20 +14,76 @@ from flask import (
     current_app,
     send_file,
 )
-from application import executor
-from application.analytics.stats_utility import StatsUtilities
+from application.analytics.columnar_store import (
+    columnar_partitions_writer,
+    columnar_store_available,
+)
+from application.analytics.station_utility import stations_loader
+from application.analytics.yield_utility import yields_loader
+from application.jobs.job_queue import job_enqueuer
 
 
 ANALYTICS = Blueprint("analytics", __name__)
 
 
-@executor.job
-def analytics_orchestrator_task(stats_object):
+@ANALYTICS.cli.command("rebuild-columnar-store")
+def analytics_rebuild_columnar_store():
+    """
+    Regenerates the Parquet columnar store from 'readings' table
+    Usage (from 'src' directory): flask --app run analytics rebuild-columnar-store
+    """
+    if not columnar_store_available():
+        raise click.ClickException(
+            "Columnar store requires pyarrow and Config.COLUMNAR_STORE_ENABLED"
+        )
+    written_records = columnar_partitions_writer()
+    click.echo(
+        f"Columnar store rebuilt in {current_app.config['COLUMNAR_STORE_DIR']}: "
+        f"{written_records} records"
+    )
+
+
+@ANALYTICS.cli.command("load-yields")
+@click.argument("file_path", required=False)
+def analytics_load_yields(file_path):
     """
-    Statistics Calculation Background Task
-    Params: stats_object --> stats object created in analytics_hub
+    Loads a yld_data file (Config.YLD_DATA_FILE by default) into 'yields' table
+    A missing default file is skipped; a missing FILE_PATH is an error
+    Usage (from 'src' directory): flask --app run analytics load-yields [FILE_PATH]
     """
-    StatsUtilities.analytics_orchestrator(self=stats_object)
+    if file_path is None and not os.path.isfile(current_app.config["YLD_DATA_FILE"]):
+        click.echo(
+            f"Skipped loading yields: {current_app.config['YLD_DATA_FILE']} not found"
+        )
+        return
+    try:
+        loaded_years = yields_loader(file_path=file_path)
+    except (OSError, ValueError) as error:
+        raise click.ClickException(f"{error}")
+    click.echo(f"Yields loaded: {loaded_years} years")
+
+
+@ANALYTICS.cli.command("load-stations")
+@click.argument("file_path", required=False)
+def analytics_load_stations(file_path):
+    """
+    Loads a GHCN-Daily ghcnd-stations.txt file (Config.STATIONS_DATA_FILE by default) into
+    'stations' table
+    A missing default file is skipped; a missing FILE_PATH is an error
+    Usage (from 'src' directory): flask --app run analytics load-stations [FILE_PATH]
+    """
+    if file_path is None and not os.path.isfile(
+        current_app.config["STATIONS_DATA_FILE"]
+    ):
+        click.echo(
+            f"Skipped loading stations: {current_app.config['STATIONS_DATA_FILE']} not found"
+        )
+        return
+    try:
+        loaded_stations = stations_loader(file_path=file_path)
+    except (OSError, ValueError) as error:
+        raise click.ClickException(f"{error}")
+    click.echo(f"Stations loaded: {loaded_stations} stations")
 
 
 @ANALYTICS.route("/analytics")
@@ -67,9 +124,10 @@ def analytics_generate_report():
     """
     Manually trigger generation of new report based on current data in 'readings' table
     """
-    analytics_hub.stats_object = StatsUtilities()
-    analytics_orchestrator_task.submit(stats_object=analytics_hub.stats_object)
-    flash("Calculating weather statistics", "success")
+    analytics_hub.job_id = job_enqueuer(
+        job_type="analytics", params={"partitions": None, "source": "readings"}
+    )
+    flash(f"Calculating weather statistics (job {analytics_hub.job_id})", "success")
     return redirect(url_for("analytics.analytics_hub"))
 
 
@@ -0,0 +1,443 @@
+"""
+Contains methods for loading GHCN-Daily station metadata and the in-memory station spatial index
+served by /api/stations
+Stations are bucketed into a latitude/longitude grid; bounding-box queries read the cells the box
+overlaps and nearest-station queries widen a square of cells around the query point until no
+station outside of it can be closer than the k-th nearest found
+"""
+
+import math
+import threading
+from time import monotonic
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from application import db
+from application.data_model import Aggregates, Stations
+
+# Mean Earth radius (kilometers)
+EARTH_RADIUS_KM = 6371.0088
+# Most stations returned by a nearest-station query
+NEAREST_MAX_COUNT = 100
+# Nearest stations returned when none is given
+NEAREST_DEFAULT_COUNT = 5
+# ghcnd-stations.txt elevation of stations without one
+MISSING_ELEVATION = -999.9
+# (field, first column, last column) of ghcnd-stations.txt lines, 1-based and inclusive
+GHCND_STATIONS_FIELDS = (
+    ("station_id", 1, 11),
+    ("latitude", 13, 20),
+    ("longitude", 22, 30),
+    ("elevation", 32, 37),
+    ("state", 39, 40),
+    ("name", 42, 71),
+)
+
+
+def ghcnd_stations_parser(file_path):
+    """
+    Parses a GHCN-Daily ghcnd-stations.txt fixed-width file
+    Returns a list of 'stations' table records
+    Raises ValueError on malformed lines
+    """
+    stations_records = []
+    with open(file_path, mode="r") as infile:
+        for line_number, line in enumerate(infile, start=1):
+            if line.strip() == "":
+                continue
+            fields = {
+                field: line[first_column - 1 : last_column].strip()
+                for field, first_column, last_column in GHCND_STATIONS_FIELDS
+            }
+            try:
+                if len(fields["station_id"]) != 11:
+                    raise ValueError(fields["station_id"])
+                latitude = float(fields["latitude"])
+                longitude = float(fields["longitude"])
+                elevation = float(fields["elevation"])
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                    raise ValueError(f"{latitude}, {longitude}")
+            except ValueError:
+                raise ValueError(
+                    f"malformed ghcnd-stations line {line_number} in {file_path}: {line!r}"
+                )
+            stations_records.append(
+                {
+                    "station_id": fields["station_id"],
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "elevation": None if elevation == MISSING_ELEVATION else elevation,
+                    "state": fields["state"] or None,
+                    "name": fields["name"] or None,
+                }
+            )
+    return stations_records
+
+
+def stations_loader(file_path=None):
+    """
+    Loads a ghcnd-stations.txt file into 'stations' table; stations already loaded are updated
+    in place
+    Params: file_path --> metadata file, Config.STATIONS_DATA_FILE by default
+    Returns the number of loaded stations
+    """
+    stations_records = ghcnd_stations_parser(
+        file_path=file_path or current_app.config["STATIONS_DATA_FILE"]
+    )
+    if len(stations_records) > 0:
+        upsert_statement = insert(Stations)
+        db.session.execute(
+            upsert_statement.on_conflict_do_update(
+                index_elements=[Stations.station_id],
+                set_={
+                    column: upsert_statement.excluded[column]
+                    for column in (
+                        "latitude",
+                        "longitude",
+                        "elevation",
+                        "state",
+                        "name",
+                    )
+                },
+            ),
+            stations_records,
+        )
+        db.session.commit()
+    STATION_INDEX.invalidate()
+    return len(stations_records)
+
+
+def haversine_distances(latitude, longitude, latitudes, longitudes):
+    """
+    Great-circle distances (kilometers) from a point to arrays of points, in decimal degrees
+    """
+    latitude_radians = math.radians(latitude)
+    latitudes_radians = np.radians(latitudes)
+    haversines = (
+        np.sin((latitudes_radians - latitude_radians) / 2) ** 2
+        + math.cos(latitude_radians)
+        * np.cos(latitudes_radians)
+        * np.sin(np.radians(longitudes - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(haversines, 1.0)))
+
+
+class StationIndex:
+    """
+    In-process grid spatial index of 'stations' with each station's period of record
+    Reloaded on first use after 'invalidate' (station loads and ingestion in this process) or
+    once older than 'STATION_INDEX_CACHE_SECONDS' (writers in other processes)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.loaded_at = None
+
+    def loader(self):
+        """
+        Reads 'stations' and the first and last year of 'aggregates' of every station into
+        {"all": grid of every station, "with_records": grid of the stations with readings}, see
+        'station_grid_builder'
+        Returns None when no station is loaded
+        """
+        periods = {
+            station: (first_year, last_year)
+            for station, first_year, last_year in db.session.execute(
+                select(
+                    Aggregates.station_id,
+                    func.min(Aggregates.year),
+                    func.max(Aggregates.year),
+                ).group_by(Aggregates.station_id)
+            )
+        }
+        stations_extract = db.session.execute(
+            select(
+                Stations.station_id,
+                Stations.latitude,
+                Stations.longitude,
+                Stations.elevation,
+                Stations.state,
+                Stations.name,
+            )
+        ).all()
+        if len(stations_extract) == 0:
+            return None
+        stations = []
+        for station_id, latitude, longitude, elevation, state, name in stations_extract:
+            first_year, last_year = periods.get(station_id, (None, None))
+            stations.append(
+                {
+                    "station_id": station_id,
+                    "name": name,
+                    "state": state,
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "elevation": elevation,
+                    "first_year": first_year,
+                    "last_year": last_year,
+                }
+            )
+        cell_degrees = current_app.config["STATION_INDEX_CELL_DEGREES"]
+        # Stations with readings get their own grid so queries restricted to them never read
+        # the (possibly far more numerous) metadata-only stations
+        return {
+            "all": station_grid_builder(stations=stations, cell_degrees=cell_degrees),
+            "with_records": station_grid_builder(
+                stations=[
+                    station for station in stations if station["first_year"] is not None
+                ],
+                cell_degrees=cell_degrees,
+            ),
+        }
+
+    def get(self):
+        """
+        Returns the index dict of 'loader', reloading it when invalidated or expired
+        """
+        with self.lock:
+            if (
+                self.loaded_at is None
+                or monotonic() - self.loaded_at
+                >= current_app.config["STATION_INDEX_CACHE_SECONDS"]
+            ):
+                self.index = StationIndex.loader(self=self)
+                self.loaded_at = monotonic()
+            return self.index
+
+    def invalidate(self):
+        """
+        Drops the in-memory index after 'stations' or the stations' periods of record changed
+        """
+        with self.lock:
+            self.index = None
+            self.loaded_at = None
+
+
+STATION_INDEX = StationIndex()
+
+
+def station_grid_builder(stations, cell_degrees):
+    """
+    Buckets stations into a grid of cell_degrees x cell_degrees cells
+    Returns {"cell_degrees", "rows", "columns": grid layout, "cell_ids": sorted grid cell of
+    every station, "latitudes", "longitudes": arrays in cell_ids order, "stations": metadata
+    dicts in cell_ids order}
+    """
+    rows = math.ceil(180 / cell_degrees)
+    columns = math.ceil(360 / cell_degrees)
+    latitudes = np.array(
+        [station["latitude"] for station in stations], dtype=np.float64
+    )
+    longitudes = np.array(
+        [station["longitude"] for station in stations], dtype=np.float64
+    )
+    cell_ids = grid_row(latitudes, cell_degrees, rows) * columns + grid_column(
+        longitudes, cell_degrees, columns
+    )
+    cell_order = np.argsort(cell_ids, kind="stable")
+    return {
+        "cell_degrees": cell_degrees,
+        "rows": rows,
+        "columns": columns,
+        "cell_ids": cell_ids[cell_order],
+        "latitudes": latitudes[cell_order],
+        "longitudes": longitudes[cell_order],
+        "stations": [stations[position] for position in cell_order.tolist()],
+    }
+
+
+def grid_row(latitudes, cell_degrees, rows):
+    """
+    Grid row of latitudes; the north pole falls into the last row
+    """
+    return np.minimum(
+        np.floor((np.asarray(latitudes) + 90) / cell_degrees).astype(np.int64),
+        rows - 1,
+    )
+
+
+def grid_column(longitudes, cell_degrees, columns):
+    """
+    Grid column of longitudes; 180 wraps around to the column of -180
+    """
+    return (
+        np.floor((np.asarray(longitudes) + 180) / cell_degrees).astype(np.int64)
+        % columns
+    )
+
+
+def grid_positions(index, first_row, last_row, first_column, last_column):
+    """
+    Positions of the stations in a block of grid cells
+    Params: first_row, last_row --> clipped to the grid
+            first_column, last_column --> may run past either side of the grid and wrap around
+    """
+    first_row = max(first_row, 0)
+    last_row = min(last_row, index["rows"] - 1)
+    columns = index["columns"]
+    if last_column - first_column + 1 >= columns:
+        # Whole rows are contiguous cell ids
+        cell_ranges = [(first_row * columns, (last_row + 1) * columns - 1)]
+    else:
+        first_column = first_column % columns
+        last_column = last_column % columns
+        column_ranges = (
+            [(first_column, last_column)]
+            if first_column <= last_column
+            else [(first_column, columns - 1), (0, last_column)]
+        )
+        cell_ranges = [
+            (row * columns + range_first, row * columns + range_last)
+            for row in range(first_row, last_row + 1)
+            for range_first, range_last in column_ranges
+        ]
+    cell_ranges = np.array(cell_ranges, dtype=np.int64)
+    starts = np.searchsorted(index["cell_ids"], cell_ranges[:, 0], side="left")
+    ends = np.searchsorted(index["cell_ids"], cell_ranges[:, 1], side="right")
+    return np.concatenate(
+        [
+            np.arange(start, end)
+            for start, end in zip(starts.tolist(), ends.tolist())
+            if end > start
+        ]
+        or [np.array([], dtype=np.int64)]
+    )
+
+
+def outside_distance_bound(
+    index, latitude, longitude, first_row, last_row, first_column, last_column
+):
+    """
+    Lower bound (kilometers) of the distance from a point inside a block of grid cells to any
+    station outside of it: through the block's north or south edge at least the latitude gap,
+    through its east or west edge at least the distance across the longitude gap at the
+    block's latitude farthest from the equator
+    """
+    cell_degrees = index["cell_degrees"]
+    south_edge = max(first_row * cell_degrees - 90, -90)
+    north_edge = min((last_row + 1) * cell_degrees - 90, 90)
+    latitude_gaps = []
+    if south_edge > -90:
+        latitude_gaps.append(latitude - south_edge)
+    if north_edge < 90:
+        latitude_gaps.append(north_edge - latitude)
+    bounds = [math.inf]
+    if len(latitude_gaps) > 0:
+        bounds.append(EARTH_RADIUS_KM * math.radians(min(latitude_gaps)))
+    if last_column - first_column + 1 < index["columns"]:
+        longitude_gap = min(
+            longitude - (first_column * cell_degrees - 180),
+            (last_column + 1) * cell_degrees - 180 - longitude,
+        )
+        farthest_latitude = max(abs(south_edge), abs(north_edge))
+        haversine = (
+            math.cos(math.radians(latitude))
+            * math.cos(math.radians(farthest_latitude))
+            * math.sin(math.radians(longitude_gap) / 2) ** 2
+        )
+        bounds.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(haversine, 1.0))))
+    return min(bounds)
+
+
+def nearest_stations(
+    latitude,
+    longitude,
+    count=NEAREST_DEFAULT_COUNT,
+    max_distance=None,
+    with_records=True,
+):
+    """
+    Finds the stations nearest to a point
+    Params: latitude, longitude --> decimal degrees
+            count --> number of stations to return
+            max_distance --> optional distance limit (kilometers)
+            with_records --> only consider stations with readings
+    Returns a list of station metadata dicts with 'distance_km', nearest first
+    """
+    index = STATION_INDEX.get()
+    if index is None:
+        return []
+    index = index["with_records" if with_records else "all"]
+    if len(index["stations"]) == 0:
+        return []
+    cell_degrees = index["cell_degrees"]
+    row = int(grid_row(latitude, cell_degrees, index["rows"]))
+    column = int(np.floor((longitude + 180) / cell_degrees))
+    distance_limit = math.inf if max_distance is None else max_distance
+    radius = 0
+    while True:
+        block = (row - radius, row + radius, column - radius, column + radius)
+        positions = grid_positions(index, *block)
+        distances = haversine_distances(
+            latitude=latitude,
+            longitude=longitude,
+            latitudes=index["latitudes"][positions],
+            longitudes=index["longitudes"][positions],
+        )
+        # Distance within which the answer must lie
+        answer_distance = distance_limit
+        if len(distances) >= count:
+            answer_distance = min(
+                answer_distance, np.partition(distances, count - 1)[count - 1]
+            )
+        covers_grid = (
+            row - radius <= 0
+            and row + radius >= index["rows"] - 1
+            and 2 * radius + 1 >= index["columns"]
+        )
+        if covers_grid or answer_distance <= outside_distance_bound(
+            index, latitude, longitude, *block
+        ):
+            break
+        # Sparse regions are widened quickly
+        radius = max(1, radius * 2)
+    nearest_order = np.argsort(distances, kind="stable")[:count]
+    return [
+        {**index["stations"][position], "distance_km": round(distance, 3)}
+        for position, distance in zip(
+            positions[nearest_order].tolist(), distances[nearest_order].tolist()
+        )
+        if distance <= distance_limit
+    ]
+
+
+def bbox_stations(south, west, north, east, with_records=True):
+    """
+    Finds the stations inside a bounding box
+    Params: south, west, north, east --> decimal degrees; west > east crosses the antimeridian
+            with_records --> only return stations with readings
+    Returns a list of station metadata dicts sorted by station id
+    """
+    index = STATION_INDEX.get()
+    if index is None:
+        return []
+    index = index["with_records" if with_records else "all"]
+    if len(index["stations"]) == 0:
+        return []
+    cell_degrees = index["cell_degrees"]
+    first_row, last_row = grid_row([south, north], cell_degrees, index["rows"]).tolist()
+    first_column = int(np.floor((west + 180) / cell_degrees))
+    last_column = int(np.floor((east + 180) / cell_degrees))
+    if west > east:
+        last_column = last_column + index["columns"]
+    cells_count = (last_row - first_row + 1) * (last_column - first_column + 1)
+    if cells_count > len(index["cell_ids"]):
+        # Boxes covering more cells than there are stations test every station
+        positions = np.arange(len(index["cell_ids"]))
+    else:
+        positions = grid_positions(
+            index, first_row, last_row, first_column, last_column
+        )
+    latitudes = index["latitudes"][positions]
+    longitudes = index["longitudes"][positions]
+    inside = (latitudes >= south) & (latitudes <= north)
+    if west <= east:
+        inside &= (longitudes >= west) & (longitudes <= east)
+    else:
+        inside &= (longitudes >= west) | (longitudes <= east)
+    return sorted(
+        (dict(index["stations"][position]) for position in positions[inside].tolist()),
+        key=lambda station: station["station_id"],
+    )
@@ -6,10 +6,128 @@ import json
 from datetime import datetime
 import logging
 import os
-from sqlalchemy import insert
+from sqlalchemy import cast, delete, func, select
+from sqlalchemy.dialects.sqlite import insert
 from flask import current_app
 from application import db
-from application.data_model import Readings, Results
+from application.analytics.columnar_store import (
+    columnar_aggregates,
+    columnar_partition_keys,
+)
+from application.analytics.metrics_engine import metrics_db_writer
+from application.analytics.rollup_utility import (
+    MONTHLY_CUBE,
+    monthly_aggregates_rebuilder,
+)
+from application.apis.response_cache import results_cache_invalidator
+from application.data_model import Aggregates, Readings, Results
+
+
+def aggregates_statistics(aggregates_rows):
+    """
+    Reads weather statistics out of mergeable 'aggregates' sums and counts in O(1) per partition
+    Output matches 'StatsUtilities.statistics_aggregator': missing averages are None and a
+    partition without precipitation values has a total of 0
+    Params: aggregates_rows --> iterable of (year, station_id, max_temperature_count,
+            max_temperature_sum, min_temperature_count, min_temperature_sum,
+            precipitation_count, precipitation_sum)
+    Returns {(year, station): (avg_max_temperature, avg_min_temperature, total_accumulated_precipitation)}
+    """
+    aggregates_dict = {}
+    for (
+        year,
+        station,
+        max_temperature_count,
+        max_temperature_sum,
+        min_temperature_count,
+        min_temperature_sum,
+        precipitation_count,
+        precipitation_sum,
+    ) in aggregates_rows:
+        aggregates_dict[(year, station)] = (
+            round(max_temperature_sum / max_temperature_count, 4)
+            if max_temperature_count > 0
+            else None,
+            round(min_temperature_sum / min_temperature_count, 4)
+            if min_temperature_count > 0
+            else None,
+            round(precipitation_sum, 4) if precipitation_count > 0 else 0,
+        )
+    return aggregates_dict
+
+
+def aggregates_query(partitions=None):
+    """
+    Core select of 'aggregates' rows in the column order expected by 'aggregates_statistics'
+    Params: partitions --> optional set of (year, station) to restrict the select to
+    """
+    query = select(
+        Aggregates.year,
+        Aggregates.station_id,
+        Aggregates.max_temperature_count,
+        Aggregates.max_temperature_sum,
+        Aggregates.min_temperature_count,
+        Aggregates.min_temperature_sum,
+        Aggregates.precipitation_count,
+        Aggregates.precipitation_sum,
+    )
+    if partitions is not None:
+        query = query.where(
+            Aggregates.aggregate_id.in_(
+                [f"{year}{station}" for year, station in partitions]
+            )
+        )
+    return query
+
+
+def partition_filter(year, station):
+    """
+    Builds the 'readings' WHERE conditions of a year-station partition as a station and date range,
+    so the partition is read with a single seek of the (station_id, date) index
+    """
+    return [
+        Readings.station_id == station,
+        Readings.date.between(year * 10000 + 101, year * 10000 + 1231),
+    ]
+
+
+def results_records_builder(aggregates_dict):
+    """
+    Converts {(year, station): statistics} into 'results' table records
+    """
+    return [
+        {
+            "result_id": f"{year}{station}",
+            "year": int(year),
+            "station_id": station,
+            "avg_max_temperature": avg_max_temperature,
+            "avg_min_temperature": avg_min_temperature,
+            "total_accumulated_precipitation": total_accumulated_precipitation,
+        }
+        for (year, station), (
+            avg_max_temperature,
+            avg_min_temperature,
+            total_accumulated_precipitation,
+        ) in aggregates_dict.items()
+    ]
+
+
+def results_upsert_statement():
+    """
+    INSERT ... ON CONFLICT DO UPDATE statement refreshing 'results' rows in place
+    """
+    upsert_statement = insert(Results)
+    return upsert_statement.on_conflict_do_update(
+        index_elements=[Results.result_id],
+        set_={
+            column: upsert_statement.excluded[column]
+            for column in (
+                "avg_max_temperature",
+                "avg_min_temperature",
+                "total_accumulated_precipitation",
+            )
+        },
+    )
 
 
 class StatsUtilities:
@@ -17,10 +135,16 @@ class StatsUtilities:
     Contains methods for calculating weather statistics
     """
 
-    root_directory = current_app.config["ROOT_DIR"]
     formatter = logging.Formatter("%(asctime)s: %(message)s")
 
-    def __init__(self):
+    def __init__(self, partitions=None, source="readings"):
+        self.root_directory = current_app.config["ROOT_DIR"]
+        # (year, station) combinations to recompute; None recomputes every combination
+        self.partitions = set(partitions) if partitions is not None else None
+        # 'readings' rescans raw records and verifies 'aggregates' against them;
+        # 'aggregates' reads the running sums maintained by ingestion;
+        # 'columnar' scans the Parquet copy of 'readings' (see columnar_store)
+        self.source = source
         self.years_list = None
         self.stations_list = None
         self.avg_max_temperature_var = None
@@ -29,6 +153,7 @@ class StatsUtilities:
         self.stats_dict = None
         self.result_json = None
         self.bulk_insert_list = None
+        self.metrics_rows_written = None
 
         # Setup process logger
         self.log_folder_path = f"{self.root_directory}/logs"
@@ -46,6 +171,13 @@ class StatsUtilities:
 
         self.logger.info("=============== Logger setup complete ===============")
         self.logger.info("Log file location: %s", f"{self.log_file_path}")
+        self.logger.info(
+            "Statistics mode: %s",
+            "full"
+            if self.partitions is None
+            else f"incremental ({len(self.partitions)} ingested year-station combinations)",
+        )
+        self.logger.info("Statistics source: %s", f"{self.source}")
         self.logger.info("=============== ===================== ===============")
 
     def close_logger(self):
@@ -60,23 +192,43 @@ class StatsUtilities:
     def data_extractor(self):
         """
         Extracts list of distinct years and stations from 'readings' table
-        -- Future Enhancement: Also check if year-station combination result already exists in 'results.id'
-            -- We only calculate stat results for year-station combinations not in 'results.id'
+        In incremental mode, year-station combinations without a 'results.result_id' are added to
+        the partitions to recompute, so a new year or station fills in the whole report grid
         """
+        if self.source == "columnar":
+            # Partition directories already list every year-station combination
+            partition_keys = columnar_partition_keys()
+            years_extract = {(year,) for year, _ in partition_keys}
+            stations_extract = {(station,) for _, station in partition_keys}
+        else:
+            source_model = Aggregates if self.source == "aggregates" else Readings
+            years_extract = db.session.query(source_model.year).distinct().all()
+            stations_extract = (
+                db.session.query(source_model.station_id).distinct().all()
+            )
         # Extract distinct years list
-        years_extract = db.session.query(Readings.year).distinct().all()
         self.years_list = []
         for year_tuple in years_extract:
             for year in year_tuple:
                 self.years_list.append(year)
         self.years_list.sort()
         # Extract distinct stations list
-        stations_extract = db.session.query(Readings.station_id).distinct().all()
         self.stations_list = []
         for station_tuple in stations_extract:
             for station in station_tuple:
                 self.stations_list.append(station)
         self.stations_list.sort()
+        if self.partitions is not None:
+            result_id_extract = db.session.query(Results.result_id).all()
+            existing_result_ids = {result_id for (result_id,) in result_id_extract}
+            for year in self.years_list:
+                for station in self.stations_list:
+                    if f"{year}{station}" not in existing_result_ids:
+                        self.partitions.add((year, station))
+            self.logger.info(
+                "Number of year-station combinations to recompute: %s",
+                f"{len(self.partitions)}",
+            )
         return self.years_list, self.stations_list
 
     def avg_max_temperature_calculator(self, year, station):
@@ -86,7 +238,7 @@ class StatsUtilities:
         try:
             max_temperature_extract = (
                 db.session.query(Readings.max_temperature)
-                .filter_by(year=year, station_id=station)
+                .filter(*partition_filter(year=year, station=station))
                 .all()
             )
             # ignoring missing data while calculating stats
@@ -107,7 +259,7 @@ class StatsUtilities:
         try:
             min_temperature_extract = (
                 db.session.query(Readings.min_temperature)
-                .filter_by(year=year, station_id=station)
+                .filter(*partition_filter(year=year, station=station))
                 .all()
             )
             # ignoring missing data while calculating stats
@@ -128,7 +280,7 @@ class StatsUtilities:
         try:
             precipitation_extract = (
                 db.session.query(Readings.precipitation)
-                .filter_by(year=year, station_id=station)
+                .filter(*partition_filter(year=year, station=station))
                 .all()
             )
             # ignoring missing data while calculating stats
@@ -142,39 +294,106 @@ class StatsUtilities:
             self.total_accumulated_precipitation_var = None
         return self.total_accumulated_precipitation_var
 
+    def statistics_aggregator(self):
+        """
+        Computes all weather statistics for every year-station combination in a single grouped scan
+        AVG ignores missing (NULL) values like the per-pair calculators; stations without any
+        precipitation value get a total of 0
+        Returns {(year, station): (avg_max_temperature, avg_min_temperature, total_accumulated_precipitation)}
+        """
+        if self.source == "aggregates":
+            return aggregates_statistics(
+                db.session.execute(aggregates_query(partitions=self.partitions)).all()
+            )
+        if self.source == "columnar":
+            stations_filter = None
+            years_filter = None
+            if self.partitions:
+                # Partition pruning; extra combinations are skipped by statistics_calculator
+                stations_filter = {station for _, station in self.partitions}
+                years_filter = (
+                    min(year for year, _ in self.partitions),
+                    max(year for year, _ in self.partitions),
+                )
+            columnar_rows = columnar_aggregates(
+                group_by="year_station", stations=stations_filter, years=years_filter
+            )
+            return aggregates_statistics(
+                (
+                    columnar_row["year"],
+                    columnar_row["station_id"],
+                    columnar_row["max_temperature_count"],
+                    columnar_row["max_temperature_sum"],
+                    columnar_row["min_temperature_count"],
+                    columnar_row["min_temperature_sum"],
+                    columnar_row["precipitation_count"],
+                    columnar_row["precipitation_sum"],
+                )
+                for columnar_row in columnar_rows
+            )
+        readings_query = db.session.query(
+            Readings.year,
+            Readings.station_id,
+            func.avg(Readings.max_temperature),
+            func.avg(Readings.min_temperature),
+            func.coalesce(func.sum(Readings.precipitation), 0),
+        )
+        if self.partitions is not None:
+            # Scan only the years and stations being recomputed
+            readings_query = readings_query.filter(
+                Readings.year.in_({year for year, _ in self.partitions}),
+                Readings.station_id.in_({station for _, station in self.partitions}),
+            )
+        aggregates_extract = readings_query.group_by(
+            Readings.year, Readings.station_id
+        ).all()
+        aggregates_dict = {}
+        for (
+            year,
+            station,
+            avg_max_temperature,
+            avg_min_temperature,
+            total_accumulated_precipitation,
+        ) in aggregates_extract:
+            aggregates_dict[(year, station)] = (
+                round(avg_max_temperature, 4)
+                if avg_max_temperature is not None
+                else None,
+                round(avg_min_temperature, 4)
+                if avg_min_temperature is not None
+                else None,
+                round(total_accumulated_precipitation, 4),
+            )
+        return aggregates_dict
+
     def statistics_calculator(self):
         """
-        Integrates
-        'avg_max_temperature_calculator',
-        'avg_min_temperature_calculator', and
-        'total_accumulated_precipitation_calculator' functions to run within year>station loop
+        Builds the year>station statistics dict from 'statistics_aggregator' output
+        Year-station combinations without readings keep the per-pair calculators' output:
+        no averages and a total precipitation of 0
+        In incremental mode only the partitions being recomputed are included
         """
+        aggregates_dict = StatsUtilities.statistics_aggregator(self)
         self.stats_dict = {}
         for year in self.years_list:
             self.logger.info("Computing statistics for the year: %s", f"{year}")
             self.stats_dict[year] = {}
             for station in self.stations_list:
-                self.stats_dict[year][station] = {}
-                avg_max_temperature_calculator_op = (
-                    StatsUtilities.avg_max_temperature_calculator(self, year, station)
-                )
-                self.stats_dict[year][station][
-                    "avg_max_temperature"
-                ] = avg_max_temperature_calculator_op
-                avg_min_temperature_calculator_op = (
-                    StatsUtilities.avg_min_temperature_calculator(self, year, station)
-                )
-                self.stats_dict[year][station][
-                    "avg_min_temperature"
-                ] = avg_min_temperature_calculator_op
-                total_accumulated_precipitation_calculator_op = (
-                    StatsUtilities.total_accumulated_precipitation_calculator(
-                        self, year, station
-                    )
-                )
-                self.stats_dict[year][station][
-                    "total_accumulated_precipitation"
-                ] = total_accumulated_precipitation_calculator_op
+                if (
+                    self.partitions is not None
+                    and (year, station) not in self.partitions
+                ):
+                    continue
+                (
+                    avg_max_temperature,
+                    avg_min_temperature,
+                    total_accumulated_precipitation,
+                ) = aggregates_dict.get((year, station), (None, None, 0))
+                self.stats_dict[year][station] = {
+                    "avg_max_temperature": avg_max_temperature,
+                    "avg_min_temperature": avg_min_temperature,
+                    "total_accumulated_precipitation": total_accumulated_precipitation,
+                }
         return self.stats_dict
 
     def results_json_writer(self):
@@ -184,10 +403,39 @@ class StatsUtilities:
         root_directory = current_app.config["ROOT_DIR"]
         results_directory = f"{root_directory}/results"
         date_time_stamp = str(datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        report_dict = self.stats_dict
+        if self.partitions is not None:
+            # Complete the report with the unchanged statistics from 'results' table
+            report_dict = {year: {} for year in self.years_list}
+            results_extract = db.session.query(
+                Results.year,
+                Results.station_id,
+                Results.avg_max_temperature,
+                Results.avg_min_temperature,
+                Results.total_accumulated_precipitation,
+            ).all()
+            for (
+                year,
+                station,
+                avg_max_temperature,
+                avg_min_temperature,
+                total_accumulated_precipitation,
+            ) in results_extract:
+                report_dict.setdefault(year, {})[station] = {
+                    "avg_max_temperature": avg_max_temperature,
+                    "avg_min_temperature": avg_min_temperature,
+                    "total_accumulated_precipitation": total_accumulated_precipitation,
+                }
+            for year, year_stats in self.stats_dict.items():
+                report_dict[year].update(year_stats)
+            report_dict = {
+                year: dict(sorted(report_dict[year].items()))
+                for year in sorted(report_dict)
+            }
         with open(
             file=f"{results_directory}/results_{date_time_stamp}.json", mode="w"
         ) as outfile:
-            json.dump(self.stats_dict, outfile)
+            json.dump(report_dict, outfile)
         with open(
             f"{results_directory}/results_{date_time_stamp}.json", mode="r"
         ) as infile:
@@ -197,49 +445,134 @@ class StatsUtilities:
     def results_db_writer(self):
         """
         Writes weather statistics to 'results' table
+        Existing year-station results are updated in place so late-arriving readings are reflected
         """
-        result_id_list = db.session.query(Results.result_id).all()
-        distinct_result_id_list = list(set(result_id_list))
-        distinct_result_id_dict = {}
-        for item in distinct_result_id_list:
-            distinct_result_id_dict[f"{item[0]}"] = None
-        self.bulk_insert_list = []
-        result_json_years = self.result_json.keys()
-        for year_key in result_json_years:
-            result_json_stations = self.result_json[year_key].keys()
-            for station_key in result_json_stations:
-                record_result_id = f"{year_key}{station_key}"
-                # Check for duplicates
-                result = record_result_id in distinct_result_id_dict
-                if result == 0:
-                    distinct_result_id_dict[f"{record_result_id}"] = None
-                    record_dict = {
-                        "result_id": f"{record_result_id}",
-                        "year": int(year_key),
-                        "station_id": station_key,
-                        "avg_max_temperature": self.result_json[year_key][station_key][
-                            "avg_max_temperature"
-                        ],
-                        "avg_min_temperature": self.result_json[year_key][station_key][
-                            "avg_min_temperature"
-                        ],
-                        "total_accumulated_precipitation": self.result_json[year_key][
-                            station_key
-                        ]["total_accumulated_precipitation"],
-                    }
-                    self.bulk_insert_list.append(record_dict)
+        self.bulk_insert_list = results_records_builder(
+            {
+                (year_key, station_key): (
+                    station_stats["avg_max_temperature"],
+                    station_stats["avg_min_temperature"],
+                    station_stats["total_accumulated_precipitation"],
+                )
+                for year_key, year_stats in self.stats_dict.items()
+                for station_key, station_stats in year_stats.items()
+            }
+        )
         if len(self.bulk_insert_list) > 0:
             self.logger.info(
-                "Number of new results identified: %s", f"{len(self.bulk_insert_list)}"
+                "Number of results to insert or update: %s",
+                f"{len(self.bulk_insert_list)}",
             )
-            self.logger.info("START: Bulk insertion of results")
-            # db.session.query(Results).delete()
-            # db.session.commit()
-            db.session.execute(insert(Results), self.bulk_insert_list)
+            self.logger.info("START: Bulk upsert of results")
+            db.session.execute(results_upsert_statement(), self.bulk_insert_list)
             db.session.commit()
-            self.logger.info("END: Bulk insertion of results")
+            self.logger.info("END: Bulk upsert of results")
+            results_cache_invalidator(partitions=self.partitions)
         else:
-            self.logger.info("Number of new results identified: 0")
+            self.logger.info("Number of results to insert or update: 0")
+
+    def metrics_calculator(self):
+        """
+        Recomputes the metrics engine's 'station_metrics' rows of the partitions being recomputed
+        """
+        self.logger.info("START: Metrics engine pass")
+        self.metrics_rows_written = metrics_db_writer(partitions=self.partitions)
+        self.logger.info(
+            "END: Metrics engine pass, rows written: %s", f"{self.metrics_rows_written}"
+        )
+        return self.metrics_rows_written
+
+    @staticmethod
+    def aggregates_rebuilder(partitions=None):
+        """
+        Recomputes 'aggregates' rows and their 'monthly_aggregates' cells from 'readings'
+        Params: partitions --> optional set of (year, station) to rebuild; None rebuilds the table
+        """
+        aggregates_delete = delete(Aggregates)
+        readings_select = select(
+            (cast(Readings.year, db.String) + Readings.station_id).label(
+                "aggregate_id"
+            ),
+            Readings.year,
+            Readings.station_id,
+            func.count(Readings.max_temperature),
+            func.total(Readings.max_temperature),
+            func.count(Readings.min_temperature),
+            func.total(Readings.min_temperature),
+            func.count(Readings.precipitation),
+            func.total(Readings.precipitation),
+        ).group_by(Readings.year, Readings.station_id)
+        if partitions is not None:
+            aggregates_delete = aggregates_delete.where(
+                Aggregates.aggregate_id.in_(
+                    [f"{year}{station}" for year, station in partitions]
+                )
+            )
+            readings_select = readings_select.where(
+                Readings.year.in_({year for year, _ in partitions}),
+                Readings.station_id.in_({station for _, station in partitions}),
+            ).having(
+                (cast(Readings.year, db.String) + Readings.station_id).in_(
+                    [f"{year}{station}" for year, station in partitions]
+                )
+            )
+        db.session.execute(aggregates_delete)
+        db.session.execute(
+            insert(Aggregates).from_select(
+                [
+                    "aggregate_id",
+                    "year",
+                    "station_id",
+                    "max_temperature_count",
+                    "max_temperature_sum",
+                    "min_temperature_count",
+                    "min_temperature_sum",
+                    "precipitation_count",
+                    "precipitation_sum",
+                ],
+                readings_select,
+            )
+        )
+        monthly_aggregates_rebuilder(partitions=partitions)
+        db.session.commit()
+        MONTHLY_CUBE.invalidate()
+
+    def aggregates_verifier(self):
+        """
+        Compares statistics recomputed from 'readings' with those read out of 'aggregates'
+        Mismatching partitions are logged and their aggregates rebuilt from 'readings'
+        """
+        recomputed_dict = {
+            (year, station): tuple(station_stats.values())
+            for year, year_stats in self.stats_dict.items()
+            for station, station_stats in year_stats.items()
+        }
+        aggregates_dict = aggregates_statistics(
+            db.session.execute(aggregates_query(partitions=self.partitions)).all()
+        )
+        mismatched_partitions = set()
+        for partition, recomputed_stats in recomputed_dict.items():
+            aggregate_stats = aggregates_dict.get(partition, (None, None, 0))
+            for recomputed_value, aggregate_value in zip(
+                recomputed_stats, aggregate_stats
+            ):
+                if recomputed_value is None or aggregate_value is None:
+                    matches = recomputed_value is aggregate_value
+                else:
+                    # Summation order differs between a rescan and running sums
+                    matches = abs(recomputed_value - aggregate_value) < 0.0002
+                if not matches:
+                    mismatched_partitions.add(partition)
+        self.logger.info(
+            "Number of year-station aggregates mismatching readings: %s",
+            f"{len(mismatched_partitions)}",
+        )
+        if len(mismatched_partitions) > 0:
+            self.logger.info(
+                "Rebuilding aggregates for: %s", f"{sorted(mismatched_partitions)}"
+            )
+            StatsUtilities.aggregates_rebuilder(partitions=mismatched_partitions)
+        return mismatched_partitions
 
     def analytics_orchestrator(self):
         """
@@ -254,8 +587,14 @@ class StatsUtilities:
         StatsUtilities.statistics_calculator(self)
         self.logger.info("RUN: analytics_orchestrator >> results_json_writer")
         StatsUtilities.results_json_writer(self)
+        # Before results_db_writer, whose cache eviction also covers the metrics
+        self.logger.info("RUN: analytics_orchestrator >> metrics_calculator")
+        StatsUtilities.metrics_calculator(self)
         self.logger.info("RUN: analytics_orchestrator >> results_db_writer")
         StatsUtilities.results_db_writer(self)
+        if self.source == "readings":
+            self.logger.info("RUN: analytics_orchestrator >> aggregates_verifier")
+            StatsUtilities.aggregates_verifier(self)
         self.logger.info("END: analytics_orchestrator")
         process_end_time = datetime.now()
         self.logger.info("Process End DateTime: %s", f"{process_end_time}")
@@ -0,0 +1,185 @@
+"""
+Contains methods for loading yld_data crop yields and relating them to weather statistics
+Correlations and regressions of every 'results' statistic with the yearly corn grain yield are
+computed for all stations at once on (metric, station, year) numpy arrays
+"""
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from application import db
+from application.data_model import Results, Yields
+
+# 'results' statistics that can be related to the yield
+YIELD_METRICS = (
+    "avg_max_temperature",
+    "avg_min_temperature",
+    "total_accumulated_precipitation",
+)
+# Fewest years with both a statistic and a yield for a correlation to be reported
+YIELD_MIN_YEARS = 3
+# Key of the correlation of the all-station yearly mean of a statistic
+ALL_STATIONS = "all_stations"
+
+
+def yld_data_parser(file_path):
+    """
+    Parses a tab separated yld_data file of (year, yield) lines
+    Returns a list of 'yields' table records
+    Raises ValueError on malformed lines
+    """
+    yields_records = []
+    with open(file_path, mode="r") as infile:
+        for line_number, line in enumerate(infile, start=1):
+            if line.strip() == "":
+                continue
+            fields = line.split()
+            if len(fields) != 2 or not all(field.isdigit() for field in fields):
+                raise ValueError(
+                    f"malformed yld_data line {line_number} in {file_path}: {line!r}"
+                )
+            yields_records.append(
+                {"year": int(fields[0]), "corn_grain_yield": int(fields[1])}
+            )
+    return yields_records
+
+
+def yields_loader(file_path=None):
+    """
+    Loads a yld_data file into 'yields' table; years already loaded are updated in place
+    Params: file_path --> yld_data file, Config.YLD_DATA_FILE by default
+    Returns the number of loaded years
+    """
+    yields_records = yld_data_parser(
+        file_path=file_path or current_app.config["YLD_DATA_FILE"]
+    )
+    if len(yields_records) > 0:
+        upsert_statement = insert(Yields)
+        db.session.execute(
+            upsert_statement.on_conflict_do_update(
+                index_elements=[Yields.year],
+                set_={"corn_grain_yield": upsert_statement.excluded.corn_grain_yield},
+            ),
+            yields_records,
+        )
+        db.session.commit()
+    return len(yields_records)
+
+
+def yield_matrix_builder(metrics, stations=None):
+    """
+    Reads the 'results' statistics of the years with a yield into dense arrays
+    Params: metrics --> YIELD_METRICS entries
+            stations --> optional list of station ids to restrict the read to
+    Returns (stations array, years array, yields array of shape (years,),
+             statistics array of shape (metrics, stations, years) with NaN where missing)
+    """
+    yields_extract = db.session.execute(
+        select(Yields.year, Yields.corn_grain_yield).order_by(Yields.year)
+    ).all()
+    years = np.array([year for year, _ in yields_extract], dtype=np.int64)
+    yields = np.array([value for _, value in yields_extract], dtype=np.float64)
+    results_query = select(
+        Results.station_id,
+        Results.year,
+        *[getattr(Results, metric) for metric in metrics],
+    ).where(Results.year.in_(years.tolist()))
+    if stations is not None:
+        results_query = results_query.where(Results.station_id.in_(stations))
+    results_extract = db.session.execute(results_query).all()
+    if len(results_extract) == 0:
+        return (
+            np.array([], dtype=object),
+            years,
+            yields,
+            np.empty((len(metrics), 0, len(years))),
+        )
+    results_columns = list(zip(*results_extract))
+    station_ids, station_indexes = np.unique(
+        np.array(results_columns[0], dtype=object), return_inverse=True
+    )
+    year_indexes = np.searchsorted(years, np.array(results_columns[1]))
+    statistics = np.full((len(metrics), len(station_ids), len(years)), np.nan)
+    # None (missing statistic) becomes NaN
+    statistics[:, station_indexes, year_indexes] = np.array(
+        results_columns[2:], dtype=np.float64
+    )
+    return station_ids, years, yields, statistics
+
+
+def yield_regressions(statistics, yields):
+    """
+    Pearson correlations and least squares fits of yield = slope * statistic + intercept over
+    the years where both are known, for every (metric, series) pair at once
+    Params: statistics --> array of shape (metrics, series, years), NaN where missing
+            yields --> array of shape (years,)
+    Returns a dict of arrays of shape (metrics, series): years_count, correlation, r_squared,
+    slope, intercept; NaN where fewer than YIELD_MIN_YEARS years or a constant statistic
+    """
+    known = ~np.isnan(statistics) & ~np.isnan(yields)
+    years_count = known.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        statistics_mean = np.where(known, statistics, 0.0).sum(axis=-1) / years_count
+        yields_mean = np.where(known, yields, 0.0).sum(axis=-1) / years_count
+        statistics_deviation = np.where(
+            known, statistics - statistics_mean[..., np.newaxis], 0.0
+        )
+        yields_deviation = np.where(known, yields - yields_mean[..., np.newaxis], 0.0)
+        statistics_variation = (statistics_deviation**2).sum(axis=-1)
+        yields_variation = (yields_deviation**2).sum(axis=-1)
+        covariation = (statistics_deviation * yields_deviation).sum(axis=-1)
+        correlation = covariation / np.sqrt(statistics_variation * yields_variation)
+        slope = covariation / statistics_variation
+    intercept = yields_mean - slope * statistics_mean
+    undefined = (years_count < YIELD_MIN_YEARS) | (statistics_variation == 0)
+    regressions = {
+        "correlation": correlation,
+        "r_squared": correlation**2,
+        "slope": slope,
+        "intercept": intercept,
+    }
+    for name, values in regressions.items():
+        regressions[name] = np.where(undefined, np.nan, values)
+    regressions["years_count"] = years_count
+    return regressions
+
+
+def yield_correlations(metrics=YIELD_METRICS, stations=None):
+    """
+    Relates the yearly corn grain yield to the 'results' statistics of every station and to
+    their all-station yearly mean
+    Params: metrics --> YIELD_METRICS entries
+            stations --> optional list of station ids
+    Returns {metric: {ALL_STATIONS: regression, station_id: regression, ...}} where a regression
+    is a dict of years_count, correlation, r_squared, slope and intercept (None when undefined)
+    """
+    station_ids, _, yields, statistics = yield_matrix_builder(
+        metrics=metrics, stations=stations
+    )
+    if len(station_ids) == 0:
+        return {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Years without any station statistic are left NaN
+        all_stations_statistics = np.nansum(statistics, axis=1, keepdims=True) / (
+            ~np.isnan(statistics)
+        ).sum(axis=1, keepdims=True)
+    regressions = yield_regressions(
+        statistics=np.concatenate([all_stations_statistics, statistics], axis=1),
+        yields=yields,
+    )
+    series_keys = [ALL_STATIONS, *station_ids.tolist()]
+    correlations = {}
+    for metric_index, metric in enumerate(metrics):
+        correlations[metric] = {}
+        for series_index, series_key in enumerate(series_keys):
+            regression = {
+                "years_count": int(
+                    regressions["years_count"][metric_index, series_index]
+                )
+            }
+            for name in ("correlation", "r_squared", "slope", "intercept"):
+                value = regressions[name][metric_index, series_index]
+                regression[name] = None if np.isnan(value) else round(float(value), 4)
+            correlations[metric][series_key] = regression
+    return correlations
@@ -0,0 +1,126 @@
+"""
+This module deals with serving the following background jobs endpoints:
+    - /api/jobs
+    - /api/jobs/<job_id>
+"""
+
+from flask_restx import Namespace, Resource
+from flask_restx import reqparse
+from application import db
+from application.data_model import Jobs
+from application.jobs.job_queue import JOB_STATES, JOB_TYPES, job_serializer
+
+# Jobs returned by /api/jobs when no limit is given
+JOBS_DEFAULT_LIMIT = 50
+
+jobs_namespace = Namespace(
+    "Job APIs",
+    description="APIs for following queued ingestion and analytics jobs",
+    path="/jobs",
+)
+
+
+@jobs_namespace.route("")
+class ApiJobs(Resource):
+    """
+    This resource lists jobs of the 'jobs' queue, newest first, with following query params:
+        - state
+        - job_type
+        - limit
+    """
+
+    @jobs_namespace.doc("get-jobs")
+    @jobs_namespace.param(
+        "state",
+        description=f"Job state: one of {', '.join(JOB_STATES)}.",
+        required=False,
+        example="running",
+    )
+    @jobs_namespace.param(
+        "job_type",
+        description=f"Job type: one of {', '.join(JOB_TYPES)}.",
+        required=False,
+        example="ingestion",
+    )
+    @jobs_namespace.param(
+        "limit",
+        description=f"Number of jobs returned (default {JOBS_DEFAULT_LIMIT}).",
+        required=False,
+        example="10",
+    )
+    @jobs_namespace.response(200, description="Success")
+    @jobs_namespace.response(400, description="Malformed request syntax")
+    def get(self):
+        """
+        API resource providing state, attempts and progress of queued jobs
+        Progress of ingestion jobs reports files done, rows inserted and rows/s
+        """
+        parser = reqparse.RequestParser(bundle_errors=True)
+        parser.add_argument(
+            "state", required=False, type=str, help="Required format: running"
+        )
+        parser.add_argument(
+            "job_type", required=False, type=str, help="Required format: ingestion"
+        )
+        parser.add_argument(
+            "limit",
+            required=False,
+            type=str,
+            help="Required format: 10; Required condition: >0",
+        )
+        args = parser.parse_args(strict=True)
+        state = args["state"]
+        job_type = args["job_type"]
+        limit = args["limit"]
+        if (
+            (state is not None and state not in JOB_STATES)
+            or (job_type is not None and job_type not in JOB_TYPES)
+            or (limit is not None and (not limit.isdigit() or int(limit) == 0))
+        ):
+            response = {
+                "endpoint": "/jobs",
+                "args": args,
+                "message": "The server cannot process the request due to malformed request syntax",
+            }
+            return response, 400
+        jobs_query = db.session.query(Jobs)
+        if state is not None:
+            jobs_query = jobs_query.filter(Jobs.state == state)
+        if job_type is not None:
+            jobs_query = jobs_query.filter(Jobs.job_type == job_type)
+        jobs = (
+            jobs_query.order_by(Jobs.job_id.desc())
+            .limit(JOBS_DEFAULT_LIMIT if limit is None else int(limit))
+            .all()
+        )
+        response = {
+            "endpoint": "/jobs",
+            "args": args,
+            "output_count": len(jobs),
+            "response": [job_serializer(job) for job in jobs],
+        }
+        return response, 200
+
+
+@jobs_namespace.route("/<int:job_id>")
+class ApiJob(Resource):
+    """
+    This resource reports a single job of the 'jobs' queue
+    """
+
+    @jobs_namespace.doc("get-job")
+    @jobs_namespace.response(200, description="Success")
+    @jobs_namespace.response(404, description="Not found")
+    def get(self, job_id):
+        """
+        API resource providing state, attempts and progress of a job
+        """
+        job = db.session.get(Jobs, job_id)
+        if job is None:
+            response = {
+                "endpoint": f"/jobs/{job_id}",
+                "message": "Job could not be found",
+            }
+            return response, 404
+        response = {"endpoint": f"/jobs/{job_id}", "response": job_serializer(job)}
+        return response, 200
@@ -0,0 +1,313 @@
+"""
+This module contains the in-process LRU response cache of the weather endpoints
+Entries are evicted precisely by ingestion and analytics for the data they changed
+"""
+
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import threading
+from time import monotonic
+from flask import Response, current_app, request
+from flask_restx.utils import unpack
+
+# Response statuses that only depend on the stored data and can be cached
+CACHEABLE_STATUSES = (200, 204, 404)
+
+
+class ResponseCache:
+    """
+    LRU cache of encoded API responses keyed on (endpoint, normalized args), bounded by the
+    number of entries and the total size of their bodies
+    Every entry keeps the scope (endpoint, date range/year, stations) of its filters so writers
+    can evict only the entries their new data could change
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Total size of the cached bodies in bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, cache_key):
+        """
+        Returns the cached entry of 'cache_key' (marked as most recently used) or None
+        """
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is None:
+                self.misses = self.misses + 1
+                return None
+            self.entries.move_to_end(cache_key)
+            self.hits = self.hits + 1
+            return entry
+
+    def set(self, cache_key, entry, max_entries, max_bytes):
+        """
+        Stores 'entry', evicting least recently used entries beyond 'max_entries' or while the
+        cached bodies exceed 'max_bytes'
+        """
+        with self.lock:
+            replaced_entry = self.entries.pop(cache_key, None)
+            if replaced_entry is not None:
+                self.total_bytes = self.total_bytes - len(replaced_entry["body"])
+            self.entries[cache_key] = entry
+            self.total_bytes = self.total_bytes + len(entry["body"])
+            while len(self.entries) > max_entries or self.total_bytes > max_bytes:
+                _, evicted_entry = self.entries.popitem(last=False)
+                self.total_bytes = self.total_bytes - len(evicted_entry["body"])
+                self.evictions = self.evictions + 1
+
+    def invalidate(self, is_stale):
+        """
+        Removes the entries whose scope satisfies 'is_stale'
+        Returns the number of removed entries
+        """
+        with self.lock:
+            stale_keys = [
+                cache_key
+                for cache_key, entry in self.entries.items()
+                if is_stale(entry["scope"])
+            ]
+            for cache_key in stale_keys:
+                self.total_bytes = self.total_bytes - len(
+                    self.entries.pop(cache_key)["body"]
+                )
+            self.invalidations = self.invalidations + len(stale_keys)
+        return len(stale_keys)
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters
+        """
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def counters(self):
+        """
+        Returns the cache size and hit/miss/eviction/invalidation counters
+        """
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+RESPONSE_CACHE = ResponseCache()
+
+
+class ReadingsCountCache:
+    """
+    Size-bounded cache of filtered readings counts, each reused for a maximum age
+    Counts are kept in the order they were taken, so expired ones are pruned from the front
+    """
+
+    def __init__(self):
+        # count key --> (readings count, monotonic time the count was taken)
+        self.counts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, count_key, max_age):
+        """
+        Returns the count of 'count_key' if it was taken less than 'max_age' seconds ago, else None
+        """
+        with self.lock:
+            cached_count = self.counts.get(count_key)
+        if cached_count is None or monotonic() - cached_count[1] >= max_age:
+            return None
+        return cached_count[0]
+
+    def set(self, count_key, count, max_age, max_entries):
+        """
+        Stores 'count', pruning expired counts and the oldest ones beyond 'max_entries'
+        """
+        with self.lock:
+            now = monotonic()
+            self.counts[count_key] = (count, now)
+            self.counts.move_to_end(count_key)
+            while len(self.counts) > 0 and (
+                len(self.counts) > max_entries
+                or now - next(iter(self.counts.values()))[1] >= max_age
+            ):
+                self.counts.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes every count
+        """
+        with self.lock:
+            self.counts.clear()
+
+
+READINGS_COUNT_CACHE = ReadingsCountCache()
+
+
+def integer_arg(value, length):
+    """
+    Returns 'value' as an integer if it is a 'length' digits string, else None
+    """
+    if value is not None and len(value) == length and value.isdigit():
+        return int(value)
+    return None
+
+
+def stations_arg(value):
+    """
+    Returns comma separated station ids as a frozenset of upper case ids, or None when 'value' is
+    missing or holds an id without the station id length
+    """
+    if value is None:
+        return None
+    stations = frozenset(station.strip().upper() for station in value.split(","))
+    if any(len(station) != 11 for station in stations):
+        return None
+    return stations
+
+
+def scope_builder(endpoint, request_args):
+    """
+    Returns the scope of a cached response: the date range (YYYYMMDD integers, 'date' being
+    start = end = date), the year and the stations its filters select, None meaning unfiltered
+    """
+    date = integer_arg(request_args.get("date"), 8)
+    return {
+        "endpoint": endpoint,
+        "start": date
+        if date is not None
+        else integer_arg(request_args.get("start"), 8),
+        "end": date if date is not None else integer_arg(request_args.get("end"), 8),
+        "year": integer_arg(request_args.get("year"), 4),
+        "stations": stations_arg(request_args.get("station")),
+    }
+
+
+def cache_key_builder(endpoint, request_args):
+    """
+    Normalizes request args into a cache key, so e.g. 'station=usc00110072&page=01' and
+    'page=1&station=USC00110072' share an entry
+    """
+    normalized_args = []
+    for arg, value in request_args.items(multi=True):
+        if arg == "station":
+            value = value.upper()
+        elif arg == "page" and value.isdigit():
+            value = str(int(value))
+        elif arg == "count":
+            value = value.lower()
+        normalized_args.append((arg, value))
+    return endpoint, tuple(sorted(normalized_args))
+
+
+def cached_response(endpoint):
+    """
+    Decorator caching the encoded responses of a flask-restx Resource.get method
+    Responses carry an ETag; a matching If-None-Match is answered with 304 Not Modified
+    Params: endpoint --> '/weather' (date range/stations scoped) or '/weather/stats'
+            (year/stations scoped)
+    """
+
+    def decorator(get_method):
+        @wraps(get_method)
+        def wrapper(resource, *args, **kwargs):
+            max_entries = current_app.config["API_CACHE_MAX_ENTRIES"]
+            max_bytes = current_app.config["API_CACHE_MAX_BYTES"]
+            cache_key = cache_key_builder(endpoint=endpoint, request_args=request.args)
+            entry = RESPONSE_CACHE.get(cache_key) if max_entries > 0 else None
+            cache_status = "HIT"
+            if entry is None:
+                cache_status = "MISS"
+                data, code, headers = unpack(get_method(resource, *args, **kwargs))
+                response = resource.api.make_response(data, code, headers=headers)
+                if code not in CACHEABLE_STATUSES or max_entries <= 0:
+                    return response
+                body = response.get_data()
+                # A body above the size bound would evict every entry and then itself
+                if len(body) > max_bytes:
+                    return response
+                entry = {
+                    "scope": scope_builder(
+                        endpoint=endpoint, request_args=request.args
+                    ),
+                    "status": code,
+                    "body": body,
+                    "mimetype": response.mimetype,
+                    "etag": hashlib.sha1(body).hexdigest(),
+                }
+                RESPONSE_CACHE.set(
+                    cache_key=cache_key,
+                    entry=entry,
+                    max_entries=max_entries,
+                    max_bytes=max_bytes,
+                )
+            response = Response(
+                entry["body"], status=entry["status"], mimetype=entry["mimetype"]
+            )
+            response.headers["X-Cache"] = cache_status
+            if entry["status"] == 200:
+                response.set_etag(entry["etag"])
+                response.make_conditional(request)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def readings_cache_invalidator(touched_dates):
+    """
+    Evicts '/weather' entries whose filters match records inserted by ingestion
+    Params: touched_dates --> dict of station --> (first date, last date) as YYYYMMDD integers
+    Returns the number of evicted entries
+    """
+    if len(touched_dates) == 0:
+        return 0
+
+    def is_stale(scope):
+        if scope["endpoint"] != "/weather":
+            return False
+        # Stale when a touched station of the scope received records within its date range
+        return any(
+            (scope["stations"] is None or station in scope["stations"])
+            and (scope["start"] is None or last_date >= scope["start"])
+            and (scope["end"] is None or first_date <= scope["end"])
+            for station, (first_date, last_date) in touched_dates.items()
+        )
+
+    return RESPONSE_CACHE.invalidate(is_stale=is_stale)
+
+
+def results_cache_invalidator(partitions=None):
+    """
+    Evicts '/weather/stats' entries whose filters match updated 'results' rows
+    Params: partitions --> set of (year, station) written; None evicts every stats entry
+    Returns the number of evicted entries
+    """
+    if partitions is not None and len(partitions) == 0:
+        return 0
+
+    def is_stale(scope):
+        if scope["endpoint"] != "/weather/stats":
+            return False
+        if partitions is None:
+            return True
+        return any(
+            (scope["year"] is None or year == scope["year"])
+            and (scope["stations"] is None or station in scope["stations"])
+            for year, station in partitions
+        )
+
+    return RESPONSE_CACHE.invalidate(is_stale=is_stale)
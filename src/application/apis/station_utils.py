@@ -0,0 +1,447 @@
+"""
+This module deals with serving the following station endpoints:
+    - /api/stations
+    - /api/stations/nearest
+    - /api/stations/bbox
+"""
+
+from flask_restx import Namespace, Resource
+from flask_restx import reqparse
+from sqlalchemy import select
+from application import db
+from application.analytics.station_utility import (
+    NEAREST_DEFAULT_COUNT,
+    NEAREST_MAX_COUNT,
+    STATION_INDEX,
+    bbox_stations,
+    nearest_stations,
+)
+from application.data_model import Readings, readings_schema, Results, results_schema
+
+# Records added to every matched station by the 'include' query param
+STATION_INCLUDES = ("results", "readings")
+STATIONS_NOT_FOUND_MESSAGE = "Stations could not be found; load their metadata with: flask --app run analytics load-stations"
+
+stations_namespace = Namespace(
+    "Station APIs",
+    description="APIs for finding stations from their GHCN-Daily metadata",
+    path="/stations",
+)
+
+
+def stations_args_parser():
+    """
+    Request parser of the query params shared by /stations/nearest and /stations/bbox
+    """
+    parser = reqparse.RequestParser(bundle_errors=True)
+    parser.add_argument(
+        "with_records", required=False, type=str, help="Required format: true/false"
+    )
+    parser.add_argument(
+        "include", required=False, type=str, help="Required format: results/readings"
+    )
+    parser.add_argument("year", required=False, type=str, help="Required format: 2012")
+    for date_arg in ("date", "start", "end"):
+        parser.add_argument(
+            date_arg, required=False, type=str, help="Required format: YYYYMMDD"
+        )
+    return parser
+
+
+def stations_include_parser(args):
+    """
+    Validates the with_records, include, year, date, start and end query params
+    Returns (with_records, include, year, readings filters of 'readings_filter_builder')
+    Raises ValueError for malformed params
+    """
+    # weather_utils registers this namespace when imported
+    from application.apis.weather_utils import readings_args_parser
+
+    with_records = (args["with_records"] or "true").lower()
+    include = None if args["include"] is None else args["include"].lower()
+    year = args["year"]
+    if with_records not in ("true", "false") or include not in (
+        None,
+        *STATION_INCLUDES,
+    ):
+        raise ValueError("Malformed with_records or include")
+    if year is not None and (len(year) != 4 or not year.isdigit()):
+        raise ValueError(f"Malformed year: {year}")
+    readings_filters = readings_args_parser(args={**args, "station": None})
+    return (
+        with_records == "true",
+        include,
+        None if year is None else int(year),
+        readings_filters,
+    )
+
+
+def stations_fan_out(stations, include, year, readings_filters):
+    """
+    Adds the 'results' (optionally of one year) or 'readings' (optionally of a date range) records
+    of the matched stations, read for all of them in one batched query
+    Readings are limited to PER_PAGE records in (station, date) order; /api/weather pages
+    through the rest with the same filters
+    Returns True when readings were left out by the limit
+    """
+    from application.apis.weather_utils import PER_PAGE, readings_filter_builder
+
+    station_ids = sorted(station["station_id"] for station in stations)
+    if include == "results":
+        schema = results_schema
+        fan_out_query = (
+            select(*[getattr(Results, field) for field in schema.Meta.fields])
+            .where(Results.station_id.in_(station_ids))
+            .order_by(Results.station_id, Results.year)
+        )
+        if year is not None:
+            fan_out_query = fan_out_query.where(Results.year == year)
+    else:
+        schema = readings_schema
+        fan_out_query = (
+            select(*[getattr(Readings, field) for field in schema.Meta.fields])
+            .where(
+                *readings_filter_builder(
+                    start=readings_filters["start"],
+                    end=readings_filters["end"],
+                    stations=station_ids,
+                )
+            )
+            .order_by(Readings.station_id, Readings.date)
+            .limit(PER_PAGE + 1)
+        )
+    fan_out_rows = db.session.execute(fan_out_query).all()
+    truncated = len(fan_out_rows) > PER_PAGE
+    station_records = {station["station_id"]: [] for station in stations}
+    station_position = schema.Meta.fields.index("station_id")
+    for row in fan_out_rows[:PER_PAGE]:
+        station_records[row[station_position]].append(
+            dict(zip(schema.Meta.fields, row))
+        )
+    for station in stations:
+        station[include] = station_records[station["station_id"]]
+    return include == "readings" and truncated
+
+
+def stations_response(endpoint, args, stations, include, year, readings_filters):
+    """
+    Builds the response of a station query, fanned out to 'results' or 'readings' on request
+    """
+    if len(stations) == 0:
+        response = {
+            "endpoint": endpoint,
+            "args": args,
+            "message": "Stations matching the request could not be found"
+            if STATION_INDEX.get() is not None
+            else STATIONS_NOT_FOUND_MESSAGE,
+        }
+        return response, 404
+    response = {"endpoint": endpoint, "output_count": len(stations), "args": args}
+    if include is not None:
+        readings_truncated = stations_fan_out(
+            stations=stations,
+            include=include,
+            year=year,
+            readings_filters=readings_filters,
+        )
+        if include == "readings":
+            response["readings_truncated"] = readings_truncated
+    response["response"] = stations
+    return response, 200
+
+
+def malformed_response(endpoint, args):
+    """
+    Response of requests with malformed query params
+    """
+    response = {
+        "endpoint": endpoint,
+        "args": args,
+        "message": "The server cannot process the request due to malformed request syntax",
+    }
+    return response, 400
+
+
+@stations_namespace.route("")
+class ApiStations(Resource):
+    """
+    This resource lists station metadata with following query params:
+        - station
+        - with_records
+    """
+
+    @stations_namespace.doc("get-stations")
+    @stations_namespace.param(
+        "station",
+        description="Stations to describe, comma separated (default all).",
+        required=False,
+        example="USC00110072,USC00110187",
+    )
+    @stations_namespace.param(
+        "with_records",
+        description="Only list stations with readings (default true).",
+        required=False,
+        example="true",
+    )
+    @stations_namespace.response(200, description="Success")
+    @stations_namespace.response(400, description="Malformed request syntax")
+    @stations_namespace.response(404, description="Not found")
+    def get(self):
+        """
+        API resource providing station coordinates, elevation (m), state, name and period of
+        record (first and last year of readings)
+        """
+        parser = reqparse.RequestParser(bundle_errors=True)
+        parser.add_argument(
+            "station", required=False, type=str, help="Required format: USC00110072"
+        )
+        parser.add_argument(
+            "with_records", required=False, type=str, help="Required format: true/false"
+        )
+        args = parser.parse_args(strict=True)
+        with_records = (args["with_records"] or "true").lower()
+        stations = None
+        if args["station"] is not None:
+            stations = {value.strip().upper() for value in args["station"].split(",")}
+        if with_records not in ("true", "false") or (
+            stations is not None and any(len(value) != 11 for value in stations)
+        ):
+            return malformed_response(endpoint="/stations", args=args)
+        index = STATION_INDEX.get()
+        matched_stations = []
+        if index is not None:
+            matched_stations = sorted(
+                (
+                    dict(station)
+                    for station in index[
+                        "with_records" if with_records == "true" else "all"
+                    ]["stations"]
+                    if stations is None or station["station_id"] in stations
+                ),
+                key=lambda station: station["station_id"],
+            )
+        return stations_response(
+            endpoint="/stations",
+            args=args,
+            stations=matched_stations,
+            include=None,
+            year=None,
+            readings_filters=None,
+        )
+
+
+@stations_namespace.route("/nearest")
+class ApiStationsNearest(Resource):
+    """
+    This resource finds the stations nearest to a point with following query params:
+        - lat
+        - lon
+        - k
+        - max_distance
+        - with_records
+        - include (results or readings) with year, date, start and end
+    """
+
+    @stations_namespace.doc("get-stations-nearest")
+    @stations_namespace.param(
+        "lat", description="Latitude (decimal degrees).", required=True, example="41.88"
+    )
+    @stations_namespace.param(
+        "lon",
+        description="Longitude (decimal degrees).",
+        required=True,
+        example="-87.63",
+    )
+    @stations_namespace.param(
+        "k",
+        description=f"Number of stations (default {NEAREST_DEFAULT_COUNT}, at most {NEAREST_MAX_COUNT}).",
+        required=False,
+        example="5",
+    )
+    @stations_namespace.param(
+        "max_distance",
+        description="Largest distance (km) of a returned station.",
+        required=False,
+        example="100",
+    )
+    @stations_namespace.param(
+        "with_records",
+        description="Only consider stations with readings (default true).",
+        required=False,
+        example="true",
+    )
+    @stations_namespace.param(
+        "include",
+        description="Add the 'results' (filtered by year) or 'readings' (filtered by date or start and end; first 1000) records of the stations.",
+        required=False,
+        example="results",
+    )
+    @stations_namespace.param(
+        "year", description="Year of included results.", required=False, example="2012"
+    )
+    @stations_namespace.param(
+        "date",
+        description="Date of included readings.",
+        required=False,
+        example="20120101",
+    )
+    @stations_namespace.param(
+        "start",
+        description="First date of included readings.",
+        required=False,
+        example="20120101",
+    )
+    @stations_namespace.param(
+        "end",
+        description="Last date of included readings.",
+        required=False,
+        example="20120131",
+    )
+    @stations_namespace.response(200, description="Success")
+    @stations_namespace.response(400, description="Malformed request syntax")
+    @stations_namespace.response(404, description="Not found")
+    def get(self):
+        """
+        API resource providing the k stations nearest to a point with their great-circle
+        distance, from the in-memory station grid index
+        """
+        parser = stations_args_parser()
+        parser.add_argument(
+            "lat", required=True, type=str, help="Required format: 41.88"
+        )
+        parser.add_argument(
+            "lon", required=True, type=str, help="Required format: -87.63"
+        )
+        parser.add_argument("k", required=False, type=str, help="Required format: 5")
+        parser.add_argument(
+            "max_distance", required=False, type=str, help="Required format: 100"
+        )
+        args = parser.parse_args(strict=True)
+        try:
+            latitude = float(args["lat"])
+            longitude = float(args["lon"])
+            count = NEAREST_DEFAULT_COUNT if args["k"] is None else int(args["k"])
+            max_distance = (
+                None if args["max_distance"] is None else float(args["max_distance"])
+            )
+            with_records, include, year, readings_filters = stations_include_parser(
+                args=args
+            )
+            if (
+                not (-90 <= latitude <= 90 and -180 <= longitude <= 180)
+                or not 0 < count <= NEAREST_MAX_COUNT
+                or (max_distance is not None and not max_distance >= 0)
+            ):
+                raise ValueError("Out of range lat, lon, k or max_distance")
+        except ValueError:
+            return malformed_response(endpoint="/stations/nearest", args=args)
+        return stations_response(
+            endpoint="/stations/nearest",
+            args=args,
+            stations=nearest_stations(
+                latitude=latitude,
+                longitude=longitude,
+                count=count,
+                max_distance=max_distance,
+                with_records=with_records,
+            ),
+            include=include,
+            year=year,
+            readings_filters=readings_filters,
+        )
+
+
+@stations_namespace.route("/bbox")
+class ApiStationsBbox(Resource):
+    """
+    This resource finds the stations inside a bounding box with following query params:
+        - bbox
+        - with_records
+        - include (results or readings) with year, date, start and end
+    """
+
+    @stations_namespace.doc("get-stations-bbox")
+    @stations_namespace.param(
+        "bbox",
+        description="Bounding box west,south,east,north (decimal degrees); west > east crosses the antimeridian.",
+        required=True,
+        example="-91.5,37,-87.5,42.5",
+    )
+    @stations_namespace.param(
+        "with_records",
+        description="Only return stations with readings (default true).",
+        required=False,
+        example="true",
+    )
+    @stations_namespace.param(
+        "include",
+        description="Add the 'results' (filtered by year) or 'readings' (filtered by date or start and end; first 1000) records of the stations.",
+        required=False,
+        example="results",
+    )
+    @stations_namespace.param(
+        "year", description="Year of included results.", required=False, example="2012"
+    )
+    @stations_namespace.param(
+        "date",
+        description="Date of included readings.",
+        required=False,
+        example="20120101",
+    )
+    @stations_namespace.param(
+        "start",
+        description="First date of included readings.",
+        required=False,
+        example="20120101",
+    )
+    @stations_namespace.param(
+        "end",
+        description="Last date of included readings.",
+        required=False,
+        example="20120131",
+    )
+    @stations_namespace.response(200, description="Success")
+    @stations_namespace.response(400, description="Malformed request syntax")
+    @stations_namespace.response(404, description="Not found")
+    def get(self):
+        """
+        API resource providing the stations inside a bounding box, from the in-memory station
+        grid index
+        """
+        parser = stations_args_parser()
+        parser.add_argument(
+            "bbox",
+            required=True,
+            type=str,
+            help="Required format: west,south,east,north",
+        )
+        args = parser.parse_args(strict=True)
+        try:
+            west, south, east, north = [
+                float(value) for value in args["bbox"].split(",")
+            ]
+            with_records, include, year, readings_filters = stations_include_parser(
+                args=args
+            )
+            if not (
+                -90 <= south <= north <= 90
+                and -180 <= west <= 180
+                and -180 <= east <= 180
+            ):
+                raise ValueError("Out of range bbox")
+        except ValueError:
+            return malformed_response(endpoint="/stations/bbox", args=args)
+        return stations_response(
+            endpoint="/stations/bbox",
+            args=args,
+            stations=bbox_stations(
+                south=south,
+                west=west,
+                north=north,
+                east=east,
+                with_records=with_records,
+            ),
+            include=include,
+            year=year,
+            readings_filters=readings_filters,
+        )
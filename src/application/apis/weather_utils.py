@@ -2,13 +2,69 @@
 This module deals with serving the following weather endpoints:
     - /api/weather
     - /api/weather/stats
+    - /api/weather/export
+    - /api/weather/analytics
+    - /api/weather/rollup
+    - /api/weather/cache
 """
 
-from flask import Blueprint
+import base64
+import binascii
+import csv
+import io
+import json
+from flask import Blueprint, Response, current_app, make_response, stream_with_context
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.exc import NoResultFound
 from flask_restx import Api, Resource
 from flask_restx import reqparse
-from application.data_model import Readings, readings_schema, Results, results_schema
+from flask_restx.representations import output_json
+from flask_sqlalchemy.pagination import Pagination
+from application import db
+from application.analytics.columnar_store import (
+    COLUMNAR_GROUP_BY,
+    columnar_aggregates,
+    columnar_store_available,
+)
+from application.analytics.rollup_utility import (
+    ROLLING_DEFAULT_DAYS,
+    ROLLUP_GROUP_BY,
+    ROLLUP_WINDOWS,
+    date_parser,
+    rolling_rollups,
+    window_rollups,
+)
+from application.analytics.metrics_engine import (
+    METRICS_REGISTRY,
+    station_metrics_reader,
+)
+from application.apis.jobs_utils import jobs_namespace
+from application.apis.response_cache import (
+    READINGS_COUNT_CACHE,
+    RESPONSE_CACHE,
+    cached_response,
+)
+from application.apis.station_utils import stations_namespace
+from application.apis.yield_utils import yield_namespace
+from application.data_model import (
+    Aggregates,
+    Readings,
+    readings_schema,
+    Results,
+    results_schema,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PER_PAGE = 1000
+# Rows fetched from the database cursor and encoded per streamed export chunk
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Query params filtering /weather and /weather/export
+READINGS_FILTER_ARGS = ("date", "start", "end", "station")
 
 api_bp = Blueprint("api", __name__)
 api = Api(
@@ -21,6 +77,210 @@ api = Api(
     default_label="APIs for requesting weather related data",
     ordered=True,
 )
+api.add_namespace(jobs_namespace)
+api.add_namespace(yield_namespace)
+api.add_namespace(stations_namespace)
+
+
+@api.representation("application/json")
+def json_representation(data, code, headers=None):
+    """
+    Encodes API responses with orjson when installed and API_FAST_SERIALIZATION is enabled,
+    otherwise with flask-restx's default JSON representation (indented in debug mode)
+    """
+    if orjson is None or not current_app.config["API_FAST_SERIALIZATION"]:
+        return output_json(data, code, headers)
+    response = make_response(
+        orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE),
+        code,
+    )
+    response.headers.extend(headers or {})
+    return response
+
+
+class RowsPagination(Pagination):
+    """
+    Flask-SQLAlchemy pagination of a Core select() returning plain row tuples
+    Takes a 'select' argument in addition to the Pagination arguments
+    """
+
+    def _query_items(self):
+        select_statement = self._query_args["select"]
+        return db.session.execute(
+            select_statement.limit(self.per_page).offset(self._query_offset)
+        ).all()
+
+    def _query_count(self):
+        select_statement = self._query_args["select"].order_by(None).subquery()
+        return db.session.execute(
+            select(func.count()).select_from(select_statement)
+        ).scalar()
+
+
+def schema_select(schema):
+    """
+    Core select() of the exposed fields of a schema's model, in the schema's field order
+    """
+    model = schema.Meta.model
+    return select(*[getattr(model, field) for field in schema.Meta.fields])
+
+
+def page_paginator(schema, conditions, order_by=()):
+    """
+    Paginates the schema's model filtered by 'conditions' and sorted by 'order_by' columns
+    Pages hold plain row tuples when API_FAST_SERIALIZATION is enabled, ORM instances otherwise
+    """
+    if current_app.config["API_FAST_SERIALIZATION"]:
+        return RowsPagination(
+            select=schema_select(schema=schema).where(*conditions).order_by(*order_by),
+            per_page=PER_PAGE,
+            max_per_page=None,
+        )
+    return (
+        schema.Meta.model.query.filter(*conditions)
+        .order_by(*order_by)
+        .paginate(per_page=PER_PAGE)
+    )
+
+
+def page_serializer(schema, items):
+    """
+    Serializes the items of a page returned by 'page_paginator'
+    Row tuples are zipped with the schema's field names, ORM instances are dumped by marshmallow
+    """
+    if current_app.config["API_FAST_SERIALIZATION"]:
+        return [dict(zip(schema.Meta.fields, item)) for item in items]
+    return schema.dump(items)
+
+
+def readings_args_parser(args):
+    """
+    Validates the date, start, end (YYYYMMDD) and comma separated station query params of
+    /weather and /weather/export; 'date' is shorthand for start = end = date
+    Returns the keyword arguments of 'readings_filter_builder'
+    Raises ValueError for malformed params
+    """
+    dates = {}
+    for name in ("date", "start", "end"):
+        value = args[name]
+        if value is not None:
+            if len(value) != 8 or not value.isdigit():
+                raise ValueError(f"Malformed {name}: {value}")
+            dates[name] = int(value)
+    if "date" in dates:
+        if "start" in dates or "end" in dates:
+            raise ValueError("date cannot be combined with start or end")
+        dates["start"] = dates["end"] = dates["date"]
+    if "start" in dates and "end" in dates and dates["start"] > dates["end"]:
+        raise ValueError("start is after end")
+    stations = None
+    if args["station"] is not None:
+        stations = sorted(
+            {value.strip().upper() for value in args["station"].split(",")}
+        )
+        if any(len(value) != 11 for value in stations):
+            raise ValueError(f"Malformed station: {args['station']}")
+    return {"start": dates.get("start"), "end": dates.get("end"), "stations": stations}
+
+
+def readings_filter_builder(start=None, end=None, stations=None):
+    """
+    Builds the 'readings' WHERE conditions of a date range and a list of stations
+    Every combination is driven by a list of stations, so SQLite runs one index range scan per
+    station and returns rows in (station, date) order without sorting them
+    Params: start, end --> YYYYMMDD integers or None for an open end
+            stations --> sorted list of station ids or None for every station
+    """
+    conditions = []
+    if stations is not None:
+        conditions.append(Readings.station_id.in_(stations))
+    elif start is not None or end is not None:
+        # Stations with records in the range's years; the date index would need to sort every
+        # matching row before returning the first page
+        conditions.append(
+            Readings.station_id.in_(
+                select(Aggregates.station_id).where(
+                    Aggregates.year.between(
+                        0 if start is None else start // 10000,
+                        9999 if end is None else end // 10000,
+                    )
+                )
+            )
+        )
+    if start is not None and start == end:
+        conditions.append(Readings.date == start)
+    else:
+        if start is not None:
+            conditions.append(Readings.date >= start)
+        if end is not None:
+            conditions.append(Readings.date <= end)
+    return conditions
+
+
+def results_args_parser(args):
+    """
+    Validates the year (YYYY) and station query params of /weather/stats
+    Returns the keyword arguments of 'results_filter_builder'
+    Raises ValueError for malformed params
+    """
+    year = args["year"]
+    if year is not None and (len(year) != 4 or not year.isdigit()):
+        raise ValueError(f"Malformed year: {year}")
+    station = args["station"]
+    if station is not None and len(station) != 11:
+        raise ValueError(f"Malformed station: {station}")
+    return {
+        "year": None if year is None else int(year),
+        "station": None if station is None else station.upper(),
+    }
+
+
+def results_filter_builder(year=None, station=None):
+    """
+    Builds the 'results' WHERE conditions of a year and a station
+    Params: year --> integer or None for every year
+            station --> station id or None for every station
+    """
+    conditions = []
+    if year is not None:
+        conditions.append(Results.year == year)
+    if station is not None:
+        conditions.append(Results.station_id == station)
+    return conditions
+
+
+def metrics_arg_parser(metrics):
+    """
+    Parses the comma separated metrics query param of /weather/stats; "all" selects every
+    registered metric
+    Returns the list of metric names (empty when not given)
+    Raises ValueError for metrics missing from the metrics engine registry
+    """
+    if metrics is None:
+        return []
+    metrics_list = [value.strip().lower() for value in metrics.split(",")]
+    if metrics_list == ["all"]:
+        return list(METRICS_REGISTRY)
+    unknown_metrics = [value for value in metrics_list if value not in METRICS_REGISTRY]
+    if len(unknown_metrics) > 0:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown_metrics)}")
+    return list(dict.fromkeys(metrics_list))
+
+
+def stats_metrics_merger(serialized_output, metrics):
+    """
+    Adds the requested 'station_metrics' values to serialized 'results' records
+    """
+    metrics_values = station_metrics_reader(
+        keys={(record["year"], record["station_id"]) for record in serialized_output},
+        metrics=metrics,
+    )
+    for record in serialized_output:
+        for metric_name in metrics:
+            record[metric_name] = metrics_values.get(
+                (record["year"], record["station_id"], metric_name)
+            )
+    return serialized_output
 
 
 def paginate_response(paginate_object, args):
@@ -44,13 +304,162 @@ def paginate_response(paginate_object, args):
     return final_output, final_page
 
 
+def cursor_encoder(reading_id):
+    """
+    Encodes the last returned reading_id into an opaque keyset pagination cursor
+    """
+    return base64.urlsafe_b64encode(reading_id.encode()).decode()
+
+
+def cursor_decoder(cursor):
+    """
+    Decodes a keyset pagination cursor back into the (station_id, date) key of a reading
+    Raises ValueError for cursors not produced by 'cursor_encoder'
+    """
+    try:
+        reading_id = base64.b64decode(
+            cursor.encode(), altchars=b"-_", validate=True
+        ).decode()
+    except (binascii.Error, UnicodeError) as error:
+        raise ValueError(f"Invalid cursor: {cursor}") from error
+    if len(reading_id) != 19 or not reading_id[11:].isdigit():
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return reading_id[:11], int(reading_id[11:])
+
+
+def readings_count(readings_conditions, count_key):
+    """
+    Returns COUNT(*) of a filtered readings query, cached for 'API_COUNT_CACHE_SECONDS'
+    so clients walking every page with a cursor do not recount the table on each request
+    """
+    max_age = current_app.config["API_COUNT_CACHE_SECONDS"]
+    output_count = READINGS_COUNT_CACHE.get(count_key=count_key, max_age=max_age)
+    if output_count is not None:
+        return output_count
+    output_count = db.session.execute(
+        select(func.count()).select_from(Readings).where(*readings_conditions)
+    ).scalar()
+    READINGS_COUNT_CACHE.set(
+        count_key=count_key,
+        count=output_count,
+        max_age=max_age,
+        max_entries=current_app.config["API_COUNT_CACHE_MAX_ENTRIES"],
+    )
+    return output_count
+
+
+def readings_page_response(
+    readings_conditions, args, not_found_message, not_found_status
+):
+    """
+    Serializes one page of a filtered readings query
+    With a 'cursor' argument, pages are fetched by keyset on reading_id (constant cost for any
+    depth, total count only when 'count=true'); otherwise offset pagination with 'page' is used
+    """
+    filter_args = {name: args[name] for name in READINGS_FILTER_ARGS}
+    page_args = {**filter_args, "page": args["page"]}
+    if args["cursor"] is not None:
+        response_args = {**filter_args, "cursor": args["cursor"]}
+        cursor_conditions = list(readings_conditions)
+        if args["cursor"] != "":
+            try:
+                cursor_conditions.append(
+                    tuple_(Readings.station_id, Readings.date)
+                    > tuple_(*cursor_decoder(args["cursor"]))
+                )
+            except ValueError:
+                response = {
+                    "endpoint": "/weather",
+                    "args": response_args,
+                    "message": "The server cannot process the request due to malformed request syntax",
+                }
+                return response, 400
+        if current_app.config["API_FAST_SERIALIZATION"]:
+            readings = db.session.execute(
+                schema_select(schema=readings_schema)
+                .where(*cursor_conditions)
+                .order_by(Readings.station_id, Readings.date)
+                .limit(PER_PAGE + 1)
+            ).all()
+        else:
+            readings = (
+                Readings.query.filter(*cursor_conditions)
+                .order_by(Readings.station_id, Readings.date)
+                .limit(PER_PAGE + 1)
+                .all()
+            )
+        next_cursor = None
+        if len(readings) > PER_PAGE:
+            readings = readings[:PER_PAGE]
+            next_cursor = cursor_encoder(readings[-1].reading_id)
+        # Serialize the queryset
+        serialized_output = page_serializer(schema=readings_schema, items=readings)
+        if len(serialized_output) == 0 and args["cursor"] == "":
+            response = {
+                "endpoint": "/weather",
+                "args": response_args,
+                "message": not_found_message,
+            }
+            return response, not_found_status
+        response = {"endpoint": "/weather"}
+        if args["count"] is not None and args["count"].lower() == "true":
+            response["output_count"] = readings_count(
+                readings_conditions=readings_conditions,
+                count_key=tuple(filter_args.values()),
+            )
+        response["next_cursor"] = next_cursor
+        response["args"] = response_args
+        response["response"] = serialized_output
+        return response, 200
+
+    readings = page_paginator(
+        schema=readings_schema,
+        conditions=readings_conditions,
+        order_by=(Readings.station_id, Readings.date),
+    )
+    paginate_response_op = paginate_response(paginate_object=readings, args=args)
+    # Serialize the queryset
+    serialized_output = page_serializer(
+        schema=readings_schema, items=paginate_response_op[0]
+    )
+    if len(serialized_output) != 0:
+        response = {
+            "endpoint": "/weather",
+            "output_count": readings.total,
+            "current_page": paginate_response_op[1],
+            "total_pages": readings.pages,
+            "args": page_args,
+            "response": serialized_output,
+        }
+        return response, 200
+    if not_found_status == 204:
+        response = {
+            "endpoint": "/weather",
+            "output_count": readings.total,
+            "current_page": paginate_response_op[1],
+            "total_pages": readings.pages,
+            "args": page_args,
+            "message": not_found_message,
+        }
+        return response, 204
+    response = {
+        "endpoint": "/weather",
+        "args": page_args,
+        "message": not_found_message,
+    }
+    return response, not_found_status
+
+
 @api.route("/weather")
 class ApiWeather(Resource):
     """
     This resource allows user to query 'Readings' table to fetch data with following query params:
         - date
-        - station
+        - start and end (date range)
+        - station (comma separated)
         - page number
+        - cursor (keyset pagination on reading_id)
+        - count
     """
 
     @api.doc("get-weather-records")
@@ -60,11 +469,23 @@ class ApiWeather(Resource):
         required=False,
         example="20230220",
     )
+    @api.param(
+        "start",
+        description="First date of the range for which weather records need to be retrieved (cannot be combined with date).",
+        required=False,
+        example="20120101",
+    )
+    @api.param(
+        "end",
+        description="Last date of the range for which weather records need to be retrieved (cannot be combined with date).",
+        required=False,
+        example="20121231",
+    )
     @api.param(
         "station",
-        description="A station for which weather records need to be retrieved.",
+        description="Stations for which weather records need to be retrieved, comma separated.",
         required=False,
-        example="USC00110072",
+        example="USC00110072,USC00110187",
     )
     @api.param(
         "page",
@@ -72,21 +493,43 @@ class ApiWeather(Resource):
         required=False,
         example="1",
     )
+    @api.param(
+        "cursor",
+        description="Keyset pagination cursor: empty for the first page, then the 'next_cursor' of the previous page. Takes precedence over page.",
+        required=False,
+        example="",
+    )
+    @api.param(
+        "count",
+        description="Include the (cached) total record count in cursor paginated responses.",
+        required=False,
+        example="false",
+    )
     @api.response(200, description="Success")
     @api.response(204, description="No content")
     @api.response(400, description="Malformed request syntax")
     @api.response(404, description="Not found")
+    @cached_response(endpoint="/weather")
     def get(self):
         """
-        API resource providing records from 'readings' table as response
-        Can be filtered based on date and/or station
+        API resource providing records from 'readings' table as response, in (station, date) order
+        Can be filtered based on a date or a date range and/or stations
         """
         parser = reqparse.RequestParser(bundle_errors=True)
         parser.add_argument(
             "date", required=False, type=str, help="Required format: YYYYMMDD"
         )
         parser.add_argument(
-            "station", required=False, type=str, help="Required format: ABC12345678"
+            "start", required=False, type=str, help="Required format: YYYYMMDD"
+        )
+        parser.add_argument(
+            "end", required=False, type=str, help="Required format: YYYYMMDD"
+        )
+        parser.add_argument(
+            "station",
+            required=False,
+            type=str,
+            help="Required format: ABC12345678 or ABC12345678,ABC23456789",
         )
         parser.add_argument(
             "page",
@@ -94,161 +537,44 @@ class ApiWeather(Resource):
             type=str,
             help="Required format: 1; Required condition: >0",
         )
+        parser.add_argument(
+            "cursor",
+            required=False,
+            type=str,
+            help="Required format: empty for the first page, then 'next_cursor' of the previous page",
+        )
+        parser.add_argument(
+            "count", required=False, type=str, help="Required format: true/false"
+        )
         args = parser.parse_args(strict=True)
-        date = args["date"]
-        station = args["station"]
-        page = args["page"]
-        if date is not None and station is not None:
-            if len(date) == 8 and len(station) == 11:
-                q_year = int(date[:4])
-                q_month = int(date[4:-2])
-                q_day = int(date[-2:])
-                q_station_id = station.upper()
-                try:
-                    readings = Readings.query.filter(
-                        Readings.year == q_year,
-                        Readings.month == q_month,
-                        Readings.day == q_day,
-                        Readings.station_id == q_station_id,
-                    ).paginate(per_page=1000)
-                    paginate_response_op = paginate_response(
-                        paginate_object=readings, args=args
-                    )
-                    # Serialize the queryset
-                    serialized_output = readings_schema.dump(paginate_response_op[0])
-                    if len(serialized_output) != 0:
-                        response = {
-                            "endpoint": "/weather",
-                            "output_count": readings.total,
-                            "current_page": paginate_response_op[1],
-                            "total_pages": readings.pages,
-                            "args": {"date": date, "station": station, "page": page},
-                            "response": serialized_output,
-                        }
-                        return response, 200
-                    else:
-                        response = {
-                            "endpoint": "/weather",
-                            "args": {"date": date, "station": station, "page": page},
-                            "message": "Records for given date and station could not be found",
-                        }
-                        return response, 404
-                except NoResultFound:
-                    return {"message": "Error: NoResultFound"}, 404
-            else:
-                response = {
-                    "endpoint": "/weather",
-                    "args": {"date": date, "station": station, "page": page},
-                    "message": "The server cannot process the request due to malformed request syntax",
-                }
-                return response, 400
-        elif date is None and station is not None:
-            if len(station) == 11:
-                q_station_id = station.upper()
-                try:
-                    readings = Readings.query.filter(
-                        Readings.station_id == q_station_id
-                    ).paginate(per_page=1000)
-                    paginate_response_op = paginate_response(
-                        paginate_object=readings, args=args
-                    )
-                    # Serialize the queryset
-                    serialized_output = readings_schema.dump(paginate_response_op[0])
-                    if len(serialized_output) != 0:
-                        response = {
-                            "endpoint": "/weather",
-                            "output_count": readings.total,
-                            "current_page": paginate_response_op[1],
-                            "total_pages": readings.pages,
-                            "args": {"date": date, "station": station, "page": page},
-                            "response": serialized_output,
-                        }
-                        return response, 200
-                    else:
-                        response = {
-                            "endpoint": "/weather",
-                            "args": {"date": date, "station": station, "page": page},
-                            "message": "Records for given station could not be found",
-                        }
-                        return response, 404
-                except NoResultFound:
-                    return {"message": "Error: NoResultFound"}, 404
-            else:
-                response = {
-                    "endpoint": "/weather",
-                    "args": {"date": date, "station": station, "page": page},
-                    "message": "The server cannot process the request due to malformed request syntax",
-                }
-                return response, 400
-        elif date is not None and station is None:
-            if len(date) == 8:
-                q_year = int(date[:4])
-                q_month = int(date[4:-2])
-                q_day = int(date[-2:])
-                try:
-                    readings = Readings.query.filter(
-                        Readings.year == q_year,
-                        Readings.month == q_month,
-                        Readings.day == q_day,
-                    ).paginate(per_page=1000)
-                    paginate_response_op = paginate_response(
-                        paginate_object=readings, args=args
-                    )
-                    # Serialize the queryset
-                    serialized_output = readings_schema.dump(paginate_response_op[0])
-                    if len(serialized_output) != 0:
-                        response = {
-                            "endpoint": "/weather",
-                            "output_count": readings.total,
-                            "current_page": paginate_response_op[1],
-                            "total_pages": readings.pages,
-                            "args": {"date": date, "station": station, "page": page},
-                            "response": serialized_output,
-                        }
-                        return response, 200
-                    else:
-                        response = {
-                            "endpoint": "/weather",
-                            "args": {"date": date, "station": station, "page": page},
-                            "message": "Records for given date could not be found",
-                        }
-                        return response, 404
-                except NoResultFound:
-                    return {"message": "Error: NoResultFound"}, 404
-            else:
-                response = {
-                    "endpoint": "/weather",
-                    "args": {"date": date, "station": station, "page": page},
-                    "message": "The server cannot process the request due to malformed request syntax",
-                }
-                return response, 400
-        else:
-            readings = Readings.query.paginate(per_page=1000)
-            paginate_response_op = paginate_response(
-                paginate_object=readings, args=args
+        try:
+            readings_filters = readings_args_parser(args=args)
+        except ValueError:
+            response = {
+                "endpoint": "/weather",
+                "args": {
+                    **{name: args[name] for name in READINGS_FILTER_ARGS},
+                    "page": args["page"],
+                },
+                "message": "The server cannot process the request due to malformed request syntax",
+            }
+            return response, 400
+        if all(value is None for value in readings_filters.values()):
+            return readings_page_response(
+                readings_conditions=[],
+                args=args,
+                not_found_message="There is no content to send for this request",
+                not_found_status=204,
             )
-            # Serialize the queryset
-            serialized_output = readings_schema.dump(paginate_response_op[0])
-            if len(serialized_output) != 0:
-                response = {
-                    "endpoint": "/weather",
-                    "output_count": readings.total,
-                    "current_page": paginate_response_op[1],
-                    "total_pages": readings.pages,
-                    "args": {"date": date, "station": station, "page": page},
-                    "response": serialized_output,
-                }
-                return response, 200
-            else:
-                response = {
-                    "endpoint": "/weather",
-                    "output_count": readings.total,
-                    "current_page": paginate_response_op[1],
-                    "total_pages": readings.pages,
-                    "args": {"date": date, "station": station, "page": page},
-                    "message": "There is no content to send for this request",
-                }
-                return response, 204
+        try:
+            return readings_page_response(
+                readings_conditions=readings_filter_builder(**readings_filters),
+                args=args,
+                not_found_message="Records for given filters could not be found",
+                not_found_status=404,
+            )
+        except NoResultFound:
+            return {"message": "Error: NoResultFound"}, 404
 
 
 @api.route("/weather/stats")
@@ -258,6 +584,7 @@ class ApiWeatherStats(Resource):
         - year
         - station
         - page number
+        - metrics (from 'station_metrics' table)
     """
 
     @api.doc("get-weather-statistics")
@@ -279,14 +606,21 @@ class ApiWeatherStats(Resource):
         required=False,
         example="1",
     )
+    @api.param(
+        "metrics",
+        description=f"Comma separated metrics added to every record, or all: {', '.join(METRICS_REGISTRY)}.",
+        required=False,
+        example="growing_degree_days,frost_days",
+    )
     @api.response(200, description="Success")
     @api.response(204, description="No content")
     @api.response(400, description="Malformed request syntax")
     @api.response(404, description="Not found")
+    @cached_response(endpoint="/weather/stats")
     def get(self):
         """
         API resource providing stats from 'results' table as response
-        Can be filtered based on year and/or station
+        Can be filtered based on year and/or station; 'metrics' adds metrics engine values
         """
         parser = reqparse.RequestParser(bundle_errors=True)
         parser.add_argument(
@@ -301,147 +635,501 @@ class ApiWeatherStats(Resource):
             type=str,
             help="Required format: 1; Required condition: >0",
         )
+        parser.add_argument(
+            "metrics",
+            required=False,
+            type=str,
+            help="Required format: growing_degree_days,frost_days",
+        )
+        args = parser.parse_args(strict=True)
+        try:
+            metrics = metrics_arg_parser(metrics=args["metrics"])
+        except ValueError as error:
+            response = {
+                "endpoint": "/weather/stats",
+                "args": args,
+                "message": f"The server cannot process the request due to malformed request syntax: {error}",
+            }
+            return response, 400
+        try:
+            results_filters = results_args_parser(args=args)
+        except ValueError:
+            response = {
+                "endpoint": "/weather/stats",
+                "args": args,
+                "message": "The server cannot process the request due to malformed request syntax",
+            }
+            return response, 400
+        try:
+            results = page_paginator(
+                schema=results_schema,
+                conditions=results_filter_builder(**results_filters),
+            )
+            paginate_response_op = paginate_response(paginate_object=results, args=args)
+            # Serialize the queryset
+            serialized_output = page_serializer(
+                schema=results_schema, items=paginate_response_op[0]
+            )
+        except NoResultFound:
+            return {"message": "Error: NoResultFound"}, 404
+        if len(metrics) > 0:
+            serialized_output = stats_metrics_merger(
+                serialized_output=serialized_output, metrics=metrics
+            )
+        if len(serialized_output) != 0:
+            response = {
+                "endpoint": "/weather/stats",
+                "output_count": results.total,
+                "current_page": paginate_response_op[1],
+                "total_pages": results.pages,
+                "args": args,
+                "response": serialized_output,
+            }
+            return response, 200
+        filter_names = [
+            name for name, value in results_filters.items() if value is not None
+        ]
+        if len(filter_names) == 0:
+            response = {
+                "endpoint": "/weather/stats",
+                "output_count": results.total,
+                "current_page": paginate_response_op[1],
+                "total_pages": results.pages,
+                "args": args,
+                "message": "There is no content to send for this request",
+            }
+            return response, 204
+        response = {
+            "endpoint": "/weather/stats",
+            "args": args,
+            "message": f"Records for given {' and '.join(filter_names)} could not be found",
+        }
+        return response, 404
+
+
+def readings_export_generator(export_query, export_format):
+    """
+    Streams the rows of 'export_query' as NDJSON or CSV text chunks
+    Rows are read from a server-side cursor as plain tuples, EXPORT_CHUNK_SIZE at a time,
+    so memory use does not depend on the number of exported rows
+    """
+    result = db.session.execute(
+        export_query.execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    if export_format == "csv":
+        csv_buffer = io.StringIO()
+        csv_writer = csv.writer(csv_buffer, lineterminator="\n")
+        csv_writer.writerow(readings_schema.Meta.fields)
+        for rows in result.partitions():
+            csv_writer.writerows(rows)
+            yield csv_buffer.getvalue()
+            csv_buffer.seek(0)
+            csv_buffer.truncate()
+        if csv_buffer.tell() > 0:
+            yield csv_buffer.getvalue()
+    else:
+        for rows in result.partitions():
+            yield "".join(
+                f"{json.dumps(dict(zip(readings_schema.Meta.fields, row)))}\n"
+                for row in rows
+            )
+    result.close()
+
+
+@api.route("/weather/export")
+class ApiWeatherExport(Resource):
+    """
+    This resource streams the complete filtered 'Readings' table with following query params:
+        - date
+        - start and end (date range)
+        - station (comma separated)
+        - format (ndjson or csv)
+    """
+
+    @api.doc("export-weather-records")
+    @api.param(
+        "date",
+        description="A date for which weather records need to be exported.",
+        required=False,
+        example="20230220",
+    )
+    @api.param(
+        "start",
+        description="First date of the range for which weather records need to be exported (cannot be combined with date).",
+        required=False,
+        example="20120101",
+    )
+    @api.param(
+        "end",
+        description="Last date of the range for which weather records need to be exported (cannot be combined with date).",
+        required=False,
+        example="20121231",
+    )
+    @api.param(
+        "station",
+        description="Stations for which weather records need to be exported, comma separated.",
+        required=False,
+        example="USC00110072,USC00110187",
+    )
+    @api.param(
+        "format",
+        description="Export format: ndjson (default) or csv.",
+        required=False,
+        example="ndjson",
+    )
+    @api.response(200, description="Success")
+    @api.response(400, description="Malformed request syntax")
+    def get(self):
+        """
+        API resource streaming records from 'readings' table ordered by reading_id
+        Can be filtered based on a date or a date range and/or stations
+        """
+        parser = reqparse.RequestParser(bundle_errors=True)
+        parser.add_argument(
+            "date", required=False, type=str, help="Required format: YYYYMMDD"
+        )
+        parser.add_argument(
+            "start", required=False, type=str, help="Required format: YYYYMMDD"
+        )
+        parser.add_argument(
+            "end", required=False, type=str, help="Required format: YYYYMMDD"
+        )
+        parser.add_argument(
+            "station",
+            required=False,
+            type=str,
+            help="Required format: ABC12345678 or ABC12345678,ABC23456789",
+        )
+        parser.add_argument(
+            "format", required=False, type=str, help="Required format: ndjson/csv"
+        )
+        args = parser.parse_args(strict=True)
+        export_format = (args["format"] or "ndjson").lower()
+        try:
+            readings_filters = readings_args_parser(args=args)
+            if export_format not in EXPORT_FORMATS:
+                raise ValueError(f"Unsupported format: {export_format}")
+        except ValueError:
+            response = {
+                "endpoint": "/weather/export",
+                "args": {
+                    **{name: args[name] for name in READINGS_FILTER_ARGS},
+                    "format": args["format"],
+                },
+                "message": "The server cannot process the request due to malformed request syntax",
+            }
+            return response, 400
+        export_query = (
+            schema_select(schema=readings_schema)
+            .where(*readings_filter_builder(**readings_filters))
+            .order_by(Readings.station_id, Readings.date)
+        )
+        return Response(
+            stream_with_context(
+                readings_export_generator(
+                    export_query=export_query, export_format=export_format
+                )
+            ),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={
+                "Content-Disposition": f"attachment; filename=readings.{export_format}"
+            },
+        )
+
+
+@api.route("/weather/analytics")
+class ApiWeatherAnalytics(Resource):
+    """
+    This resource aggregates the columnar store of 'Readings' with following query params:
+        - station
+        - start_year
+        - end_year
+        - group_by (year_station, station or year)
+    """
+
+    @api.doc("get-weather-analytics")
+    @api.param(
+        "station",
+        description="A station for which weather records need to be aggregated.",
+        required=False,
+        example="USC00110072",
+    )
+    @api.param(
+        "start_year",
+        description="First year of the aggregated range.",
+        required=False,
+        example="1985",
+    )
+    @api.param(
+        "end_year",
+        description="Last year of the aggregated range.",
+        required=False,
+        example="2014",
+    )
+    @api.param(
+        "group_by",
+        description="Grouping of the aggregates: year_station (default), station or year.",
+        required=False,
+        example="year_station",
+    )
+    @api.response(200, description="Success")
+    @api.response(400, description="Malformed request syntax")
+    @api.response(404, description="Not found")
+    @api.response(503, description="Columnar store unavailable")
+    def get(self):
+        """
+        API resource providing day counts, average temperatures and total precipitation
+        per group, scanned from the Parquet copy of 'readings' table
+        """
+        parser = reqparse.RequestParser(bundle_errors=True)
+        parser.add_argument(
+            "station", required=False, type=str, help="Required format: ABC12345678"
+        )
+        parser.add_argument(
+            "start_year", required=False, type=str, help="Required format: 1985"
+        )
+        parser.add_argument(
+            "end_year", required=False, type=str, help="Required format: 2014"
+        )
+        parser.add_argument(
+            "group_by",
+            required=False,
+            type=str,
+            help="Required format: year_station/station/year",
+        )
         args = parser.parse_args(strict=True)
-        year = args["year"]
         station = args["station"]
-        page = args["page"]
-        if year is not None and station is not None:
-            if len(year) == 4 and len(station) == 11:
-                q_year = year
-                q_station_id = station.upper()
-                try:
-                    results = Results.query.filter(
-                        Results.year == q_year, Results.station_id == q_station_id
-                    ).paginate(per_page=1000)
-                    paginate_response_op = paginate_response(
-                        paginate_object=results, args=args
-                    )
-                    # Serialize the queryset
-                    serialized_output = results_schema.dump(paginate_response_op[0])
-                    if len(serialized_output) != 0:
-                        response = {
-                            "endpoint": "/weather/stats",
-                            "output_count": results.total,
-                            "current_page": paginate_response_op[1],
-                            "total_pages": results.pages,
-                            "args": {"year": year, "station": station, "page": page},
-                            "response": serialized_output,
-                        }
-                        return response, 200
-                    else:
-                        response = {
-                            "endpoint": "/weather",
-                            "args": {"year": year, "station": station, "page": page},
-                            "message": "Records for given year and station could not be found",
-                        }
-                        return response, 404
-                except NoResultFound:
-                    return {"message": "Error: NoResultFound"}, 404
-            else:
-                response = {
-                    "endpoint": "/weather",
-                    "args": {"year": year, "station": station, "page": page},
-                    "message": "The server cannot process the request due to malformed request syntax",
-                }
-                return response, 400
-        elif year is None and station is not None:
-            if len(station) == 11:
-                q_station_id = station.upper()
-                try:
-                    results = Results.query.filter(
-                        Results.station_id == q_station_id
-                    ).paginate(per_page=1000)
-                    paginate_response_op = paginate_response(
-                        paginate_object=results, args=args
-                    )
-                    # Serialize the queryset
-                    serialized_output = results_schema.dump(paginate_response_op[0])
-                    if len(serialized_output) != 0:
-                        response = {
-                            "endpoint": "/weather/stats",
-                            "output_count": results.total,
-                            "current_page": paginate_response_op[1],
-                            "total_pages": results.pages,
-                            "args": {"year": year, "station": station, "page": page},
-                            "response": serialized_output,
-                        }
-                        return response, 200
-                    else:
-                        response = {
-                            "endpoint": "/weather",
-                            "args": {"year": year, "station": station, "page": page},
-                            "message": "Records for given station could not be found",
-                        }
-                        return response, 404
-                except NoResultFound:
-                    return {"message": "Error: NoResultFound"}, 404
-            else:
-                response = {
-                    "endpoint": "/weather",
-                    "args": {"year": year, "station": station, "page": page},
-                    "message": "The server cannot process the request due to malformed request syntax",
-                }
-                return response, 400
-        elif year is not None and station is None:
-            if len(year) == 4:
-                q_year = year
-                try:
-                    results = Results.query.filter(Results.year == q_year).paginate(
-                        per_page=1000
-                    )
-                    paginate_response_op = paginate_response(
-                        paginate_object=results, args=args
+        start_year = args["start_year"]
+        end_year = args["end_year"]
+        group_by = (args["group_by"] or "year_station").lower()
+        if not columnar_store_available():
+            response = {
+                "endpoint": "/weather/analytics",
+                "args": args,
+                "message": "The columnar store is not enabled on this server",
+            }
+            return response, 503
+        if (
+            (station is not None and len(station) != 11)
+            or any(
+                year is not None and (len(year) != 4 or not year.isdigit())
+                for year in (start_year, end_year)
+            )
+            or group_by not in COLUMNAR_GROUP_BY
+        ):
+            response = {
+                "endpoint": "/weather/analytics",
+                "args": args,
+                "message": "The server cannot process the request due to malformed request syntax",
+            }
+            return response, 400
+        years = None
+        if start_year is not None or end_year is not None:
+            years = (
+                int(start_year) if start_year is not None else 0,
+                int(end_year) if end_year is not None else 9999,
+            )
+        columnar_rows = columnar_aggregates(
+            group_by=group_by,
+            stations=None if station is None else [station.upper()],
+            years=years,
+        )
+        if len(columnar_rows) == 0:
+            response = {
+                "endpoint": "/weather/analytics",
+                "args": args,
+                "message": "Records for given filters could not be found",
+            }
+            return response, 404
+        analytics_output = []
+        for columnar_row in columnar_rows:
+            group_output = {
+                column: columnar_row[column] for column in COLUMNAR_GROUP_BY[group_by]
+            }
+            group_output["days_count"] = columnar_row["date_count"]
+            for column in ("max_temperature", "min_temperature"):
+                group_output[f"avg_{column}"] = (
+                    round(
+                        columnar_row[f"{column}_sum"] / columnar_row[f"{column}_count"],
+                        4,
                     )
-                    # Serialize the queryset
-                    serialized_output = results_schema.dump(paginate_response_op[0])
-                    if len(serialized_output) != 0:
-                        response = {
-                            "endpoint": "/weather/stats",
-                            "output_count": results.total,
-                            "current_page": paginate_response_op[1],
-                            "total_pages": results.pages,
-                            "args": {"year": year, "station": station, "page": page},
-                            "response": serialized_output,
-                        }
-                        return response, 200
-                    else:
-                        response = {
-                            "endpoint": "/weather",
-                            "args": {"year": year, "station": station, "page": page},
-                            "message": "Records for given year could not be found",
-                        }
-                        return response, 404
-                except NoResultFound:
-                    return {"message": "Error: NoResultFound"}, 404
-            else:
-                response = {
-                    "endpoint": "/weather",
-                    "args": {"year": year, "station": station, "page": page},
-                    "message": "The server cannot process the request due to malformed request syntax",
-                }
-                return response, 400
+                    if columnar_row[f"{column}_count"] > 0
+                    else None
+                )
+            group_output["total_accumulated_precipitation"] = (
+                round(columnar_row["precipitation_sum"], 4)
+                if columnar_row["precipitation_count"] > 0
+                else 0
+            )
+            analytics_output.append(group_output)
+        response = {
+            "endpoint": "/weather/analytics",
+            "output_count": len(analytics_output),
+            "args": args,
+            "response": analytics_output,
+        }
+        return response, 200
+
+
+@api.route("/weather/rollup")
+class ApiWeatherRollup(Resource):
+    """
+    This resource aggregates weather records over time windows with following query params:
+        - window (month, season, year, range or rolling)
+        - start_date
+        - end_date
+        - station
+        - group_by (station or all)
+        - days (rolling window length)
+    """
+
+    @api.doc("get-weather-rollup")
+    @api.param(
+        "window",
+        description="Time window: month, season (DJF, MAM, JJA, SON), year (default), range (whole date range) or rolling.",
+        required=False,
+        example="season",
+    )
+    @api.param(
+        "start_date",
+        description="First date (YYYYMMDD) of the aggregated range.",
+        required=False,
+        example="19850101",
+    )
+    @api.param(
+        "end_date",
+        description="Last date (YYYYMMDD) of the aggregated range.",
+        required=False,
+        example="20141231",
+    )
+    @api.param(
+        "station",
+        description="Stations to aggregate, comma separated (default all; required by rolling windows).",
+        required=False,
+        example="USC00110072",
+    )
+    @api.param(
+        "group_by",
+        description="station (default): one record per station and window; all: stations merged.",
+        required=False,
+        example="station",
+    )
+    @api.param(
+        "days",
+        description=f"Days of a rolling window (default {ROLLING_DEFAULT_DAYS}).",
+        required=False,
+        example="30",
+    )
+    @api.response(200, description="Success")
+    @api.response(400, description="Malformed request syntax")
+    @api.response(404, description="Not found")
+    def get(self):
+        """
+        API resource providing day counts, average temperatures and total precipitation per
+        window, merged from the (station, year, month) 'monthly_aggregates' cube; partial months
+        at the range edges and rolling windows are read from 'readings'
+        """
+        parser = reqparse.RequestParser(bundle_errors=True)
+        parser.add_argument(
+            "window",
+            required=False,
+            type=str,
+            help="Required format: month/season/year/range/rolling",
+        )
+        for date_arg in ("start_date", "end_date"):
+            parser.add_argument(
+                date_arg, required=False, type=str, help="Required format: 20120101"
+            )
+        parser.add_argument(
+            "station", required=False, type=str, help="Required format: USC00110072"
+        )
+        parser.add_argument(
+            "group_by", required=False, type=str, help="Required format: station/all"
+        )
+        parser.add_argument(
+            "days",
+            required=False,
+            type=str,
+            help="Required format: 30; Required condition: >0",
+        )
+        args = parser.parse_args(strict=True)
+        window = (args["window"] or "year").lower()
+        group_by = (args["group_by"] or "station").lower()
+        days = args["days"]
+        stations = None
+        if args["station"] is not None:
+            stations = sorted(
+                {value.strip().upper() for value in args["station"].split(",")}
+            )
+        dates = {}
+        try:
+            for date_arg in ("start_date", "end_date"):
+                dates[date_arg] = None
+                if args[date_arg] is not None:
+                    if len(args[date_arg]) != 8 or not args[date_arg].isdigit():
+                        raise ValueError(f"Invalid {date_arg}: {args[date_arg]}")
+                    # Raises ValueError for impossible dates
+                    date_parser(int(args[date_arg]))
+                    dates[date_arg] = int(args[date_arg])
+        except ValueError:
+            dates = None
+        if (
+            dates is None
+            or window not in ROLLUP_WINDOWS
+            or group_by not in ROLLUP_GROUP_BY
+            or (stations is not None and any(len(value) != 11 for value in stations))
+            or (days is not None and (not days.isdigit() or int(days) == 0))
+            or (None not in dates.values() and dates["start_date"] > dates["end_date"])
+            or (window == "rolling" and (stations is None or group_by != "station"))
+        ):
+            response = {
+                "endpoint": "/weather/rollup",
+                "args": args,
+                "message": "The server cannot process the request due to malformed request syntax",
+            }
+            return response, 400
+        if window == "rolling":
+            rollups = rolling_rollups(
+                stations=stations,
+                days=ROLLING_DEFAULT_DAYS if days is None else int(days),
+                **dates,
+            )
         else:
-            results = Results.query.paginate(per_page=1000)
-            paginate_response_op = paginate_response(paginate_object=results, args=args)
-            # Serialize the queryset
-            serialized_output = results_schema.dump(paginate_response_op[0])
-            if len(serialized_output) != 0:
-                response = {
-                    "endpoint": "/weather",
-                    "output_count": results.total,
-                    "current_page": paginate_response_op[1],
-                    "total_pages": results.pages,
-                    "args": {"year": year, "station": station, "page": page},
-                    "response": serialized_output,
-                }
-                return response, 200
-            else:
-                response = {
-                    "endpoint": "/weather",
-                    "output_count": results.total,
-                    "current_page": paginate_response_op[1],
-                    "total_pages": results.pages,
-                    "args": {"year": year, "station": station, "page": page},
-                    "message": "There is no content to send for this request",
-                }
-                return response, 204
+            rollups = window_rollups(
+                window=window, stations=stations, group_by=group_by, **dates
+            )
+        if len(rollups) == 0:
+            response = {
+                "endpoint": "/weather/rollup",
+                "args": args,
+                "message": "Records for given filters could not be found",
+            }
+            return response, 404
+        response = {
+            "endpoint": "/weather/rollup",
+            "output_count": len(rollups),
+            "args": args,
+            "response": rollups,
+        }
+        return response, 200
+
+
+@api.route("/weather/cache")
+class ApiWeatherCache(Resource):
+    """
+    This resource exposes the counters of the /weather and /weather/stats response cache
+    """
+
+    @api.doc("get-weather-cache-counters")
+    @api.response(200, description="Success")
+    def get(self):
+        """
+        API resource providing response cache size and hit/miss/eviction/invalidation counters
+        """
+        response = {
+            "endpoint": "/weather/cache",
+            "max_entries": current_app.config["API_CACHE_MAX_ENTRIES"],
+            "max_bytes": current_app.config["API_CACHE_MAX_BYTES"],
+            "response": RESPONSE_CACHE.counters(),
+        }
+        return response, 200
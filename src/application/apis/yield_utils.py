@@ -0,0 +1,159 @@
+"""
+This module deals with serving the following crop yield endpoints:
+    - /api/yield
+    - /api/yield/correlation
+"""
+
+from flask_restx import Namespace, Resource
+from flask_restx import reqparse
+from application import db
+from application.analytics.yield_utility import (
+    ALL_STATIONS,
+    YIELD_METRICS,
+    yield_correlations,
+)
+from application.data_model import Yields
+
+yield_namespace = Namespace(
+    "Yield APIs",
+    description="APIs for relating weather statistics to yld_data corn grain yields",
+    path="/yield",
+)
+
+
+@yield_namespace.route("")
+class ApiYield(Resource):
+    """
+    This resource lists the 'yields' table with following query params:
+        - year
+    """
+
+    @yield_namespace.doc("get-yield")
+    @yield_namespace.param(
+        "year",
+        description="A year for which the corn grain yield needs to be retrieved.",
+        required=False,
+        example="1985",
+    )
+    @yield_namespace.response(200, description="Success")
+    @yield_namespace.response(400, description="Malformed request syntax")
+    @yield_namespace.response(404, description="Not found")
+    def get(self):
+        """
+        API resource providing US corn grain yields (thousands of metric tons) per year
+        """
+        parser = reqparse.RequestParser(bundle_errors=True)
+        parser.add_argument(
+            "year", required=False, type=str, help="Required format: 1985"
+        )
+        args = parser.parse_args(strict=True)
+        year = args["year"]
+        if year is not None and (len(year) != 4 or not year.isdigit()):
+            response = {
+                "endpoint": "/yield",
+                "args": args,
+                "message": "The server cannot process the request due to malformed request syntax",
+            }
+            return response, 400
+        yields_query = db.session.query(Yields.year, Yields.corn_grain_yield)
+        if year is not None:
+            yields_query = yields_query.filter(Yields.year == int(year))
+        yields_extract = yields_query.order_by(Yields.year).all()
+        if len(yields_extract) == 0:
+            response = {
+                "endpoint": "/yield",
+                "args": args,
+                "message": "Yields could not be found; load them with: flask --app run analytics load-yields",
+            }
+            return response, 404
+        response = {
+            "endpoint": "/yield",
+            "output_count": len(yields_extract),
+            "args": args,
+            "response": [
+                {"year": year, "corn_grain_yield": corn_grain_yield}
+                for year, corn_grain_yield in yields_extract
+            ],
+        }
+        return response, 200
+
+
+@yield_namespace.route("/correlation")
+class ApiYieldCorrelation(Resource):
+    """
+    This resource relates the 'results' statistics to the yearly corn grain yield with following
+    query params:
+        - metric
+        - station
+    """
+
+    @yield_namespace.doc("get-yield-correlation")
+    @yield_namespace.param(
+        "metric",
+        description=f"Weather statistic: one of {', '.join(YIELD_METRICS)} (default all).",
+        required=False,
+        example="total_accumulated_precipitation",
+    )
+    @yield_namespace.param(
+        "station",
+        description="Stations to correlate, comma separated (default all).",
+        required=False,
+        example="USC00110072,USC00110187",
+    )
+    @yield_namespace.response(200, description="Success")
+    @yield_namespace.response(400, description="Malformed request syntax")
+    @yield_namespace.response(404, description="Not found")
+    def get(self):
+        """
+        API resource providing, per metric, the Pearson correlation, r squared and the least
+        squares fit yield = slope * statistic + intercept of every station and of the yearly
+        mean of the selected stations ('all_stations'), over the years both are known
+        """
+        parser = reqparse.RequestParser(bundle_errors=True)
+        parser.add_argument(
+            "metric",
+            required=False,
+            type=str,
+            help="Required format: total_accumulated_precipitation",
+        )
+        parser.add_argument(
+            "station", required=False, type=str, help="Required format: USC00110072"
+        )
+        args = parser.parse_args(strict=True)
+        metric = args["metric"]
+        station = args["station"]
+        stations = None
+        if station is not None:
+            stations = sorted({value.strip().upper() for value in station.split(",")})
+        if (metric is not None and metric not in YIELD_METRICS) or (
+            stations is not None and any(len(value) != 11 for value in stations)
+        ):
+            response = {
+                "endpoint": "/yield/correlation",
+                "args": args,
+                "message": "The server cannot process the request due to malformed request syntax",
+            }
+            return response, 400
+        correlations = yield_correlations(
+            metrics=YIELD_METRICS if metric is None else (metric,), stations=stations
+        )
+        if len(correlations) == 0:
+            response = {
+                "endpoint": "/yield/correlation",
+                "args": args,
+                "message": "Statistics for years with a yield could not be found",
+            }
+            return response, 404
+        response = {
+            "endpoint": "/yield/correlation",
+            "output_count": len(next(iter(correlations.values()))) - 1,
+            "args": args,
+            "response": {
+                metric_key: {
+                    ALL_STATIONS: metric_correlations.pop(ALL_STATIONS),
+                    "stations": metric_correlations,
+                }
+                for metric_key, metric_correlations in correlations.items()
+            },
+        }
+        return response, 200
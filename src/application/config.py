@@ -13,9 +13,71 @@ class Config:
     ROOT_DIR = os.getcwd()
     SECRET_KEY = str(os.urandom(20))
     SQLALCHEMY_DATABASE_URI = f"sqlite:////{ROOT_DIR}/application/database.db"
-    EXECUTOR_PROPAGATE_EXCEPTIONS = True
     _wx_path = ROOT_DIR.split("/src")[0]
     WX_DATA_DIR = f"{_wx_path}/wx_data"
+    YLD_DATA_FILE = f"{_wx_path}/yld_data/US_corn_grain_yield.txt"
+    # GHCN-Daily station metadata in ghcnd-stations.txt fixed-width format
+    STATIONS_DATA_FILE = f"{_wx_path}/station_data/ghcnd-stations.txt"
+    # Number of processes parsing wx_data files in parallel; 1 parses in the calling process
+    INGESTION_WORKERS = os.cpu_count() or 1
+    # Number of records inserted and committed per ingestion batch
+    INGESTION_BATCH_SIZE = 50000
+    # Bulk loads drop and rebuild the secondary 'readings' indexes only when 'readings' is empty
+    # or the planned records are at least this fraction of the stored ones
+    INGESTION_INDEX_REBUILD_RATIO = 0.5
+    # Seconds a total readings count is reused by cursor paginated /api/weather requests
+    API_COUNT_CACHE_SECONDS = 60
+    # Readings counts kept for cursor paginated /api/weather requests
+    API_COUNT_CACHE_MAX_ENTRIES = 1024
+    # Serve /api/weather and /api/weather/stats from plain row tuples instead of ORM + marshmallow
+    API_FAST_SERIALIZATION = True
+    # Responses kept by the /api/weather and /api/weather/stats LRU cache; 0 disables caching
+    API_CACHE_MAX_ENTRIES = 1024
+    # Total size in bytes of the response bodies kept by the same cache
+    API_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    # Seconds /api/weather/rollup serves its in-memory copy of 'monthly_aggregates' before
+    # reloading it; ingestion in the serving process reloads it on next use
+    ROLLUP_CUBE_CACHE_SECONDS = 60
+    # Grid cell size (degrees) of the in-memory station spatial index of /api/stations
+    STATION_INDEX_CELL_DEGREES = 1.0
+    # Seconds /api/stations serves its in-memory station index before reloading it; station
+    # loads and ingestion in the serving process reload it on next use
+    STATION_INDEX_CACHE_SECONDS = 300
+    # Keep a Parquet copy of 'readings' (one file per station, one row group per year; requires pyarrow)
+    COLUMNAR_STORE_ENABLED = False
+    COLUMNAR_STORE_DIR = f"{ROOT_DIR}/columnar"
+    # Queue ingestion jobs for wx_data files as they land in WX_DATA_DIR, watched from a thread of
+    # the serving process
+    WX_DATA_WATCHER_ENABLED = False
+    # "auto" uses inotify where available and polls otherwise; "inotify" or "poll" force one
+    WX_DATA_WATCHER_BACKEND = "auto"
+    # Seconds without file changes before pending files are queued as a micro-batch
+    WX_DATA_WATCHER_DEBOUNCE_SECONDS = 1.0
+    # Longest a changed file waits while writes keep arriving
+    WX_DATA_WATCHER_MAX_DELAY_SECONDS = 10.0
+    # Most files per micro-batch ingestion job; the rest wait for the next one
+    WX_DATA_WATCHER_MAX_BATCH_FILES = 50
+    # Ingestion jobs pending or running at which due files stay pending instead of being queued
+    # as another micro-batch
+    WX_DATA_WATCHER_MAX_QUEUED_JOBS = 2
+    # Longest wait before the files of a micro-batch that could not be enqueued are retried; the
+    # wait starts at the debounce period and doubles with every consecutive failure
+    WX_DATA_WATCHER_MAX_BACKOFF_SECONDS = 300.0
+    WX_DATA_WATCHER_POLL_SECONDS = 2.0
+    # Run queued jobs in threads of the process that enqueues them (started on first enqueue)
+    JOB_WORKER_ENABLED = True
+    # Jobs of each type running at once across all processes sharing the database
+    JOB_CONCURRENCY = {
+        "ingestion": 1,
+        "analytics": 1,
+        "upload": 1,
+        "reference_data": 1,
+    }
+    # Runs of a failing job, retried after JOB_RETRY_DELAY_SECONDS doubled per attempt
+    JOB_MAX_ATTEMPTS = 3
+    JOB_RETRY_DELAY_SECONDS = 5
+    # Seconds idle job worker threads wait before polling the queue again
+    JOB_POLL_SECONDS = 1.0
     SWAGGER_UI_JSONEDITOR = False
     SWAGGER_UI_DOC_EXPANSION = "list"
     SWAGGER_UI_REQUEST_DURATION = True
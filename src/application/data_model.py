@@ -3,23 +3,67 @@ Contains database.db DDL
 """
 
 
+from sqlalchemy import cast, text, type_coerce
 from application import db, ma
 
+# Stored raw wx_data integers are divided by these factors on read
+READINGS_SCALING_FACTORS = {
+    "max_temperature": 10.0,
+    "min_temperature": 10.0,
+    "precipitation": 100.0,
+}
+
 
 class Readings(db.Model):
     """
     DDL for 'readings' table which contains weather records from wx_data files
+    Measurements are stored as the raw wx_data integers (missing values as NULL) in a table
+    clustered on (station_id, date); reading_id, year, month, day and the scaled measurements
+    are computed on read
     """
 
     __tablename__ = "readings"
-    reading_id = db.Column(db.String(18), primary_key=True)
-    station_id = db.Column(db.String(11), unique=False, nullable=False, index=True)
-    year = db.Column(db.Integer, unique=False, nullable=True, index=True)
-    month = db.Column(db.Integer, unique=False, nullable=True, index=True)
-    day = db.Column(db.Integer, unique=False, nullable=True, index=True)
-    max_temperature = db.Column(db.Float(4), unique=False, nullable=True)
-    min_temperature = db.Column(db.Float(4), unique=False, nullable=True)
-    precipitation = db.Column(db.Float(4), unique=False, nullable=True)
+    __table_args__ = (
+        # The primary key serves station and station + date filters
+        db.Index("ix_readings_date_station_id", "date", "station_id"),
+        {"sqlite_with_rowid": False},
+    )
+    station_id = db.Column(db.String(11), primary_key=True)
+    # YYYYMMDD
+    date = db.Column(db.Integer, primary_key=True)
+    # Tenths of a degree Celsius
+    max_temperature_raw = db.Column(
+        "max_temperature", db.SmallInteger, unique=False, nullable=True
+    )
+    min_temperature_raw = db.Column(
+        "min_temperature", db.SmallInteger, unique=False, nullable=True
+    )
+    # Tenths of a millimeter
+    precipitation_raw = db.Column(
+        "precipitation", db.SmallInteger, unique=False, nullable=True
+    )
+    reading_id = db.column_property(
+        type_coerce(station_id + cast(date, db.String), db.String(19))
+    )
+    year = db.column_property(type_coerce(date // 10000, db.Integer))
+    month = db.column_property(type_coerce(date // 100 % 100, db.Integer))
+    day = db.column_property(type_coerce(date % 100, db.Integer))
+    # Bit-identical to the previously stored round(value * 0.10, 4) / round(value * 0.01, 4)
+    max_temperature = db.column_property(
+        type_coerce(
+            max_temperature_raw / READINGS_SCALING_FACTORS["max_temperature"], db.Float
+        )
+    )
+    min_temperature = db.column_property(
+        type_coerce(
+            min_temperature_raw / READINGS_SCALING_FACTORS["min_temperature"], db.Float
+        )
+    )
+    precipitation = db.column_property(
+        type_coerce(
+            precipitation_raw / READINGS_SCALING_FACTORS["precipitation"], db.Float
+        )
+    )
     schema = "coding_exercise"
 
     def __repr__(self):
@@ -118,3 +162,208 @@ class ResultsSchema(ma.SQLAlchemySchema):
 
 result_schema = ResultsSchema()
 results_schema = ResultsSchema(many=True)
+
+
+class Yields(db.Model):
+    """
+    DDL for 'yields' table which contains the yearly US corn grain yield from yld_data files
+    """
+
+    __tablename__ = "yields"
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # Thousands of metric tons
+    corn_grain_yield = db.Column(db.Integer, unique=False, nullable=False)
+    schema = "coding_exercise"
+
+    def __repr__(self):
+        return f"Yields(\
+            '{self.year}'\
+                ,'{self.corn_grain_yield}'\
+                    )"
+
+
+class Stations(db.Model):
+    """
+    DDL for 'stations' table which contains GHCN-Daily station metadata (ghcnd-stations.txt)
+    """
+
+    __tablename__ = "stations"
+    station_id = db.Column(db.String(11), primary_key=True)
+    # Decimal degrees
+    latitude = db.Column(db.Float, unique=False, nullable=False)
+    longitude = db.Column(db.Float, unique=False, nullable=False)
+    # Meters; NULL where the metadata file has -999.9
+    elevation = db.Column(db.Float, unique=False, nullable=True)
+    state = db.Column(db.String(2), unique=False, nullable=True)
+    name = db.Column(db.String(30), unique=False, nullable=True)
+    schema = "coding_exercise"
+
+    def __repr__(self):
+        return f"Stations(\
+            '{self.station_id}'\
+                ,'{self.latitude}'\
+                    ,'{self.longitude}'\
+                        ,'{self.elevation}'\
+                            ,'{self.state}'\
+                                ,'{self.name}'\
+                                    )"
+
+
+class StationMetrics(db.Model):
+    """
+    DDL for 'station_metrics' table which contains the per year-station weather metrics of the
+    metrics engine (see metrics_engine.METRICS_REGISTRY) as one row per metric
+    """
+
+    __tablename__ = "station_metrics"
+    __table_args__ = ({"sqlite_with_rowid": False},)
+    station_id = db.Column(db.String(11), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    metric = db.Column(db.String(64), primary_key=True)
+    # NULL where the metric is undefined, e.g. no readings of its measurement
+    value = db.Column(db.Float, unique=False, nullable=True)
+    schema = "coding_exercise"
+
+    def __repr__(self):
+        return f"StationMetrics(\
+            '{self.station_id}'\
+                ,'{self.year}'\
+                    ,'{self.metric}'\
+                        ,'{self.value}'\
+                            )"
+
+
+class IngestManifest(db.Model):
+    """
+    DDL for 'ingest_manifest' table which records the state of every ingested wx_data file,
+    so unchanged files are skipped and appended files are only parsed from their last offset
+    """
+
+    __tablename__ = "ingest_manifest"
+    file_name = db.Column(db.String(255), primary_key=True)
+    file_size = db.Column(db.Integer, unique=False, nullable=False)
+    mtime_ns = db.Column(db.Integer, unique=False, nullable=False)
+    # Hash of the bytes before 'ingested_offset'
+    content_hash = db.Column(db.String(32), unique=False, nullable=False)
+    ingested_offset = db.Column(db.Integer, unique=False, nullable=False)
+    ingested_at = db.Column(db.DateTime, unique=False, nullable=False)
+    schema = "coding_exercise"
+
+    def __repr__(self):
+        return f"IngestManifest(\
+            '{self.file_name}'\
+                ,'{self.file_size}'\
+                    ,'{self.mtime_ns}'\
+                        ,'{self.content_hash}'\
+                            ,'{self.ingested_offset}'\
+                                ,'{self.ingested_at}'\
+                                    )"
+
+
+class Aggregates(db.Model):
+    """
+    DDL for 'aggregates' table which contains mergeable per year-station sums and counts of
+    'readings' measurements, maintained by ingestion in the same transaction as the inserts
+    """
+
+    __tablename__ = "aggregates"
+    aggregate_id = db.Column(db.String(15), primary_key=True)
+    year = db.Column(db.Integer, unique=False, nullable=True, index=True)
+    station_id = db.Column(db.String(11), unique=False, nullable=False, index=True)
+    max_temperature_count = db.Column(db.Integer, unique=False, nullable=False)
+    max_temperature_sum = db.Column(db.Float, unique=False, nullable=False)
+    min_temperature_count = db.Column(db.Integer, unique=False, nullable=False)
+    min_temperature_sum = db.Column(db.Float, unique=False, nullable=False)
+    precipitation_count = db.Column(db.Integer, unique=False, nullable=False)
+    precipitation_sum = db.Column(db.Float, unique=False, nullable=False)
+    schema = "coding_exercise"
+
+    def __repr__(self):
+        return f"Aggregates(\
+            '{self.aggregate_id}'\
+                ,'{self.year}'\
+                    ,'{self.station_id}'\
+                        ,'{self.max_temperature_count}'\
+                            ,'{self.max_temperature_sum}'\
+                                ,'{self.min_temperature_count}'\
+                                    ,'{self.min_temperature_sum}'\
+                                        ,'{self.precipitation_count}'\
+                                            ,'{self.precipitation_sum}'\
+                                                )"
+
+
+class MonthlyAggregates(db.Model):
+    """
+    DDL for 'monthly_aggregates' table, the (station, year, month) cube of mergeable 'readings'
+    sums and counts maintained by ingestion; coarser windows are answered by summing its cells
+    """
+
+    __tablename__ = "monthly_aggregates"
+    __table_args__ = ({"sqlite_with_rowid": False},)
+    station_id = db.Column(db.String(11), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    month = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    days_count = db.Column(db.Integer, unique=False, nullable=False)
+    max_temperature_count = db.Column(db.Integer, unique=False, nullable=False)
+    max_temperature_sum = db.Column(db.Float, unique=False, nullable=False)
+    min_temperature_count = db.Column(db.Integer, unique=False, nullable=False)
+    min_temperature_sum = db.Column(db.Float, unique=False, nullable=False)
+    precipitation_count = db.Column(db.Integer, unique=False, nullable=False)
+    precipitation_sum = db.Column(db.Float, unique=False, nullable=False)
+    schema = "coding_exercise"
+
+    def __repr__(self):
+        return f"MonthlyAggregates(\
+            '{self.station_id}'\
+                ,'{self.year}-{self.month}'\
+                    ,'{self.days_count}'\
+                        ,'{self.max_temperature_sum}/{self.max_temperature_count}'\
+                            ,'{self.min_temperature_sum}/{self.min_temperature_count}'\
+                                ,'{self.precipitation_sum}/{self.precipitation_count}'\
+                                    )"
+
+
+class Jobs(db.Model):
+    """
+    DDL for 'jobs' table which persists the background ingestion and analytics jobs queue
+    'params' and 'progress' hold JSON documents
+    """
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # At most one pending job per dedupe key: identical submissions are folded into it
+        db.Index(
+            "ix_jobs_pending_dedupe_key",
+            "dedupe_key",
+            unique=True,
+            sqlite_where=text("state = 'pending'"),
+        ),
+        db.Index("ix_jobs_state_job_type", "state", "job_type"),
+    )
+    job_id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(32), unique=False, nullable=False)
+    # pending, running, succeeded or failed
+    state = db.Column(db.String(16), unique=False, nullable=False)
+    dedupe_key = db.Column(db.String(64), unique=False, nullable=False)
+    params = db.Column(db.Text, unique=False, nullable=False)
+    progress = db.Column(db.Text, unique=False, nullable=True)
+    attempts = db.Column(db.Integer, unique=False, nullable=False)
+    max_attempts = db.Column(db.Integer, unique=False, nullable=False)
+    error = db.Column(db.Text, unique=False, nullable=True)
+    # <host>:<pid> of the process running the job
+    worker = db.Column(db.String(255), unique=False, nullable=True)
+    created_at = db.Column(db.DateTime, unique=False, nullable=False)
+    # Pending jobs are not claimed before this time (retry backoff)
+    run_after = db.Column(db.DateTime, unique=False, nullable=False)
+    started_at = db.Column(db.DateTime, unique=False, nullable=True)
+    finished_at = db.Column(db.DateTime, unique=False, nullable=True)
+    schema = "coding_exercise"
+
+    def __repr__(self):
+        return f"Jobs(\
+            '{self.job_id}'\
+                ,'{self.job_type}'\
+                    ,'{self.state}'\
+                        ,'{self.attempts}/{self.max_attempts}'\
+                            ,'{self.created_at}'\
+                                )"
@@ -3,16 +3,21 @@ This module contains forms related to '/ingest' url paths
 """
 
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
-from wtforms.validators import DataRequired, InputRequired
-from wtforms import SubmitField
+from wtforms.validators import InputRequired, ValidationError
+from wtforms import MultipleFileField, SubmitField
+from application.ingest.upload_utility import UPLOAD_EXTENSIONS, upload_kind
 
 
 class UploadSingleForm(FlaskForm):
     """
-    Form for ingesting a single wx_data file into database.db
+    Form for ingesting wx_data files (.txt, gzip compressed or zip archives) into database.db
     """
-    file = FileField(
-        "", validators=[DataRequired(), InputRequired(), FileAllowed(["txt"])]
-    )
+    files = MultipleFileField("", validators=[InputRequired()])
     submit = SubmitField("Submit")
+
+    def validate_files(self, field):
+        for upload in field.data:
+            if upload_kind(upload.filename or "") is None:
+                raise ValidationError(
+                    f"File does not have an approved extension: {', '.join(UPLOAD_EXTENSIONS)}"
+                )
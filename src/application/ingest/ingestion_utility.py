@@ -2,15 +2,97 @@
 This module contains methods used for ingesting data from wx_data files into database.db
 """
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+import hashlib
 import logging
 import os
-import pandas as pd
 from flask import current_app
-from sqlalchemy import insert
-from application import db, executor
-from application.data_model import Readings
-from application.analytics.stats_utility import StatsUtilities
+from sqlalchemy import Column, MetaData, Table, delete, exists, func, select, true
+from sqlalchemy.dialects.sqlite import insert
+from application import db
+from application.data_model import (
+    Aggregates,
+    IngestManifest,
+    MonthlyAggregates,
+    Readings,
+    READINGS_SCALING_FACTORS,
+)
+from application.apis.response_cache import (
+    READINGS_COUNT_CACHE,
+    readings_cache_invalidator,
+    results_cache_invalidator,
+)
+from application.analytics.columnar_store import (
+    columnar_partitions_writer,
+    columnar_store_available,
+)
+from application.analytics.rollup_utility import (
+    MONTHLY_CUBE,
+    monthly_aggregates_upsert_statement,
+    monthly_cells_select,
+    monthly_records_builder,
+)
+from application.analytics.station_utility import STATION_INDEX
+from application.analytics.stats_utility import (
+    StatsUtilities,
+    aggregates_query,
+    aggregates_statistics,
+    results_records_builder,
+    results_upsert_statement,
+)
+from application.jobs.job_queue import job_enqueuer
+from application.ingest.parser_utility import (
+    READINGS_COLUMNS,
+    WX_DATA_LINE_LENGTH,
+    wx_data_tail_parser,
+    readings_batcher,
+    records_builder,
+)
+
+# Running sums and counts kept per year-station in 'aggregates'
+AGGREGATES_COLUMNS = [
+    "max_temperature_count",
+    "max_temperature_sum",
+    "min_temperature_count",
+    "min_temperature_sum",
+    "precipitation_count",
+    "precipitation_sum",
+]
+# Per-connection temporary table holding the batch being written, clustered like 'readings'
+# so a record listed twice in a batch is staged once and the batch is grouped and copied in
+# key order
+readings_staging = Table(
+    "readings_staging",
+    MetaData(),
+    *[
+        Column(column.name, column.type, primary_key=column.primary_key)
+        for column in Readings.__table__.columns
+    ],
+    prefixes=["TEMPORARY"],
+    sqlite_with_rowid=False,
+)
+
+# Bytes read at a time when hashing wx_data files for 'ingest_manifest'
+MANIFEST_HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_content_hasher(file_path, end_offset):
+    """
+    Hashes the first 'end_offset' bytes of a file, as recorded in 'ingest_manifest.content_hash'
+    """
+    content_hash = hashlib.blake2b(digest_size=16)
+    remaining_bytes = end_offset
+    with open(file_path, mode="rb") as infile:
+        while remaining_bytes > 0:
+            chunk = infile.read(min(remaining_bytes, MANIFEST_HASH_CHUNK_SIZE))
+            if len(chunk) == 0:
+                break
+            content_hash.update(chunk)
+            remaining_bytes = remaining_bytes - len(chunk)
+    return content_hash.hexdigest()
 
 
 class IngestionUtility:
@@ -18,13 +100,43 @@ class IngestionUtility:
     This module contains methods used for ingesting data from wx_data files into database.db
     """
 
-    root_directory = current_app.config["ROOT_DIR"]
-    wx_data_directory = current_app.config["WX_DATA_DIR"]
     formatter = logging.Formatter("%(asctime)s: %(message)s")
 
-    def __init__(self, ingestion_files=None, ingestion_type=None):
+    def __init__(
+        self,
+        ingestion_files=None,
+        ingestion_type=None,
+        bulk_load=False,
+        rebuild_indexes=False,
+        use_manifest=True,
+    ):
+        # Read from the app of the calling context, so every app ingests its own directory
+        self.root_directory = current_app.config["ROOT_DIR"]
+        self.wx_data_directory = current_app.config["WX_DATA_DIR"]
+        self.ingestion_workers = current_app.config["INGESTION_WORKERS"]
+        self.ingestion_batch_size = current_app.config["INGESTION_BATCH_SIZE"]
+        self.index_rebuild_ratio = current_app.config["INGESTION_INDEX_REBUILD_RATIO"]
         self.ingestion_files = ingestion_files
         self.ingestion_type = ingestion_type
+        # Bulk-load mode writes large loads without maintaining the secondary 'readings' indexes
+        self.bulk_load = bulk_load
+        # Drop secondary 'readings' indexes during a bulk load and rebuild them afterwards,
+        # when index_rebuild_planner finds the load large enough
+        self.rebuild_indexes = bulk_load and rebuild_indexes
+        # (year, station) partitions that received new records
+        self.touched_partitions = set()
+        # Skip files unchanged since the offsets recorded in 'ingest_manifest'; when False
+        # every file is parsed whole (duplicates are still skipped by the database)
+        self.use_manifest = use_manifest
+        # {file name: start offset} of the files to parse; None parses every file whole
+        self.file_offsets = None
+        # {file name: (size, mtime_ns)} when planned and {file name: end offset} once parsed
+        self.file_stats = {}
+        self.parsed_offsets = {}
+        # Called with the progress dict after every committed batch when run as a job
+        self.progress_reporter = None
+        # Exception that stopped ingestor(), if any
+        self.ingestion_error = None
         # Set input parameters if ingestion not triggered via front end
         if self.ingestion_files is None:
             all_files = os.listdir(self.wx_data_directory)
@@ -61,6 +173,11 @@ class IngestionUtility:
             f"{len(self.ingestion_files)}",
         )
         self.logger.info("Ingestion request endpoint: %s", f"{self.ingestion_type}")
+        self.logger.info(
+            "Bulk-load mode: %s (rebuild indexes: %s)",
+            f"{self.bulk_load}",
+            f"{self.rebuild_indexes}",
+        )
         self.logger.info("Log file location: %s", f"{self.log_file_path}")
         self.logger.info("=============== ===================== ===============")
 
@@ -73,97 +190,457 @@ class IngestionUtility:
             handler.close()
             self.logger.removeHandler(handler)
 
-    @staticmethod
-    @executor.job
-    def analytics_orchestrator_task(stats_object):
+    def manifest_planner(self):
+        """
+        Compares the ingestion files with their 'ingest_manifest' rows
+        Files with an unchanged size and mtime are skipped; files whose previously ingested bytes
+        still hash the same were appended to and are parsed from their ingested offset;
+        new or rewritten files are parsed whole
+        Returns {file name: start offset} of the files to parse
+        """
+        manifest_rows = {
+            manifest_row.file_name: manifest_row
+            for manifest_row in db.session.query(IngestManifest).all()
+        }
+        file_offsets = {}
+        skipped_files = 0
+        appended_files = 0
+        for file in dict.fromkeys(self.ingestion_files):
+            file_name = f"{file.split('.txt')[0]}.txt"
+            file_path = f"{self.wx_data_directory}/{file_name}"
+            file_stat = os.stat(file_path)
+            self.file_stats[file_name] = (file_stat.st_size, file_stat.st_mtime_ns)
+            manifest_row = manifest_rows.get(file_name)
+            if not self.use_manifest or manifest_row is None:
+                file_offsets[file_name] = 0
+            elif (
+                file_stat.st_size == manifest_row.file_size
+                and file_stat.st_mtime_ns == manifest_row.mtime_ns
+            ):
+                skipped_files = skipped_files + 1
+            elif file_stat.st_size >= manifest_row.ingested_offset and (
+                file_content_hasher(
+                    file_path=file_path, end_offset=manifest_row.ingested_offset
+                )
+                == manifest_row.content_hash
+            ):
+                appended_files = appended_files + 1
+                file_offsets[file_name] = manifest_row.ingested_offset
+            else:
+                file_offsets[file_name] = 0
+        self.logger.info(
+            "Ingest manifest: %s unchanged files skipped, %s appended files parsed from their last offset, %s files parsed whole",
+            f"{skipped_files}",
+            f"{appended_files}",
+            f"{len(file_offsets) - appended_files}",
+        )
+        return file_offsets
+
+    def index_rebuild_planner(self):
         """
-        Statistics Calculation Background Task
-        Params: stats_object --> stats object created in analytics_hub
+        Decides whether a bulk load drops and rebuilds the secondary 'readings' indexes
+        Queries keep using them while a small load writes, so they are only dropped when 'readings'
+        is empty or the planned records are at least 'INGESTION_INDEX_REBUILD_RATIO' of the
+        stored ones
+        Returns True when the indexes are to be dropped
         """
-        StatsUtilities.analytics_orchestrator(self=stats_object)
+        if not self.rebuild_indexes:
+            return False
+        planned_records = (
+            sum(
+                self.file_stats[file_name][0] - start_offset
+                for file_name, start_offset in self.file_offsets.items()
+            )
+            // WX_DATA_LINE_LENGTH
+        )
+        stored_records = db.session.query(func.count()).select_from(Readings).scalar()
+        rebuild_indexes = (
+            stored_records == 0
+            or planned_records >= stored_records * self.index_rebuild_ratio
+        )
+        self.logger.info(
+            "Index rebuild: %s (%s planned records, %s stored records)",
+            f"{rebuild_indexes}",
+            f"{planned_records}",
+            f"{stored_records}",
+        )
+        return rebuild_indexes
+
+    def manifest_writer(self):
+        """
+        Records size, mtime, content hash and ingested offset of the parsed files in 'ingest_manifest'
+        Called once their records are committed, so a failed run re-reads them next time
+        """
+        ingested_at = datetime.now()
+        manifest_records = []
+        for file_name, end_offset in self.parsed_offsets.items():
+            file_size, mtime_ns = self.file_stats[file_name]
+            manifest_records.append(
+                {
+                    "file_name": file_name,
+                    "file_size": file_size,
+                    "mtime_ns": mtime_ns,
+                    "content_hash": file_content_hasher(
+                        file_path=f"{self.wx_data_directory}/{file_name}",
+                        end_offset=end_offset,
+                    ),
+                    "ingested_offset": end_offset,
+                    "ingested_at": ingested_at,
+                }
+            )
+        if len(manifest_records) == 0:
+            return
+        manifest_upsert_statement = insert(IngestManifest)
+        db.session.execute(
+            manifest_upsert_statement.on_conflict_do_update(
+                index_elements=[IngestManifest.file_name],
+                set_={
+                    column: manifest_upsert_statement.excluded[column]
+                    for column in manifest_records[0]
+                    if column != "file_name"
+                },
+            ),
+            manifest_records,
+        )
+        db.session.commit()
+
+    def file_parser(self):
+        """
+        Generator yielding the readings dataframe of every ingestion file, in file order
+        Files are parsed in a process pool of 'INGESTION_WORKERS' workers when more than one is
+        configured; results are consumed by the single writer in the calling process
+        """
+        station_ids = []
+        file_paths = []
+        start_offsets = []
+        # A file listed twice would stage the same records twice within a batch
+        for file in dict.fromkeys(self.ingestion_files):
+            file_station_id = str(
+                file.split(f"{self.wx_data_directory}/")[0].split(".txt")[0]
+            )
+            if (
+                self.file_offsets is not None
+                and f"{file_station_id}.txt" not in self.file_offsets
+            ):
+                # Unchanged since its last ingestion
+                continue
+            station_ids.append(file_station_id)
+            file_paths.append(f"{self.wx_data_directory}/{file_station_id}.txt")
+            start_offsets.append(
+                0
+                if self.file_offsets is None
+                else self.file_offsets[f"{file_station_id}.txt"]
+            )
+
+        workers = min(self.ingestion_workers, len(file_paths))
+        if workers <= 1:
+            for file_station_id, file_path, start_offset in zip(
+                station_ids, file_paths, start_offsets
+            ):
+                self.logger.info(
+                    "Processing wx_data file: %s", f"{file_station_id}.txt"
+                )
+                readings_df, end_offset = wx_data_tail_parser(
+                    file_path=file_path,
+                    station_id=file_station_id,
+                    start_offset=start_offset,
+                )
+                self.parsed_offsets[f"{file_station_id}.txt"] = end_offset
+                yield readings_df
+        else:
+            self.logger.info("Parsing wx_data files with %s workers", f"{workers}")
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Keep a bounded number of files in flight so parsed results waiting
+                # for the writer do not pile up in memory
+                file_queue = deque(zip(station_ids, file_paths, start_offsets))
+                pending_files = deque()
+                while len(file_queue) > 0 or len(pending_files) > 0:
+                    while len(file_queue) > 0 and len(pending_files) < workers * 2:
+                        file_station_id, file_path, start_offset = file_queue.popleft()
+                        pending_files.append(
+                            (
+                                file_station_id,
+                                pool.submit(
+                                    wx_data_tail_parser,
+                                    file_path,
+                                    file_station_id,
+                                    start_offset,
+                                ),
+                            )
+                        )
+                    file_station_id, parsed_file = pending_files.popleft()
+                    self.logger.info(
+                        "Processing wx_data file: %s", f"{file_station_id}.txt"
+                    )
+                    readings_df, end_offset = parsed_file.result()
+                    self.parsed_offsets[f"{file_station_id}.txt"] = end_offset
+                    yield readings_df
+
+    @contextmanager
+    def writer_connection(self):
+        """
+        Context manager yielding the single connection used to write 'readings'
+        In bulk-load mode the secondary 'readings' indexes are dropped when index_rebuild_planner
+        allows it, and rebuilt on exit
+        """
+        with db.engine.connect() as connection:
+            if not self.rebuild_indexes:
+                yield connection
+                return
+            dropped_indexes = []
+            for index in Readings.__table__.indexes:
+                index.drop(bind=connection, checkfirst=True)
+                dropped_indexes.append(index)
+            connection.commit()
+            self.logger.info(
+                "Dropped secondary indexes: %s",
+                f"{[index.name for index in dropped_indexes]}",
+            )
+            try:
+                yield connection
+            finally:
+                connection.rollback()
+                self.logger.info("START: Rebuilding secondary indexes")
+                for index in dropped_indexes:
+                    index.create(bind=connection, checkfirst=True)
+                connection.commit()
+                self.logger.info("END: Rebuilding secondary indexes")
+
+    def batch_writer(self, readings_batches):
+        """
+        Inserts and commits every batch of records, logging per-batch throughput
+        Each batch is staged in a temporary table and stripped of the records already in
+        'readings'; within one transaction the remaining new records are folded into the year-station 'aggregates' sums
+        and the 'monthly_aggregates' cube, inserted into 'readings', and the touched 'results' rows are refreshed from 'aggregates'
+        Duplicates are skipped by the database, so the cost of a run only depends on its own files
+        Params: readings_batches --> generator returned by readings_batcher
+        Returns the number of records inserted
+        """
+        staging_insert_statement = str(
+            insert(readings_staging)
+            .prefix_with("OR IGNORE")
+            .compile(dialect=db.engine.dialect, column_keys=READINGS_COLUMNS)
+        )
+        # Records already in 'readings' are dropped from the staged batch once, so the delta
+        # selects and the copy into 'readings' read the staging table alone
+        staging_dedupe_statement = delete(readings_staging).where(
+            exists().where(
+                Readings.station_id == readings_staging.c.station_id,
+                Readings.date == readings_staging.c.date,
+            )
+        )
+        staging_year = readings_staging.c.date // 10000
+        # Aggregates hold sums of scaled values, like the statistics computed from 'readings'
+        staging_measurements = [
+            readings_staging.c[column] / factor
+            for column, factor in READINGS_SCALING_FACTORS.items()
+        ]
+        aggregates_delta_query = select(
+            staging_year,
+            readings_staging.c.station_id,
+            func.min(readings_staging.c.date),
+            func.max(readings_staging.c.date),
+            *[
+                aggregate
+                for measurement in staging_measurements
+                for aggregate in (func.count(measurement), func.total(measurement))
+            ],
+        ).group_by(staging_year, readings_staging.c.station_id)
+        monthly_delta_query = monthly_cells_select(
+            year=staging_year,
+            month=readings_staging.c.date // 100 % 100,
+            station_id=readings_staging.c.station_id,
+            measurements=staging_measurements,
+        )
+        aggregates_upsert_statement = insert(Aggregates)
+        aggregates_upsert_statement = aggregates_upsert_statement.on_conflict_do_update(
+            index_elements=[Aggregates.aggregate_id],
+            set_={
+                column: getattr(Aggregates, column)
+                + aggregates_upsert_statement.excluded[column]
+                for column in AGGREGATES_COLUMNS
+            },
+        )
+        readings_insert_statement = (
+            insert(Readings.__table__)
+            .from_select(
+                READINGS_COLUMNS,
+                # SQLite needs a WHERE clause to parse the ON CONFLICT of INSERT ... SELECT
+                select(
+                    *[readings_staging.c[column] for column in READINGS_COLUMNS]
+                ).where(true()),
+            )
+            .on_conflict_do_nothing(index_elements=[Readings.station_id, Readings.date])
+        )
+
+        inserted_records = 0
+        batch_number = 0
+        with IngestionUtility.writer_connection(self=self) as connection:
+            readings_staging.create(bind=connection, checkfirst=True)
+            batch_start_time = datetime.now()
+            for readings_batch_df in readings_batches:
+                batch_number = batch_number + 1
+                connection.exec_driver_sql(
+                    staging_insert_statement,
+                    records_builder(readings_df=readings_batch_df),
+                )
+                connection.execute(staging_dedupe_statement)
+                aggregates_delta = connection.execute(aggregates_delta_query).all()
+                batch_inserted_records = 0
+                if len(aggregates_delta) > 0:
+                    connection.execute(
+                        aggregates_upsert_statement,
+                        [
+                            dict(
+                                zip(
+                                    ["aggregate_id", "year", "station_id"]
+                                    + AGGREGATES_COLUMNS,
+                                    (f"{year}{station}", year, station) + tuple(sums),
+                                )
+                            )
+                            for year, station, _, _, *sums in aggregates_delta
+                        ],
+                    )
+                    connection.execute(
+                        monthly_aggregates_upsert_statement(),
+                        monthly_records_builder(
+                            connection.execute(monthly_delta_query).all()
+                        ),
+                    )
+                    batch_inserted_records = connection.execute(
+                        readings_insert_statement
+                    ).rowcount
+                    # Refresh statistics of the partitions that received new records
+                    batch_partitions = {
+                        (year, station) for year, station, *_ in aggregates_delta
+                    }
+                    self.touched_partitions.update(batch_partitions)
+                    connection.execute(
+                        results_upsert_statement(),
+                        results_records_builder(
+                            aggregates_statistics(
+                                connection.execute(
+                                    aggregates_query(partitions=batch_partitions)
+                                ).all()
+                            )
+                        ),
+                    )
+                connection.execute(delete(readings_staging))
+                connection.commit()
+                inserted_records = inserted_records + batch_inserted_records
+                if self.progress_reporter is not None:
+                    self.progress_reporter(
+                        {
+                            "files_total": len(
+                                self.file_offsets or self.ingestion_files
+                            ),
+                            "files_done": len(self.parsed_offsets),
+                            "rows_inserted": inserted_records,
+                        }
+                    )
+                if batch_inserted_records > 0:
+                    IngestionUtility.cache_invalidator(
+                        self=self, aggregates_delta=aggregates_delta
+                    )
+                # Batch time includes parsing the files that filled the batch
+                batch_end_time = datetime.now()
+                batch_seconds = (batch_end_time - batch_start_time).total_seconds()
+                self.logger.info(
+                    "Batch %s committed: %s records (%s new) in %s s (%s records/s)",
+                    f"{batch_number}",
+                    f"{len(readings_batch_df)}",
+                    f"{batch_inserted_records}",
+                    f"{round(batch_seconds, 3)}",
+                    f"{round(len(readings_batch_df) / max(batch_seconds, 1e-6))}",
+                )
+                batch_start_time = batch_end_time
+            readings_staging.drop(bind=connection, checkfirst=True)
+        return inserted_records
+
+    def cache_invalidator(self, aggregates_delta):
+        """
+        Evicts the cached API responses and readings counts, the in-memory rollup cube and
+        station index a committed batch could have changed
+        Params: aggregates_delta --> (year, station, first date, last date, *sums) rows of the
+                records the batch inserted
+        """
+        touched_dates = {}
+        for year, station, first_date, last_date, *_ in aggregates_delta:
+            date_range = touched_dates.get(station, (first_date, last_date))
+            touched_dates[station] = (
+                min(date_range[0], first_date),
+                max(date_range[1], last_date),
+            )
+        evicted_entries = readings_cache_invalidator(
+            touched_dates=touched_dates
+        ) + results_cache_invalidator(
+            partitions={(year, station) for year, station, *_ in aggregates_delta}
+        )
+        if evicted_entries > 0:
+            self.logger.info("Evicted cached API responses: %s", f"{evicted_entries}")
+        # Any filtered count may have grown
+        READINGS_COUNT_CACHE.clear()
+        MONTHLY_CUBE.invalidate()
+        # Periods of record of the stations may have grown
+        STATION_INDEX.invalidate()
 
     def ingestor(self):
         """
         This method contains the ingestion logic
+        Files stream through file_parser >> readings_batcher >> batch_writer,
+        so at most one batch of records is held in memory and committed batches survive a failure
         """
         try:
             process_start_time = datetime.now()
             self.logger.info("Process Start DateTime: %s", f"{process_start_time}")
 
-            reading_id_list = db.session.query(Readings.reading_id).all()
-            distinct_reading_id_list = list(set(reading_id_list))
-            distinct_reading_id_dict = {}
-            for item in distinct_reading_id_list:
-                distinct_reading_id_dict[f"{item[0]}"] = None
-
-            bulk_insert_list = []
-            for file in self.ingestion_files:
-                file_station_id = str(
-                    file.split(f"{self.wx_data_directory}/")[0].split(".txt")[0]
+            if (
+                db.session.query(Aggregates.aggregate_id).first() is None
+                or db.session.query(MonthlyAggregates.station_id).first() is None
+            ) and db.session.query(Readings.station_id).first() is not None:
+                # Running sums must cover existing records before new ones are added
+                self.logger.info(
+                    "START: Building 'aggregates' and 'monthly_aggregates' from existing readings"
                 )
+                StatsUtilities.aggregates_rebuilder()
                 self.logger.info(
-                    "Processing wx_data file: %s", f"{file_station_id}.txt"
+                    "END: Building 'aggregates' and 'monthly_aggregates' from existing readings"
                 )
 
-                # Read file data into 'file_df' dataframe
-                file_df = pd.read_csv(
-                    filepath_or_buffer=f"{self.wx_data_directory}/{file_station_id}.txt",
-                    sep="\t",
-                    header=None,
-                )
-                row_counter = 0
-                while row_counter < len(file_df):
-                    row_data = file_df.iloc[row_counter].to_list()
-                    record_reading_id = f"{file_station_id}{str(row_data[0])}"
-                    # Check for duplicates
-                    result = record_reading_id in distinct_reading_id_dict
-                    if result == 0:
-                        distinct_reading_id_dict[f"{record_reading_id}"] = None
-                        record_year = int(str(row_data[0])[:4])
-                        record_month = int(str(row_data[0])[4:6])
-                        record_day = int(str(row_data[0])[6:8])
-                        record_max_temperature = (
-                            int(str(row_data[1]))
-                            if str(row_data[1]) != "-9999"
-                            else None
-                        )
-                        record_min_temperature = (
-                            int(str(row_data[2]))
-                            if str(row_data[2]) != "-9999"
-                            else None
-                        )
-                        record_precipitation = (
-                            int(str(row_data[3]))
-                            if str(row_data[3]) != "-9999"
-                            else None
-                        )
-                        record_dict = {
-                            "reading_id": f"{record_reading_id}",
-                            "station_id": file_station_id,
-                            "year": record_year,
-                            "month": record_month,
-                            "day": record_day,
-                            "max_temperature": round(record_max_temperature * 0.10, 4)
-                            if record_max_temperature is not None
-                            else record_max_temperature,
-                            "min_temperature": round(record_min_temperature * 0.10, 4)
-                            if record_min_temperature is not None
-                            else record_min_temperature,
-                            "precipitation": round(record_precipitation * 0.01, 4)
-                            if record_precipitation is not None
-                            else record_precipitation,
-                        }
-                        bulk_insert_list.append(record_dict)
-                    row_counter = row_counter + 1
-            self.logger.info(
-                "Number of bulk insert records identified: %s",
-                f"{len(bulk_insert_list)}",
-            )
-            if len(bulk_insert_list) > 0:
-                self.logger.info("START: Bulk records insertion")
-                db.session.execute(insert(Readings), bulk_insert_list)
-                db.session.commit()
-                self.logger.info("END: Bulk records insertion successful")
+            self.file_offsets = IngestionUtility.manifest_planner(self=self)
+            if len(self.file_offsets) == 0:
+                # Nothing to parse: skip the writer connection and its index maintenance
+                inserted_records = 0
+            else:
+                self.rebuild_indexes = IngestionUtility.index_rebuild_planner(self=self)
+                self.logger.info(
+                    "START: Batch records insertion (batch size: %s)",
+                    f"{self.ingestion_batch_size}",
+                )
+                readings_batches = readings_batcher(
+                    readings_dfs=IngestionUtility.file_parser(self=self),
+                    batch_size=self.ingestion_batch_size,
+                )
+                inserted_records = IngestionUtility.batch_writer(
+                    self=self, readings_batches=readings_batches
+                )
+                self.logger.info(
+                    "END: Batch records insertion successful, records inserted: %s",
+                    f"{inserted_records}",
+                )
+                IngestionUtility.manifest_writer(self=self)
+            if columnar_store_available() and len(self.touched_partitions) > 0:
+                self.logger.info(
+                    "START: Columnar store update (%s year-station partitions)",
+                    f"{len(self.touched_partitions)}",
+                )
+                columnar_records = columnar_partitions_writer(
+                    partitions=self.touched_partitions
+                )
+                self.logger.info(
+                    "END: Columnar store update, records written: %s",
+                    f"{columnar_records}",
+                )
 
             process_end_time = datetime.now()
             self.logger.info("Process End DateTime: %s", f"{process_end_time}")
@@ -172,18 +649,28 @@ class IngestionUtility:
                 "Total ingestion process time == %s", f"{total_process_time}"
             )
 
-            # Initiate statistics calculation for newly ingested records
-            if len(bulk_insert_list) > 0:
+            # 'results' rows were refreshed with each batch; regenerate the report from 'aggregates'
+            if inserted_records > 0:
                 self.logger.info(
-                    "Initiated background task for weather statistics results computation for newly added records"
+                    "Initiated weather statistics report refresh for %s year-station combinations",
+                    f"{len(self.touched_partitions)}",
+                )
+                # Runs triggered by several ingestions coalesce into one pending analytics job
+                analytics_job_id = job_enqueuer(
+                    job_type="analytics",
+                    params={
+                        "partitions": [
+                            [year, station]
+                            for year, station in sorted(self.touched_partitions)
+                        ],
+                        "source": "aggregates",
+                    },
                 )
+                self.logger.info("Analytics job: %s", f"{analytics_job_id}")
                 # Close logger
                 IngestionUtility.close_logger(self=self)
 
-                stats_object = StatsUtilities()
-                IngestionUtility.analytics_orchestrator_task.submit(
-                    stats_object=stats_object
-                )
-
         except Exception as error:
+            db.session.rollback()
+            self.ingestion_error = error
             self.logger.info("%s", f"{error}")
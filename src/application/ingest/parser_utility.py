@@ -0,0 +1,373 @@
+"""
+This module contains vectorized methods used for parsing wx_data files into column arrays
+"""
+
+import io
+import mmap
+import os
+import re
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+import pandas as pd
+
+
+MISSING_VALUE = -9999
+WX_DATA_COLUMNS = ["date", "max_temperature", "min_temperature", "precipitation"]
+WX_DATA_DTYPES = {
+    "date": np.int32,
+    "max_temperature": np.int32,
+    "min_temperature": np.int32,
+    "precipitation": np.int32,
+}
+MEASUREMENT_COLUMNS = ["max_temperature", "min_temperature", "precipitation"]
+# Stored 'readings' table columns
+READINGS_COLUMNS = ["station_id", "date"] + MEASUREMENT_COLUMNS
+# Fixed-width wx_data line: 'YYYYMMDD\t%5d\t%5d\t%5d\n'
+WX_DATA_LINE_LENGTH = 27
+WX_DATA_SEPARATOR_POSITIONS = [8, 14, 20]
+# (first byte, field count, field width) of the date and of the three measurement fields
+WX_DATA_DATE_FIELDS = (0, 1, 8)
+WX_DATA_MEASUREMENT_FIELDS = (9, 3, 5)
+# Malformed line offsets listed in a ValueError message
+MALFORMED_OFFSETS_REPORTED = 10
+# Line of the tab separated layouts read by 'wx_data_csv_reader' (without its newline)
+WX_DATA_LINE_PATTERN = re.compile(rb" *-?[0-9]+(\t *-?[0-9]+){3} *\r?")
+
+
+def wx_data_fixed_width(line):
+    """
+    True when a line (bytes) has the tab positions of the fixed-width wx_data layout
+    """
+    return (
+        len(line) in (WX_DATA_LINE_LENGTH - 1, WX_DATA_LINE_LENGTH)
+        and all(line[position] == ord("\t") for position in WX_DATA_SEPARATOR_POSITIONS)
+        and (len(line) == WX_DATA_LINE_LENGTH - 1 or line.endswith(b"\n"))
+    )
+
+
+def fixed_width_fields_parser(lines_bytes, fields, padded, out):
+    """
+    Parses right-aligned integer fields of every line into 'out', one byte position at a time
+    Each step works on a (lines, fields) strided view of the bytes, so the work per line stays
+    in numpy and no per-line Python objects are created
+    Params: lines_bytes --> uint8 array of consecutive WX_DATA_LINE_LENGTH byte lines
+            fields --> (first byte, field count, field width), fields WX_DATA_LINE_LENGTH apart
+                       being separated by one tab
+            padded --> whether fields may be space padded and signed
+            out --> preallocated (lines, field count) int32 array receiving the values
+    Returns a boolean array flagging lines with a malformed field
+    """
+    first_byte, field_count, field_width = fields
+    line_count = len(out)
+    field_bytes = as_strided(
+        lines_bytes[first_byte:],
+        shape=(line_count, field_count, field_width),
+        strides=(WX_DATA_LINE_LENGTH, field_width + 1, 1),
+        writeable=False,
+    )
+    shape = (line_count, field_count)
+    digits = np.empty(shape, dtype=np.uint8)
+    is_digit = np.empty(shape, dtype=bool)
+    is_space = np.empty(shape, dtype=bool)
+    is_minus = np.zeros(shape, dtype=bool)
+    negative = np.zeros(shape, dtype=bool)
+    malformed = np.zeros(shape, dtype=bool)
+    check = np.empty(shape, dtype=bool)
+    # Once the value has started (always, for unpadded fields) only digits may follow
+    value_started = np.full(shape, not padded, dtype=bool)
+    values = np.zeros(shape, dtype=np.int32)
+    for position in range(field_width):
+        position_bytes = field_bytes[:, :, position]
+        np.subtract(position_bytes, ord("0"), out=digits)
+        np.less(digits, 10, out=is_digit)
+        malformed |= np.greater(value_started, is_digit, out=check)
+        if padded:
+            np.equal(position_bytes, ord(" "), out=is_space)
+            np.equal(position_bytes, ord("-"), out=is_minus)
+            # Before the value only spaces, a minus sign or a digit are valid
+            np.logical_or(is_space, is_minus, out=check)
+            check |= is_digit
+            malformed |= ~check
+            negative |= is_minus
+            value_started |= ~is_space
+        values *= 10
+        digits *= is_digit
+        values += digits
+    # A value ends with a digit
+    malformed |= ~is_digit
+    np.negative(values, out=values, where=negative)
+    out[...] = values
+    return malformed.any(axis=1)
+
+
+def fixed_width_lines_parser(lines_bytes, complete_lines, out):
+    """
+    Parses consecutive fixed-width wx_data lines into 'out'
+    Params: lines_bytes --> uint8 array starting at a line start
+            complete_lines --> number of lines ending with a newline; when 'out' has one more line,
+                               the last line is complete without its newline
+            out --> preallocated (lines, len(WX_DATA_COLUMNS)) int32 array receiving the values
+    Returns a boolean array flagging malformed lines
+    """
+    line_count = len(out)
+    malformed_lines = np.zeros(line_count, dtype=bool)
+    malformed_lines[:complete_lines] = lines_bytes[
+        WX_DATA_LINE_LENGTH - 1 :: WX_DATA_LINE_LENGTH
+    ][:complete_lines] != ord("\n")
+    for position in WX_DATA_SEPARATOR_POSITIONS:
+        malformed_lines |= lines_bytes[position::WX_DATA_LINE_LENGTH][
+            :line_count
+        ] != ord("\t")
+    malformed_lines |= fixed_width_fields_parser(
+        lines_bytes=lines_bytes,
+        fields=WX_DATA_DATE_FIELDS,
+        padded=False,
+        out=out[:, :1],
+    )
+    malformed_lines |= fixed_width_fields_parser(
+        lines_bytes=lines_bytes,
+        fields=WX_DATA_MEASUREMENT_FIELDS,
+        padded=True,
+        out=out[:, 1:],
+    )
+    return malformed_lines
+
+
+def wx_data_block_validator(block, fixed_width):
+    """
+    Checks a block of complete wx_data lines, e.g. a chunk of a streamed upload
+    Params: block --> bytes of whole lines; the last line may lack its newline
+            fixed_width --> whether the file's first line has the fixed-width layout, which
+                            'wx_data_reader' then expects from every line
+    Returns the byte offset of the first malformed line within 'block', or None
+    """
+    if len(block) == 0:
+        return None
+    complete_lines, last_line_bytes = divmod(len(block), WX_DATA_LINE_LENGTH)
+    if fixed_width and last_line_bytes in (0, WX_DATA_LINE_LENGTH - 1):
+        line_count = complete_lines + (last_line_bytes > 0)
+        malformed_lines = fixed_width_lines_parser(
+            lines_bytes=np.frombuffer(block, dtype=np.uint8),
+            complete_lines=complete_lines,
+            out=np.empty((line_count, len(WX_DATA_COLUMNS)), dtype=np.int32),
+        )
+        if not malformed_lines.any():
+            return None
+        return int(np.argmax(malformed_lines)) * WX_DATA_LINE_LENGTH
+    # Locate the first malformed line one line at a time
+    lines = block.split(b"\n")
+    line_offset = 0
+    for line_number, line in enumerate(lines):
+        terminated = line_number < len(lines) - 1
+        if not terminated and len(line) == 0:
+            break
+        if fixed_width:
+            valid_line = wx_data_fixed_width(
+                line + b"\n" if terminated else line
+            ) and WX_DATA_LINE_PATTERN.fullmatch(line)
+        else:
+            # pandas skips blank lines
+            valid_line = len(line.strip()) == 0 or WX_DATA_LINE_PATTERN.fullmatch(line)
+        if not valid_line:
+            return line_offset
+        line_offset = line_offset + len(line) + 1
+    return None
+
+
+def wx_data_mmap_reader(file_path, start_offset=0):
+    """
+    Parses a fixed-width wx_data file straight from a memory map into a preallocated int32 array
+    Only complete lines are parsed: a file being appended to can be read again from 'end_offset'
+    Params: file_path --> absolute path of the wx_data file
+            start_offset --> byte offset of the first line to parse, e.g. a previous 'end_offset'
+    Returns (dataframe of raw integer columns, end_offset)
+    Raises ValueError listing the byte offsets of malformed lines
+    """
+    with open(file_path, mode="rb") as wx_data_file:
+        file_size = os.fstat(wx_data_file.fileno()).st_size
+        if start_offset > file_size:
+            raise ValueError(
+                f"Start offset {start_offset} is beyond the end of {file_path} ({file_size} bytes)"
+            )
+        remaining_bytes = file_size - start_offset
+        complete_lines = remaining_bytes // WX_DATA_LINE_LENGTH
+        # A last line without its newline is complete once every field is written
+        unterminated_line = remaining_bytes % WX_DATA_LINE_LENGTH == (
+            WX_DATA_LINE_LENGTH - 1
+        )
+        line_count = complete_lines + unterminated_line
+        raw_values = np.empty((line_count, len(WX_DATA_COLUMNS)), dtype=np.int32)
+        if line_count > 0:
+            with mmap.mmap(
+                wx_data_file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped_file:
+                if start_offset > 0 and mapped_file[start_offset - 1] != ord("\n"):
+                    raise ValueError(
+                        f"Start offset {start_offset} is not a line start of {file_path}"
+                    )
+                lines_bytes = np.frombuffer(
+                    mapped_file, dtype=np.uint8, offset=start_offset
+                )
+                try:
+                    malformed_lines = fixed_width_lines_parser(
+                        lines_bytes=lines_bytes,
+                        complete_lines=complete_lines,
+                        out=raw_values,
+                    )
+                finally:
+                    # The map cannot be closed while a view of it is alive
+                    del lines_bytes
+            if malformed_lines.any():
+                malformed_offsets = (
+                    start_offset
+                    + np.flatnonzero(malformed_lines)[:MALFORMED_OFFSETS_REPORTED]
+                    * WX_DATA_LINE_LENGTH
+                ).tolist()
+                raise ValueError(
+                    f"{int(malformed_lines.sum())} malformed line(s) in {file_path} "
+                    f"at byte offsets: {malformed_offsets}"
+                )
+    return pd.DataFrame(raw_values, columns=WX_DATA_COLUMNS, copy=False), (
+        start_offset + min(line_count * WX_DATA_LINE_LENGTH, remaining_bytes)
+    )
+
+
+def wx_data_csv_reader(file_path, start_offset=0):
+    """
+    Reads a wx_data file of any whitespace layout with pandas
+    Params: file_path --> absolute path of the wx_data file
+            start_offset --> byte offset of the first line to read
+    Returns (dataframe of raw integer columns, end_offset)
+    """
+    with open(file_path, mode="rb") as wx_data_file:
+        wx_data_file.seek(start_offset)
+        file_content = wx_data_file.read()
+    end_offset = start_offset + len(file_content)
+    if len(file_content.strip()) == 0:
+        return (
+            pd.DataFrame(
+                np.empty((0, len(WX_DATA_COLUMNS)), dtype=np.int32),
+                columns=WX_DATA_COLUMNS,
+            ),
+            end_offset,
+        )
+    file_df = pd.read_csv(
+        filepath_or_buffer=io.BytesIO(file_content),
+        sep="\t",
+        header=None,
+        names=WX_DATA_COLUMNS,
+        dtype=WX_DATA_DTYPES,
+        engine="c",
+    )
+    return file_df, end_offset
+
+
+def wx_data_reader(file_path, start_offset=0):
+    """
+    Reads a wx_data file, or its tail from 'start_offset', into a dataframe of raw integer columns
+    Fixed-width files go through 'wx_data_mmap_reader'; other layouts fall back to pandas
+    Params: file_path --> absolute path of the wx_data file
+            start_offset --> byte offset of the first line to read
+    Returns (dataframe of raw integer columns, end_offset)
+    """
+    with open(file_path, mode="rb") as wx_data_file:
+        wx_data_file.seek(max(start_offset - 1, 0))
+        previous_byte = wx_data_file.read(1) if start_offset > 0 else b"\n"
+        first_line = wx_data_file.readline()
+        if start_offset > 0 and first_line == b"\n":
+            # Newline appended after a last line that was read without one
+            start_offset = start_offset + 1
+            first_line = wx_data_file.readline()
+        elif len(first_line) > 0 and previous_byte != b"\n":
+            raise ValueError(
+                f"Start offset {start_offset} is not a line start of {file_path}"
+            )
+    if len(first_line) == 0 or wx_data_fixed_width(first_line):
+        return wx_data_mmap_reader(file_path=file_path, start_offset=start_offset)
+    return wx_data_csv_reader(file_path=file_path, start_offset=start_offset)
+
+
+def wx_data_transformer(file_df, station_id):
+    """
+    Converts raw wx_data columns into 'readings' table columns using whole-column operations
+    Measurements stay raw integers (scaled on read); missing values become NaN
+    Params: file_df --> dataframe returned by wx_data_reader
+            station_id --> station the wx_data file belongs to
+    """
+    dates = file_df["date"].to_numpy()
+    columns = {
+        "station_id": np.full(len(dates), station_id, dtype=object),
+        "date": dates,
+    }
+    for column in MEASUREMENT_COLUMNS:
+        raw_values = file_df[column].to_numpy()
+        columns[column] = np.where(raw_values == MISSING_VALUE, np.nan, raw_values)
+    return pd.DataFrame(columns, columns=READINGS_COLUMNS)
+
+
+def wx_data_tail_parser(file_path, station_id, start_offset=0):
+    """
+    Reads and transforms a single wx_data file from 'start_offset'
+    Params: file_path --> absolute path of the wx_data file
+            station_id --> station the wx_data file belongs to
+            start_offset --> byte offset to parse from, for files appended to since the last read
+    Returns (readings dataframe, end_offset)
+    """
+    file_df, end_offset = wx_data_reader(file_path=file_path, start_offset=start_offset)
+    # Keep the first occurrence of a date repeated within the same file
+    file_df = file_df.drop_duplicates(subset="date", keep="first")
+    return wx_data_transformer(file_df=file_df, station_id=station_id), end_offset
+
+
+def wx_data_parser(file_path, station_id):
+    """
+    Reads and transforms a single wx_data file
+    Params: file_path --> absolute path of the wx_data file
+            station_id --> station the wx_data file belongs to
+    """
+    readings_df, _ = wx_data_tail_parser(file_path=file_path, station_id=station_id)
+    return readings_df
+
+
+def readings_batcher(readings_dfs, batch_size):
+    """
+    Re-chunks a stream of readings dataframes into dataframes of exactly 'batch_size' records
+    (the last batch may be smaller)
+    Params: readings_dfs --> iterable of readings dataframes
+            batch_size --> number of records per batch
+    """
+    pending_dfs = []
+    pending_records = 0
+    for readings_df in readings_dfs:
+        if len(readings_df) == 0:
+            continue
+        pending_dfs.append(readings_df)
+        pending_records = pending_records + len(readings_df)
+        if pending_records >= batch_size:
+            combined_df = pd.concat(pending_dfs, ignore_index=True)
+            batch_start = 0
+            while len(combined_df) - batch_start >= batch_size:
+                yield combined_df.iloc[batch_start : batch_start + batch_size]
+                batch_start = batch_start + batch_size
+            pending_dfs = [combined_df.iloc[batch_start:]]
+            pending_records = len(pending_dfs[0])
+    if pending_records > 0:
+        yield pd.concat(pending_dfs, ignore_index=True)
+
+
+def records_builder(readings_df):
+    """
+    Builds the list of row tuples (in READINGS_COLUMNS order) expected by the database writer
+    Measurements are converted back to integers and missing measurements (NaN) to None
+    Params: readings_df --> dataframe returned by wx_data_parser
+    """
+    column_values = []
+    for column in READINGS_COLUMNS:
+        values = readings_df[column].to_numpy()
+        if values.dtype.kind == "f":
+            missing_values = np.isnan(values)
+            values = np.where(
+                missing_values, None, np.where(missing_values, 0, values).astype(int)
+            )
+        column_values.append(values.tolist())
+    return list(zip(*column_values))
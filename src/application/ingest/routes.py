@@ -3,6 +3,7 @@ Routes file for '/ingest' url paths
 """
 
 import os
+import click
 from flask import (
     Blueprint,
     request,
@@ -12,34 +13,33 @@ from flask import (
     current_app,
     flash,
 )
-from werkzeug.utils import secure_filename
-from application import executor
 from application.ingest.forms import UploadSingleForm
-from application.ingest.ingestion_utility import IngestionUtility
+from application.ingest.upload_utility import (
+    staged_uploads_collector,
+    staged_uploads_discarder,
+)
+from application.ingest.watcher_utility import WatcherUtility
+from application.jobs.job_queue import job_enqueuer
 
 INGEST = Blueprint("ingest", __name__)
 
 
-@executor.job
-def ingestion_task(ingestion_object):
+@INGEST.cli.command("watch")
+def ingest_watch():
     """
-    Ingestion Background Task
-    Params: ingestion_object --> ingestion object created in data_loader_single()/data_loader_batch
+    Runs the wx_data watcher in the foreground until interrupted
+    Ingestion from this process does not evict the API response cache of a running server;
+    prefer Config.WX_DATA_WATCHER_ENABLED there
+    Usage (from 'src' directory): flask --app run ingest watch
     """
-
-    IngestionUtility.ingestor(self=ingestion_object)
-
-
-def save_file(wx_data_directory, form_file):
-    """
-    Saves the submitted file into '/wx_data_files' directory
-    """
-    if not os.path.exists(wx_data_directory):
-        os.mkdir(wx_data_directory)
-    filename_secure = secure_filename(form_file.filename)
-    upload_file_path = os.path.join(f"{wx_data_directory}", f"{filename_secure}")
-    form_file.save(upload_file_path)
-    return filename_secure
+    watcher_object = WatcherUtility(app=current_app._get_current_object())
+    click.echo(
+        f"Watching {watcher_object.wx_data_directory}, log: {watcher_object.log_file_path}"
+    )
+    try:
+        WatcherUtility.watcher(self=watcher_object)
+    except KeyboardInterrupt:
+        watcher_object.stop_event.set()
 
 
 @INGEST.route("/ingest")
@@ -53,25 +53,36 @@ def data_loader_selector():
 @INGEST.route("/ingest/single", methods=["GET", "POST"])
 def data_loader_single():
     """
-    Form to ingest a single wtx file
+    Form to ingest wx_data files, gzip compressed files or zip archives of wx_data files
     """
     form = UploadSingleForm()
     if form.validate_on_submit():
-        if form.file.data:
-            data_loader_single.wx_data_directory = current_app.config["WX_DATA_DIR"]
-            data_loader_single.save_file_output = save_file(
-                wx_data_directory=data_loader_single.wx_data_directory,
-                form_file=form.file.data,
+        # Files were streamed into the staging directory while the request was parsed
+        (
+            data_loader_single.staged_files,
+            data_loader_single.upload_errors,
+        ) = staged_uploads_collector(uploads=form.files.data)
+        if len(data_loader_single.upload_errors) > 0:
+            staged_uploads_discarder(staged_files=data_loader_single.staged_files)
+            for upload_error in data_loader_single.upload_errors:
+                flash(upload_error, "danger")
+        else:
+            data_loader_single.job_id = job_enqueuer(
+                job_type="upload",
+                params={
+                    "staged_files": data_loader_single.staged_files,
+                    "ingestion_type": request.endpoint,
+                },
             )
             flash(
-                f"File {data_loader_single.save_file_output} saved successfully. Proceeding with ingestion.",
+                f"{len(data_loader_single.staged_files)} file(s) uploaded successfully. Ingestion queued as job {data_loader_single.job_id} (status: /api/jobs/{data_loader_single.job_id}).",
                 "success",
             )
-            data_loader_single.ingestion_object = IngestionUtility(
-                ingestion_files=[data_loader_single.save_file_output],
-                ingestion_type=request.endpoint,
-            )
-            ingestion_task.submit(ingestion_object=data_loader_single.ingestion_object)
+    elif request.method == "POST":
+        staged_files, _ = staged_uploads_collector(
+            uploads=request.files.getlist("files")
+        )
+        staged_uploads_discarder(staged_files=staged_files)
     return render_template(
         "ingest/data_loader_single.html", title="Upload Single", form=form
     )
@@ -86,6 +97,22 @@ def data_loader_batch():
     if not os.path.exists(data_loader_batch.wx_data_directory):
         flash('"wx_data_files" directory not found. Please contact admin.', "danger")
     else:
+        # yld_data and station metadata are (re)loaded by a job, so a malformed file fails the
+        # job, not the request
+        data_loader_batch.reference_datasets = []
+        if os.path.exists(current_app.config["YLD_DATA_FILE"]):
+            data_loader_batch.reference_datasets.append("yields")
+        if os.path.exists(current_app.config["STATIONS_DATA_FILE"]):
+            data_loader_batch.reference_datasets.append("stations")
+        if len(data_loader_batch.reference_datasets) > 0:
+            data_loader_batch.reference_job_id = job_enqueuer(
+                job_type="reference_data",
+                params={"datasets": data_loader_batch.reference_datasets},
+            )
+            flash(
+                f"Loading of {', '.join(data_loader_batch.reference_datasets)} queued as job {data_loader_batch.reference_job_id}.",
+                "success",
+            )
         data_loader_batch.all_files = os.listdir(data_loader_batch.wx_data_directory)
         data_loader_batch.all_files.sort()
         for file in data_loader_batch.all_files:
@@ -97,13 +124,18 @@ def data_loader_batch():
                 "danger",
             )
         else:
-            data_loader_batch.ingestion_object = IngestionUtility(
-                ingestion_files=data_loader_batch.all_files,
-                ingestion_type=request.endpoint,
+            # Repeated requests fold into the same pending job
+            data_loader_batch.job_id = job_enqueuer(
+                job_type="ingestion",
+                params={
+                    "ingestion_files": data_loader_batch.all_files,
+                    "ingestion_type": request.endpoint,
+                    "bulk_load": True,
+                    "rebuild_indexes": True,
+                },
             )
-            ingestion_task.submit(ingestion_object=data_loader_batch.ingestion_object)
             flash(
-                f"Ingestion of {len(data_loader_batch.all_files)} wx_data files in progress.",
+                f"Ingestion of {len(data_loader_batch.all_files)} wx_data files queued as job {data_loader_batch.job_id}.",
                 "success",
             )
     return redirect(url_for("ingest.data_loader_selector"))
@@ -0,0 +1,284 @@
+"""
+This module contains the streaming handling of wx_data files uploaded through /ingest/single
+Uploads are written to a staging directory chunk by chunk while the multipart body is parsed:
+.txt files are validated as they arrive and .gz files are decompressed and validated on the fly;
+.zip archives are staged as is and their members are extracted and validated by the upload job
+"""
+
+import os
+import uuid
+import zipfile
+import zlib
+from flask import Request, current_app
+from werkzeug.utils import secure_filename
+from application.ingest.parser_utility import (
+    wx_data_block_validator,
+    wx_data_fixed_width,
+)
+
+UPLOAD_EXTENSIONS = ("txt", "gz", "zip")
+# Hidden staging directory inside WX_DATA_DIR: same filesystem, so staged files are published
+# with an atomic rename, and ignored by batch ingestion and the wx_data watcher
+UPLOAD_STAGING_DIRNAME = ".uploads"
+# Bytes read at a time from zip archive members
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+def upload_kind(file_name):
+    """
+    Returns the UPLOAD_EXTENSIONS entry of an uploaded file name, or None when unsupported
+    """
+    extension = file_name.lower().rpartition(".")[2]
+    return extension if extension in UPLOAD_EXTENSIONS else None
+
+
+def upload_staging_directory():
+    """
+    Returns the staging directory of WX_DATA_DIR, creating it when missing
+    """
+    staging_directory = f"{current_app.config['WX_DATA_DIR']}/{UPLOAD_STAGING_DIRNAME}"
+    os.makedirs(staging_directory, exist_ok=True)
+    return staging_directory
+
+
+class WxDataUploadStream:
+    """
+    Writable file object receiving an uploaded file chunk by chunk
+    wx_data content (.txt, or decompressed .gz) is validated one block of complete lines at a
+    time; the first malformed line stops writing and is reported by finish()
+    """
+
+    def __init__(self, staging_directory, file_name):
+        self.file_name = secure_filename(file_name or "")
+        self.kind = upload_kind(self.file_name)
+        # Station file name published into WX_DATA_DIR
+        self.target_name = self.file_name
+        if self.kind == "gz":
+            station_name = self.file_name[: -len(".gz")]
+            self.target_name = (
+                station_name if station_name.endswith(".txt") else f"{station_name}.txt"
+            )
+        self.staged_path = f"{staging_directory}/{uuid.uuid4().hex}-{self.target_name}"
+        self.file = open(self.staged_path, mode="w+b")
+        # 16 + MAX_WBITS: gzip header and trailer
+        self.decompressor = (
+            zlib.decompressobj(wbits=16 + zlib.MAX_WBITS) if self.kind == "gz" else None
+        )
+        # Bytes of an incomplete last line, validated once the rest of it arrives
+        self.remainder = b""
+        self.validated_bytes = 0
+        self.fixed_width = None
+        self.error = None
+        self.finished = False
+        if self.kind is None:
+            self.error = f"unsupported file type, expected one of: {', '.join(UPLOAD_EXTENSIONS)}"
+
+    def content_validator(self, data, final=False):
+        """
+        Validates the complete lines of 'data' following the remainder of the previous chunk
+        Raises ValueError with the byte offset of the first malformed line
+        """
+        data = self.remainder + data
+        block_length = len(data) if final else data.rfind(b"\n") + 1
+        block, self.remainder = data[:block_length], data[block_length:]
+        if self.fixed_width is None and len(block) > 0:
+            self.fixed_width = wx_data_fixed_width(
+                block[: block.find(b"\n") + 1] or block
+            )
+        malformed_offset = wx_data_block_validator(
+            block=block, fixed_width=self.fixed_width
+        )
+        if malformed_offset is not None:
+            raise ValueError(
+                f"malformed wx_data line at byte offset {self.validated_bytes + malformed_offset}"
+            )
+        self.validated_bytes = self.validated_bytes + len(block)
+
+    def gzip_decompressor(self, data):
+        """
+        Decompresses a chunk of gzip data, including files of several concatenated gzip members
+        """
+        content = self.decompressor.decompress(data)
+        while self.decompressor.eof and len(self.decompressor.unused_data) > 0:
+            unused_data = self.decompressor.unused_data
+            self.decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+            content = content + self.decompressor.decompress(unused_data)
+        return content
+
+    def write(self, data):
+        if self.error is not None:
+            # Keep draining the request body
+            return len(data)
+        try:
+            content = data
+            if self.kind == "gz":
+                content = WxDataUploadStream.gzip_decompressor(self=self, data=data)
+            if self.kind != "zip":
+                WxDataUploadStream.content_validator(self=self, data=content)
+            self.file.write(content)
+        except (ValueError, zlib.error) as error:
+            self.error = f"{error}"
+        return len(data)
+
+    def finish(self):
+        """
+        Validates the last line and closes the staged file; failed uploads are removed
+        Returns the error message, or None once the file is staged
+        """
+        if self.finished:
+            return self.error
+        self.finished = True
+        if self.error is None:
+            try:
+                if self.kind == "gz":
+                    if not self.decompressor.eof:
+                        raise ValueError("truncated gzip stream")
+                if self.kind != "zip":
+                    WxDataUploadStream.content_validator(
+                        self=self, data=b"", final=True
+                    )
+                    if self.validated_bytes == 0:
+                        raise ValueError("no wx_data lines")
+                elif not zipfile.is_zipfile(self.file):
+                    raise ValueError("not a zip archive")
+            except (ValueError, zlib.error) as error:
+                self.error = f"{error}"
+        self.file.close()
+        if self.error is not None:
+            os.remove(self.staged_path)
+        return self.error
+
+    # File object interface used by the multipart parser and FileStorage
+    def seek(self, offset, whence=0):
+        if self.file.closed:
+            return 0
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return 0 if self.file.closed else self.file.tell()
+
+    def read(self, size=-1):
+        return b"" if self.file.closed else self.file.read(size)
+
+    def close(self):
+        WxDataUploadStream.finish(self=self)
+
+
+class WxDataRequest(Request):
+    """
+    Request class streaming files uploaded to /ingest/single into WxDataUploadStream objects
+    instead of spooling them to memory or temporary files first
+    """
+
+    def _get_file_stream(
+        self, total_content_length, content_type, filename=None, content_length=None
+    ):
+        if self.endpoint != "ingest.data_loader_single":
+            return super()._get_file_stream(
+                total_content_length, content_type, filename, content_length
+            )
+        return WxDataUploadStream(
+            staging_directory=upload_staging_directory(), file_name=filename
+        )
+
+
+def staged_uploads_collector(uploads):
+    """
+    Finishes the upload streams of a request
+    Params: uploads --> FileStorage objects of the request
+    Returns (list of [staged path, file name] of the staged uploads, list of error messages)
+    """
+    staged_files = []
+    errors = []
+    for upload in uploads:
+        upload_stream = upload.stream
+        if not isinstance(upload_stream, WxDataUploadStream):
+            continue
+        error = WxDataUploadStream.finish(self=upload_stream)
+        if error is None:
+            staged_files.append([upload_stream.staged_path, upload_stream.target_name])
+        else:
+            errors.append(f"{upload_stream.file_name or 'Upload'}: {error}")
+    return staged_files, errors
+
+
+def staged_uploads_discarder(staged_files):
+    """
+    Removes staged uploads that will not be published
+    """
+    for staged_path, _ in staged_files:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+
+
+def zip_upload_extractor(staged_path, staging_directory):
+    """
+    Extracts the .txt members of a staged zip archive into staged station files, streaming and
+    validating every member one chunk at a time
+    Returns a list of (staged path, station file name)
+    Raises ValueError listing the malformed members; nothing is staged then
+    """
+    member_streams = []
+    errors = []
+    with zipfile.ZipFile(staged_path) as archive:
+        for member in archive.infolist():
+            member_name = os.path.basename(member.filename)
+            if (
+                member.is_dir()
+                or member_name.startswith(".")
+                or upload_kind(member_name) not in ("txt", "gz")
+            ):
+                continue
+            member_stream = WxDataUploadStream(
+                staging_directory=staging_directory, file_name=member_name
+            )
+            member_streams.append(member_stream)
+            with archive.open(member) as member_file:
+                while member_stream.error is None:
+                    chunk = member_file.read(UPLOAD_CHUNK_SIZE)
+                    if len(chunk) == 0:
+                        break
+                    member_stream.write(chunk)
+            error = WxDataUploadStream.finish(self=member_stream)
+            if error is not None:
+                errors.append(f"{member.filename}: {error}")
+    if len(errors) > 0 or len(member_streams) == 0:
+        for member_stream in member_streams:
+            if member_stream.error is None:
+                os.remove(member_stream.staged_path)
+        raise ValueError(
+            f"{'; '.join(errors) or 'no wx_data files'} in {os.path.basename(staged_path)}"
+        )
+    return [
+        (member_stream.staged_path, member_stream.target_name)
+        for member_stream in member_streams
+    ]
+
+
+def staged_uploads_publisher(staged_files):
+    """
+    Extracts staged zip archives and atomically moves the staged station files into WX_DATA_DIR
+    Params: staged_files --> list of (staged path, station file or archive name)
+    Returns the sorted names of the published station files
+    Staged uploads not yet published are removed when publishing fails, before re-raising
+    """
+    wx_data_directory = current_app.config["WX_DATA_DIR"]
+    staging_directory = upload_staging_directory()
+    station_files = []
+    try:
+        for staged_path, file_name in staged_files:
+            if upload_kind(file_name) == "zip":
+                station_files.extend(
+                    zip_upload_extractor(
+                        staged_path=staged_path, staging_directory=staging_directory
+                    )
+                )
+                os.remove(staged_path)
+            else:
+                station_files.append((staged_path, file_name))
+        for staged_path, file_name in station_files:
+            os.replace(staged_path, f"{wx_data_directory}/{file_name}")
+    except Exception:
+        staged_uploads_discarder(staged_files=list(staged_files) + station_files)
+        raise
+    return sorted({file_name for _, file_name in station_files})
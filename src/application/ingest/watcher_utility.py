@@ -0,0 +1,415 @@
+"""
+This module contains the continuous ingestion service watching 'WX_DATA_DIR'
+File events are read from inotify (polling 'os.scandir' where inotify is unavailable), debounced,
+and coalesced into micro-batches queued as ingestion jobs
+"""
+
+import ctypes
+from datetime import datetime
+import fcntl
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from application.jobs.job_queue import active_jobs_counter, job_enqueuer
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+# wd, mask, cookie, len
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+INOTIFY_READ_SIZE = 64 * 1024
+# Held by the running watcher of a directory, so a second one exits instead of double ingesting
+WATCHER_LOCK_FILENAME = ".watcher.lock"
+
+
+def wx_data_file_name(file_name):
+    """
+    True for names of wx_data files the service ingests; hidden files are partial uploads
+    """
+    return file_name.endswith(".txt") and not file_name.startswith(".")
+
+
+class InotifyReader:
+    """
+    Reads the names of files written to or moved into a directory, through inotify(7) via ctypes
+    Raises OSError when inotify is not available on the platform
+    """
+
+    def __init__(self, directory):
+        try:
+            # The running process already links libc (glibc or musl)
+            libc = ctypes.CDLL(None, use_errno=True)
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except (AttributeError, OSError) as error:
+            raise OSError(f"inotify is not available: {error}")
+        inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Close and modify events both count: debouncing waits for the writes to settle
+        watch_descriptor = inotify_add_watch(
+            self.fd,
+            os.fsencode(directory),
+            IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE,
+        )
+        if watch_descriptor < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def read(self, timeout):
+        """
+        Waits up to 'timeout' seconds for events
+        Returns (set of file names, overflow); overflow is True when the kernel queue dropped
+        events and the directory must be rescanned
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        file_names = set()
+        overflow = False
+        if len(readable) == 0:
+            return file_names, overflow
+        while True:
+            try:
+                buffer = os.read(self.fd, INOTIFY_READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                _, mask, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(
+                    buffer, offset
+                )
+                offset = offset + INOTIFY_EVENT_HEADER.size
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif name_length > 0:
+                    file_names.add(
+                        os.fsdecode(buffer[offset : offset + name_length].rstrip(b"\0"))
+                    )
+                offset = offset + name_length
+        return file_names, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingReader:
+    """
+    Reads the names of files whose size or mtime changed, by rescanning a directory
+    Used where inotify is not available (non-Linux hosts, some network filesystems)
+    """
+
+    def __init__(self, directory, poll_seconds):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self.file_stats = self.directory_scanner()
+
+    def directory_scanner(self):
+        """
+        Returns {file name: (size, mtime_ns)} of the directory's files
+        """
+        file_stats = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    entry_stat = entry.stat()
+                    file_stats[entry.name] = (
+                        entry_stat.st_size,
+                        entry_stat.st_mtime_ns,
+                    )
+        return file_stats
+
+    def read(self, timeout):
+        """
+        Waits up to 'timeout' seconds (at most one poll interval) and rescans the directory
+        Returns (set of changed file names, False)
+        """
+        time.sleep(min(timeout, self.poll_seconds))
+        file_stats = self.directory_scanner()
+        file_names = {
+            file_name
+            for file_name, file_stat in file_stats.items()
+            if self.file_stats.get(file_name) != file_stat
+        }
+        self.file_stats = file_stats
+        return file_names, False
+
+    def close(self):
+        pass
+
+
+class WatcherUtility:
+    """
+    This module contains the long-running service ingesting wx_data files as they land in
+    'WX_DATA_DIR'
+    Events are debounced: a micro-batch is queued once no file changed for the debounce period,
+    or once its oldest change waited 'WX_DATA_WATCHER_MAX_DELAY_SECONDS'. Micro-batches are capped
+    at 'WX_DATA_WATCHER_MAX_BATCH_FILES' files and enqueued as ingestion jobs, run by JobWorker
+    threads within 'JOB_CONCURRENCY' like every other ingestion; jobs retry failed ingestions.
+    While 'WX_DATA_WATCHER_MAX_QUEUED_JOBS' ingestion jobs are pending or running, due files stay
+    pending, so a burst of files grows the next micro-batch instead of the queue.
+    Files of a micro-batch that could not be enqueued are put back and retried after a backoff.
+    'ingest_manifest' skips files that did not change since their last ingestion
+    """
+
+    formatter = logging.Formatter("%(asctime)s: %(message)s")
+
+    def __init__(self, app):
+        self.app = app
+        self.wx_data_directory = app.config["WX_DATA_DIR"]
+        self.backend = app.config["WX_DATA_WATCHER_BACKEND"]
+        self.debounce_seconds = app.config["WX_DATA_WATCHER_DEBOUNCE_SECONDS"]
+        self.max_delay_seconds = app.config["WX_DATA_WATCHER_MAX_DELAY_SECONDS"]
+        self.max_batch_files = app.config["WX_DATA_WATCHER_MAX_BATCH_FILES"]
+        self.poll_seconds = app.config["WX_DATA_WATCHER_POLL_SECONDS"]
+        self.max_backoff_seconds = app.config["WX_DATA_WATCHER_MAX_BACKOFF_SECONDS"]
+        self.max_queued_jobs = app.config["WX_DATA_WATCHER_MAX_QUEUED_JOBS"]
+        # True while due files are held back by a full ingestion queue
+        self.queue_full = False
+        # {file name: (first change time, last change time)} waiting for ingestion; files backing
+        # off after a micro-batch that could not be enqueued have a first change time in the future
+        self.pending_files = {}
+        # {file name: consecutive micro-batches that could not be enqueued}
+        self.failed_files = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Setup process logger
+        self.log_folder_path = f"{app.config['ROOT_DIR']}/logs"
+        if not os.path.exists(self.log_folder_path):
+            os.mkdir(self.log_folder_path)
+        self.setup_datetime_str = str(datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        self.log_file_path = (
+            f"{self.log_folder_path}/watcher_{self.setup_datetime_str}.log"
+        )
+        # Watchers started within the same second keep separate handlers
+        self.logger = logging.getLogger(f"watcher_{self.setup_datetime_str}_{id(self)}")
+        self.logger.setLevel(logging.INFO)
+        self.file_handler = logging.FileHandler(self.log_file_path, mode="a")
+        self.file_handler.setFormatter(self.formatter)
+        self.logger.addHandler(self.file_handler)
+        self.logger.info("=============== Logger setup complete ===============")
+        self.logger.info("Watching wx_data directory: %s", f"{self.wx_data_directory}")
+
+    def close_logger(self):
+        """
+        This method closes the logger after the service stops
+        """
+        handlers = self.logger.handlers[:]
+        for handler in handlers:
+            handler.close()
+            self.logger.removeHandler(handler)
+
+    def event_reader_opener(self):
+        """
+        Opens the inotify reader, or the polling reader when inotify is unavailable or
+        'WX_DATA_WATCHER_BACKEND' is "poll"
+        """
+        if self.backend != "poll":
+            try:
+                event_reader = InotifyReader(directory=self.wx_data_directory)
+                self.logger.info("Event source: inotify")
+                return event_reader
+            except OSError as error:
+                if self.backend == "inotify":
+                    raise
+                self.logger.info("inotify unavailable (%s), polling", f"{error}")
+        self.logger.info("Event source: polling every %s s", f"{self.poll_seconds}")
+        return PollingReader(
+            directory=self.wx_data_directory, poll_seconds=self.poll_seconds
+        )
+
+    def pending_files_adder(self, file_names):
+        """
+        Records changes of wx_data files; a file changed again keeps its first change time
+        """
+        now = time.monotonic()
+        for file_name in file_names:
+            if not wx_data_file_name(file_name):
+                continue
+            first_change_time, _ = self.pending_files.get(file_name, (now, now))
+            self.pending_files[file_name] = (first_change_time, now)
+
+    def pending_files_restorer(self, file_names):
+        """
+        Puts back the files of a micro-batch that could not be enqueued, due again after a backoff
+        doubling with each consecutive failure of the file (at most
+        'WX_DATA_WATCHER_MAX_BACKOFF_SECONDS')
+        """
+        now = time.monotonic()
+        for file_name in file_names:
+            failures = self.failed_files.get(file_name, 0) + 1
+            self.failed_files[file_name] = failures
+            retry_time = now + min(
+                self.debounce_seconds * 2 ** (failures - 1), self.max_backoff_seconds
+            )
+            self.pending_files[file_name] = (retry_time, retry_time)
+
+    def directory_rescanner(self):
+        """
+        Marks every wx_data file as changed (startup and dropped inotify events)
+        """
+        self.pending_files_adder(file_names=os.listdir(self.wx_data_directory))
+
+    def micro_batch_selector(self):
+        """
+        Returns the names of the files due for ingestion, oldest changes first, or an empty list
+        while the pending files are still being written or the ingestion queue is full
+        """
+        now = time.monotonic()
+        # Files still backing off after a micro-batch that could not be enqueued wait
+        waiting_files = {
+            file_name: change_times
+            for file_name, change_times in self.pending_files.items()
+            if change_times[0] <= now
+        }
+        if len(waiting_files) == 0:
+            return []
+        last_change_time = max(last_change for _, last_change in waiting_files.values())
+        first_change_time = min(
+            first_change for first_change, _ in waiting_files.values()
+        )
+        if (
+            now - last_change_time < self.debounce_seconds
+            and now - first_change_time < self.max_delay_seconds
+        ):
+            return []
+        if not WatcherUtility.queue_checker(self=self):
+            return []
+        due_files = sorted(
+            waiting_files, key=lambda file_name: waiting_files[file_name][0]
+        )[: self.max_batch_files]
+        for file_name in due_files:
+            del self.pending_files[file_name]
+        # Files deleted or renamed away since their event
+        return sorted(
+            file_name
+            for file_name in due_files
+            if os.path.isfile(f"{self.wx_data_directory}/{file_name}")
+        )
+
+    def queue_checker(self):
+        """
+        Returns True when fewer than 'WX_DATA_WATCHER_MAX_QUEUED_JOBS' ingestion jobs are pending
+        or running; logs when the queue fills up and drains
+        """
+        queued_jobs = active_jobs_counter(job_type="ingestion")
+        queue_full = queued_jobs >= self.max_queued_jobs
+        if queue_full != self.queue_full:
+            self.queue_full = queue_full
+            self.logger.info(
+                "Ingestion queue %s: %s jobs pending or running (%s files pending)",
+                "full, holding due files" if queue_full else "drained",
+                f"{queued_jobs}",
+                f"{len(self.pending_files)}",
+            )
+        return not queue_full
+
+    def micro_batch_enqueuer(self, ingestion_files):
+        """
+        Enqueues a micro-batch as an ingestion job; identical pending micro-batches share one job
+        Raises the error that prevented enqueueing, if any
+        """
+        ingestion_job_id = job_enqueuer(
+            job_type="ingestion",
+            params={
+                "ingestion_files": ingestion_files,
+                "ingestion_type": "wx_data watcher",
+            },
+        )
+        for file_name in ingestion_files:
+            self.failed_files.pop(file_name, None)
+        self.logger.info(
+            "Micro-batch of %s files queued as ingestion job %s (%s pending)",
+            f"{len(ingestion_files)}",
+            f"{ingestion_job_id}",
+            f"{len(self.pending_files)}",
+        )
+
+    def watcher(self):
+        """
+        Event loop of the service, run until stop() is called
+        Returns without watching when another watcher already holds the directory lock
+        """
+        lock_file = open(f"{self.wx_data_directory}/{WATCHER_LOCK_FILENAME}", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            self.logger.info("Directory already watched by another watcher")
+            WatcherUtility.close_logger(self=self)
+            return
+        with lock_file, self.app.app_context():
+            event_reader = WatcherUtility.event_reader_opener(self=self)
+            try:
+                WatcherUtility.directory_rescanner(self=self)
+                while not self.stop_event.is_set():
+                    ingestion_files = WatcherUtility.micro_batch_selector(self=self)
+                    if len(ingestion_files) > 0:
+                        try:
+                            WatcherUtility.micro_batch_enqueuer(
+                                self=self, ingestion_files=ingestion_files
+                            )
+                        except Exception as error:
+                            self.logger.info("%s", f"{error}")
+                            # Retried after a backoff instead of waiting for a new change
+                            WatcherUtility.pending_files_restorer(
+                                self=self, file_names=ingestion_files
+                            )
+                        continue
+                    file_names, overflow = event_reader.read(
+                        timeout=self.debounce_seconds
+                    )
+                    if overflow:
+                        self.logger.info("inotify queue overflow, rescanning")
+                        WatcherUtility.directory_rescanner(self=self)
+                    WatcherUtility.pending_files_adder(self=self, file_names=file_names)
+            finally:
+                event_reader.close()
+                self.logger.info("Watcher stopped")
+                WatcherUtility.close_logger(self=self)
+
+    def start(self):
+        """
+        Runs the watcher in a daemon thread of the calling process
+        """
+        self.thread = threading.Thread(
+            target=WatcherUtility.watcher,
+            kwargs={"self": self},
+            name="wx_data_watcher",
+            daemon=True,
+        )
+        self.thread.start()
+        return self.thread
+
+    def stop(self, timeout=None):
+        """
+        Stops the watcher after its current event read
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+
+
+def watcher_starter(app):
+    """
+    Starts the wx_data watcher of 'app' in a daemon thread when Config.WX_DATA_WATCHER_ENABLED is set
+    Micro-batches are ingested by the JobWorker threads of the serving process, evicting that
+    process's API response cache
+    Returns the WatcherUtility object or None
+    """
+    if not app.config["WX_DATA_WATCHER_ENABLED"]:
+        return None
+    if not os.path.isdir(app.config["WX_DATA_DIR"]):
+        os.makedirs(app.config["WX_DATA_DIR"])
+    watcher_object = WatcherUtility(app=app)
+    WatcherUtility.start(self=watcher_object)
+    return watcher_object
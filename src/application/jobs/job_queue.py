@@ -0,0 +1,560 @@
+"""
+This module contains the persistent background jobs queue stored in the 'jobs' table
+Ingestion, analytics and reference data jobs are enqueued by the routes, ingestion and the wx_data watcher and run
+by JobWorker threads, at most 'JOB_CONCURRENCY[job_type]' at a time across processes
+"""
+
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from application import db
+from application.data_model import Jobs
+
+JOB_STATES = ("pending", "running", "succeeded", "failed")
+# Enqueue attempts lost to concurrent enqueuers and claimers before giving up
+JOB_ENQUEUE_ATTEMPTS = 5
+
+
+def ingestion_job_handler(params, progress_reporter):
+    """
+    Runs an ingestion job
+    Params: params --> IngestionUtility keyword arguments (ingestion_files, ingestion_type,
+            bulk_load, rebuild_indexes)
+            progress_reporter --> callable receiving the job's progress dict
+    """
+    # ingestion_utility imports job_enqueuer from this module
+    from application.ingest.ingestion_utility import IngestionUtility
+
+    ingestion_object = IngestionUtility(**params)
+    progress = {"rows_inserted": 0}
+
+    def batch_progress_reporter(batch_progress):
+        progress.update(batch_progress)
+        progress_reporter(progress)
+
+    ingestion_object.progress_reporter = batch_progress_reporter
+    IngestionUtility.ingestor(self=ingestion_object)
+    IngestionUtility.close_logger(self=ingestion_object)
+    if ingestion_object.ingestion_error is not None:
+        raise ingestion_object.ingestion_error
+    files_total = len(set(ingestion_object.ingestion_files))
+    progress.update(
+        {
+            "files_total": files_total,
+            "files_done": len(ingestion_object.parsed_offsets),
+            # Unchanged since their last ingestion (see 'ingest_manifest')
+            "files_skipped": files_total - len(ingestion_object.file_offsets or {}),
+        }
+    )
+    progress_reporter(progress)
+
+
+def analytics_job_handler(params, progress_reporter):
+    """
+    Runs an analytics job
+    Params: params --> {"partitions": [[year, station], ...] or None for every partition,
+            "source": StatsUtilities source}
+            progress_reporter --> callable receiving the job's progress dict
+    """
+    from application.analytics.stats_utility import StatsUtilities
+
+    partitions = params["partitions"]
+    stats_object = StatsUtilities(
+        partitions=None
+        if partitions is None
+        else {(year, station) for year, station in partitions},
+        source=params["source"],
+    )
+    StatsUtilities.analytics_orchestrator(self=stats_object)
+    progress_reporter(
+        {
+            "results_written": len(stats_object.bulk_insert_list or []),
+            "metrics_written": stats_object.metrics_rows_written or 0,
+        }
+    )
+
+
+def upload_job_handler(params, progress_reporter):
+    """
+    Publishes staged uploads into WX_DATA_DIR and enqueues the ingestion of their station files
+    A failed publish discards the staged uploads, so it fails the job without retry
+    Params: params --> {"staged_files": [[staged path, file name], ...], "ingestion_type": endpoint}
+            progress_reporter --> callable receiving the job's progress dict
+    """
+    from application.ingest.upload_utility import staged_uploads_publisher
+
+    try:
+        ingestion_files = staged_uploads_publisher(staged_files=params["staged_files"])
+    except OSError as error:
+        # A retry would only find the discarded staged files missing
+        raise ValueError(f"Publishing staged uploads failed: {error}") from error
+    ingestion_job_id = job_enqueuer(
+        job_type="ingestion",
+        params={
+            "ingestion_files": ingestion_files,
+            "ingestion_type": params["ingestion_type"],
+        },
+    )
+    progress_reporter(
+        {"files_published": len(ingestion_files), "ingestion_job_id": ingestion_job_id}
+    )
+
+
+def reference_data_job_handler(params, progress_reporter):
+    """
+    Loads reference data files into the database
+    The files are not shipped with every checkout: a missing file is logged and reported as
+    skipped in the job's progress instead of failing the job
+    Params: params --> {"datasets": list of "yields" (Config.YLD_DATA_FILE) and/or "stations"
+            (Config.STATIONS_DATA_FILE)}
+            progress_reporter --> callable receiving the job's progress dict
+    """
+    from application.analytics.station_utility import stations_loader
+    from application.analytics.yield_utility import yields_loader
+
+    progress = {}
+    for dataset, file_setting, loader, progress_key in (
+        ("yields", "YLD_DATA_FILE", yields_loader, "years_loaded"),
+        ("stations", "STATIONS_DATA_FILE", stations_loader, "stations_loaded"),
+    ):
+        if dataset not in params["datasets"]:
+            continue
+        file_path = current_app.config[file_setting]
+        if not os.path.isfile(file_path):
+            current_app.logger.warning(
+                "Skipped loading %s: %s not found", dataset, file_path
+            )
+            progress[f"{dataset}_skipped"] = f"{file_path} not found"
+            continue
+        progress[progress_key] = loader()
+    progress_reporter(progress)
+
+
+def analytics_params_merger(pending_params, params):
+    """
+    Folds an analytics submission into the pending run of the same source: the union of their
+    partitions, or every partition when either covers all of them
+    """
+    if pending_params["partitions"] is None or params["partitions"] is None:
+        return {"partitions": None, "source": params["source"]}
+    partitions = {tuple(partition) for partition in pending_params["partitions"]}
+    partitions.update(tuple(partition) for partition in params["partitions"])
+    return {
+        "partitions": [list(partition) for partition in sorted(partitions)],
+        "source": params["source"],
+    }
+
+
+# job_type --> handler(params, progress_reporter) and optional merger(pending_params, params);
+# job types with a merger keep a single pending job that every submission is folded into
+JOB_TYPES = {
+    "ingestion": {"handler": ingestion_job_handler, "merger": None},
+    "upload": {"handler": upload_job_handler, "merger": None},
+    "analytics": {"handler": analytics_job_handler, "merger": analytics_params_merger},
+    "reference_data": {"handler": reference_data_job_handler, "merger": None},
+}
+
+
+def job_dedupe_key(job_type, params):
+    """
+    Returns the key identical pending jobs share
+    """
+    if JOB_TYPES[job_type]["merger"] is not None:
+        return f"{job_type}:{params['source']}"
+    params_hash = hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return f"{job_type}:{params_hash.hexdigest()}"
+
+
+def job_enqueuer(job_type, params):
+    """
+    Persists a pending job, or folds it into the identical pending job, and wakes this process's
+    JobWorker (started on first use when 'JOB_WORKER_ENABLED' is set)
+    Params: job_type --> key of JOB_TYPES
+            params --> JSON serializable handler params
+    Returns the job_id of the pending job
+    """
+    dedupe_key = job_dedupe_key(job_type=job_type, params=params)
+    merger = JOB_TYPES[job_type]["merger"]
+    jobs_table = Jobs.__table__
+    for attempt in range(JOB_ENQUEUE_ATTEMPTS):
+        try:
+            with db.engine.begin() as connection:
+                pending_job = connection.execute(
+                    select(jobs_table.c.job_id, jobs_table.c.params).where(
+                        jobs_table.c.dedupe_key == dedupe_key,
+                        jobs_table.c.state == "pending",
+                    )
+                ).first()
+                if pending_job is not None and merger is None:
+                    job_id = pending_job.job_id
+                elif pending_job is not None:
+                    merged_params = merger(json.loads(pending_job.params), params)
+                    merged_jobs = connection.execute(
+                        update(jobs_table)
+                        .where(
+                            jobs_table.c.job_id == pending_job.job_id,
+                            jobs_table.c.state == "pending",
+                        )
+                        .values(params=json.dumps(merged_params, sort_keys=True))
+                    ).rowcount
+                    if merged_jobs == 0:
+                        # Claimed by a worker in the meantime
+                        continue
+                    job_id = pending_job.job_id
+                else:
+                    now = datetime.now()
+                    job_id = connection.execute(
+                        insert(jobs_table)
+                        .values(
+                            job_type=job_type,
+                            state="pending",
+                            dedupe_key=dedupe_key,
+                            params=json.dumps(params, sort_keys=True),
+                            attempts=0,
+                            max_attempts=current_app.config["JOB_MAX_ATTEMPTS"],
+                            created_at=now,
+                            run_after=now,
+                        )
+                        .returning(jobs_table.c.job_id)
+                    ).scalar_one()
+            break
+        except (IntegrityError, OperationalError):
+            # Another process inserted the same pending job or held the write lock
+            if attempt == JOB_ENQUEUE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+    job_worker = job_worker_starter(app=current_app._get_current_object())
+    if job_worker is not None:
+        job_worker.wake_event.set()
+    return job_id
+
+
+def active_jobs_counter(job_type):
+    """
+    Returns the number of pending or running jobs of 'job_type'
+    """
+    jobs_table = Jobs.__table__
+    with db.engine.connect() as connection:
+        return connection.execute(
+            select(func.count()).where(
+                jobs_table.c.state.in_(("pending", "running")),
+                jobs_table.c.job_type == job_type,
+            )
+        ).scalar()
+
+
+def job_claimer(job_type, concurrency, worker_id):
+    """
+    Atomically moves the oldest due pending job of 'job_type' to running, unless 'concurrency'
+    jobs of that type are already running
+    Returns the claimed row (job_id, params, attempts) or None
+    """
+    jobs_table = Jobs.__table__
+    now = datetime.now()
+    running_jobs = (
+        select(func.count())
+        .where(jobs_table.c.state == "running", jobs_table.c.job_type == job_type)
+        .scalar_subquery()
+    )
+    next_job_id = (
+        select(jobs_table.c.job_id)
+        .where(
+            jobs_table.c.state == "pending",
+            jobs_table.c.job_type == job_type,
+            jobs_table.c.run_after <= now,
+        )
+        .order_by(jobs_table.c.job_id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    with db.engine.begin() as connection:
+        return connection.execute(
+            update(jobs_table)
+            .where(
+                jobs_table.c.job_id == next_job_id,
+                jobs_table.c.state == "pending",
+                running_jobs < concurrency,
+            )
+            .values(
+                state="running",
+                attempts=jobs_table.c.attempts + 1,
+                worker=worker_id,
+                started_at=now,
+                finished_at=None,
+            )
+            .returning(jobs_table.c.job_id, jobs_table.c.params, jobs_table.c.attempts)
+        ).first()
+
+
+def job_progress_writer(job_id, progress):
+    """
+    Stores the progress document of a running job
+    """
+    jobs_table = Jobs.__table__
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(jobs_table)
+            .where(jobs_table.c.job_id == job_id)
+            .values(progress=json.dumps(progress))
+        )
+
+
+def job_finisher(job_id, error=None, retry=True):
+    """
+    Marks a running job succeeded, or after an error either pending again (retried after
+    'JOB_RETRY_DELAY_SECONDS', doubled per attempt) or failed once 'max_attempts' ran out
+    A retry identical to an already pending job is left to that job
+    Params: retry --> False fails the job at once, for errors a new attempt cannot fix
+    """
+    jobs_table = Jobs.__table__
+    now = datetime.now()
+    with db.engine.begin() as connection:
+        if error is None:
+            connection.execute(
+                update(jobs_table)
+                .where(jobs_table.c.job_id == job_id)
+                .values(state="succeeded", error=None, finished_at=now)
+            )
+            return
+        job = connection.execute(
+            select(jobs_table.c.attempts, jobs_table.c.max_attempts).where(
+                jobs_table.c.job_id == job_id
+            )
+        ).first()
+        if not retry or job.attempts >= job.max_attempts:
+            connection.execute(
+                update(jobs_table)
+                .where(jobs_table.c.job_id == job_id)
+                .values(state="failed", error=error, finished_at=now)
+            )
+            return
+    retry_delay = current_app.config["JOB_RETRY_DELAY_SECONDS"] * 2 ** (
+        job.attempts - 1
+    )
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(jobs_table)
+                .where(jobs_table.c.job_id == job_id)
+                .values(
+                    state="pending",
+                    error=error,
+                    worker=None,
+                    run_after=now + timedelta(seconds=retry_delay),
+                )
+            )
+    except IntegrityError:
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(jobs_table)
+                .where(jobs_table.c.job_id == job_id)
+                .values(
+                    state="failed",
+                    error=f"{error} (retried by the identical pending job)",
+                    finished_at=now,
+                )
+            )
+
+
+def job_recoverer(host_name):
+    """
+    Hands running jobs of dead processes on this host back to job_finisher as interrupted
+    Returns the number of recovered jobs
+    """
+    jobs_table = Jobs.__table__
+    with db.engine.connect() as connection:
+        running_jobs = connection.execute(
+            select(jobs_table.c.job_id, jobs_table.c.worker).where(
+                jobs_table.c.state == "running"
+            )
+        ).all()
+    recovered_jobs = 0
+    for job_id, worker_id in running_jobs:
+        worker_host, _, worker_pid = (worker_id or "").rpartition(":")
+        if worker_host != host_name or not worker_pid.isdigit():
+            continue
+        # This process has not run any job yet, so a job holding its pid is a leftover
+        if int(worker_pid) != os.getpid():
+            try:
+                os.kill(int(worker_pid), 0)
+                continue
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                continue
+        job_finisher(job_id=job_id, error=f"Worker {worker_id} stopped while running")
+        recovered_jobs = recovered_jobs + 1
+    return recovered_jobs
+
+
+def job_serializer(job):
+    """
+    Converts a 'jobs' row into the /api/jobs response format, with rows/s for ingestion jobs
+    """
+    progress = json.loads(job.progress) if job.progress is not None else None
+    if progress is not None and "rows_inserted" in progress:
+        finished_at = job.finished_at or datetime.now()
+        elapsed_seconds = (finished_at - job.started_at).total_seconds()
+        progress["rows_per_second"] = round(
+            progress["rows_inserted"] / max(elapsed_seconds, 1e-6)
+        )
+    return {
+        "job_id": job.job_id,
+        "job_type": job.job_type,
+        "state": job.state,
+        "params": json.loads(job.params),
+        "progress": progress,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "created_at": f"{job.created_at}",
+        "started_at": None if job.started_at is None else f"{job.started_at}",
+        "finished_at": None if job.finished_at is None else f"{job.finished_at}",
+    }
+
+
+class JobWorker:
+    """
+    Threads of a process running claimed jobs, one per allowed concurrent job of every type
+    Idle threads poll the queue every 'JOB_POLL_SECONDS' or are woken by local enqueues
+    """
+
+    formatter = logging.Formatter("%(asctime)s: %(message)s")
+
+    def __init__(self, app):
+        self.app = app
+        self.concurrency = dict(app.config["JOB_CONCURRENCY"])
+        self.poll_seconds = app.config["JOB_POLL_SECONDS"]
+        self.host_name = socket.gethostname()
+        self.worker_id = f"{self.host_name}:{os.getpid()}"
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.threads = []
+
+        # Setup process logger
+        self.log_folder_path = f"{app.config['ROOT_DIR']}/logs"
+        if not os.path.exists(self.log_folder_path):
+            os.mkdir(self.log_folder_path)
+        self.setup_datetime_str = str(datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        self.log_file_path = (
+            f"{self.log_folder_path}/jobs_{self.setup_datetime_str}.log"
+        )
+        self.logger = logging.getLogger(f"jobs_{self.setup_datetime_str}_{id(self)}")
+        self.logger.setLevel(logging.INFO)
+        self.file_handler = logging.FileHandler(self.log_file_path, mode="a")
+        self.file_handler.setFormatter(self.formatter)
+        self.logger.addHandler(self.file_handler)
+        self.logger.info("=============== Logger setup complete ===============")
+        self.logger.info(
+            "Job worker %s, concurrency: %s", self.worker_id, f"{self.concurrency}"
+        )
+
+    def job_runner(self, job_type, job):
+        """
+        Runs a claimed job through its handler and records the outcome
+        """
+        job_id, params, attempts = job
+        self.logger.info(
+            "START: %s job %s (attempt %s)", job_type, f"{job_id}", f"{attempts}"
+        )
+        try:
+            JOB_TYPES[job_type]["handler"](
+                json.loads(params),
+                lambda progress: job_progress_writer(job_id=job_id, progress=progress),
+            )
+        except Exception as error:
+            db.session.rollback()
+            self.logger.info("FAILED: %s job %s: %s", job_type, f"{job_id}", f"{error}")
+            # Malformed input (ValueError) fails the same way on every attempt
+            job_finisher(
+                job_id=job_id,
+                error=f"{type(error).__name__}: {error}",
+                retry=not isinstance(error, ValueError),
+            )
+        else:
+            self.logger.info("END: %s job %s", job_type, f"{job_id}")
+            job_finisher(job_id=job_id)
+        finally:
+            db.session.remove()
+
+    def worker(self):
+        """
+        Claims and runs jobs until stop() is called
+        """
+        with self.app.app_context():
+            while not self.stop_event.is_set():
+                claimed_job = None
+                for job_type, concurrency in self.concurrency.items():
+                    try:
+                        claimed_job = job_claimer(
+                            job_type=job_type,
+                            concurrency=concurrency,
+                            worker_id=self.worker_id,
+                        )
+                    except OperationalError as error:
+                        # Database busy; retried on the next poll
+                        self.logger.info("Claim failed: %s", f"{error}")
+                    if claimed_job is not None:
+                        break
+                if claimed_job is None:
+                    self.wake_event.wait(timeout=self.poll_seconds)
+                    self.wake_event.clear()
+                    continue
+                JobWorker.job_runner(self=self, job_type=job_type, job=claimed_job)
+                # Let idle threads look for jobs freed by this one's concurrency slot
+                self.wake_event.set()
+
+    def start(self):
+        """
+        Requeues jobs interrupted by a previous process and starts the worker threads
+        """
+        with self.app.app_context():
+            recovered_jobs = job_recoverer(host_name=self.host_name)
+        if recovered_jobs > 0:
+            self.logger.info("Recovered interrupted jobs: %s", f"{recovered_jobs}")
+        for thread_number in range(sum(self.concurrency.values())):
+            thread = threading.Thread(
+                target=JobWorker.worker,
+                kwargs={"self": self},
+                name=f"job_worker_{thread_number}",
+                daemon=True,
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=None):
+        """
+        Stops the worker threads after their current jobs
+        """
+        self.stop_event.set()
+        self.wake_event.set()
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+
+
+# Serializes JobWorker creation within a process
+JOB_WORKER_LOCK = threading.Lock()
+
+
+def job_worker_starter(app):
+    """
+    Starts the JobWorker of 'app' in this process once, when Config.JOB_WORKER_ENABLED is set
+    Returns the JobWorker object or None
+    """
+    if not app.config["JOB_WORKER_ENABLED"]:
+        return None
+    with JOB_WORKER_LOCK:
+        job_worker = app.extensions.get("job_worker")
+        if job_worker is None:
+            job_worker = JobWorker(app=app)
+            app.extensions["job_worker"] = job_worker
+            JobWorker.start(self=job_worker)
+    return job_worker
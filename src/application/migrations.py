@@ -0,0 +1,113 @@
+"""
+This module contains idempotent schema migrations applied to existing database.db files by create_app()
+"""
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateTable
+from application import db
+from application.analytics.stats_utility import StatsUtilities
+from application.data_model import (
+    Aggregates,
+    MonthlyAggregates,
+    Readings,
+    READINGS_SCALING_FACTORS,
+)
+
+# Single-column 'readings' indexes replaced by the composite date indexes
+LEGACY_READINGS_INDEXES = [
+    "ix_readings_station_id",
+    "ix_readings_year",
+    "ix_readings_month",
+    "ix_readings_day",
+]
+
+
+def readings_date_migration(connection):
+    """
+    Adds the integer 'readings.date' (YYYYMMDD) column, fills it from year, month and day and
+    replaces the single-column indexes with the composite indexes declared on Readings
+    Returns True if the table was rewritten
+    """
+    readings_columns = {
+        column["name"] for column in inspect(connection).get_columns("readings")
+    }
+    if "date" not in readings_columns:
+        connection.exec_driver_sql(
+            "ALTER TABLE readings ADD COLUMN date INTEGER NOT NULL DEFAULT 0"
+        )
+        connection.exec_driver_sql(
+            "UPDATE readings SET date = year * 10000 + month * 100 + day"
+        )
+    for index_name in LEGACY_READINGS_INDEXES:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index_name}")
+    for index in Readings.__table__.indexes:
+        index.create(bind=connection, checkfirst=True)
+    return "date" not in readings_columns
+
+
+def readings_compact_migration(connection):
+    """
+    Rebuilds a 'readings' table keyed on the reading_id string with scaled REAL measurements into
+    the WITHOUT ROWID (station_id, date) layout of Readings with raw integer measurements
+    Returns True if the table was rewritten
+    """
+    readings_inspector = inspect(connection)
+    readings_columns = {
+        column["name"] for column in readings_inspector.get_columns("readings")
+    }
+    if "reading_id" not in readings_columns:
+        return False
+    # Index names are reused by the new table
+    for index in readings_inspector.get_indexes("readings"):
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index['name']}")
+    connection.exec_driver_sql("ALTER TABLE readings RENAME TO readings_legacy")
+    connection.execute(CreateTable(Readings.__table__))
+    raw_measurements = ", ".join(
+        f"CAST(round({column} * {factor}) AS INTEGER)"
+        for column, factor in READINGS_SCALING_FACTORS.items()
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO readings (station_id, date, {', '.join(READINGS_SCALING_FACTORS)}) "
+        f"SELECT station_id, date, {raw_measurements} FROM readings_legacy "
+        "ORDER BY station_id, date"
+    )
+    connection.exec_driver_sql("DROP TABLE readings_legacy")
+    for index in Readings.__table__.indexes:
+        index.create(bind=connection)
+    return True
+
+
+def aggregates_backfiller():
+    """
+    Builds 'aggregates' and 'monthly_aggregates' from 'readings' when records exist but the
+    running sums do not (databases created before those tables); the date and station filters
+    of /api/weather and the periods of record of /api/stations read them
+    Returns True if the tables were rebuilt
+    """
+    if db.session.query(Readings.station_id).first() is None or (
+        db.session.query(Aggregates.aggregate_id).first() is not None
+        and db.session.query(MonthlyAggregates.station_id).first() is not None
+    ):
+        return False
+    StatsUtilities.aggregates_rebuilder()
+    return True
+
+
+# Applied in order; every migration must be a no-op on an already migrated database
+MIGRATIONS = [readings_date_migration, readings_compact_migration]
+
+
+def migrations_runner():
+    """
+    Applies every migration to the database in a single transaction
+    The database file is vacuumed afterwards if a table was rewritten, returning freed pages,
+    and missing running sums are backfilled from 'readings'
+    """
+    with db.engine.begin() as connection:
+        tables_rewritten = [migration(connection) for migration in MIGRATIONS]
+    if any(tables_rewritten):
+        with db.engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            connection.exec_driver_sql("VACUUM")
+    aggregates_backfiller()
@@ -0,0 +1,98 @@
+"""
+Benchmarks rows per second of /api/weather/export against paging through /api/weather
+Usage (from 'src' directory): python3 -m benchmarks.export_benchmark --database /path/to/database.db
+"""
+
+import argparse
+import time
+from application import create_app
+from application.config import Config
+
+
+def paginated_timer(client, station, pages, cursor):
+    """
+    Times fetching up to 'pages' pages of /api/weather, by keyset cursor or by page number
+    Returns (seconds, rows)
+    """
+    query_string = {} if station is None else {"station": station}
+    if cursor:
+        query_string["cursor"] = ""
+    rows = 0
+    start_time = time.perf_counter()
+    for page in range(1, pages + 1):
+        if not cursor:
+            query_string["page"] = page
+        response = client.get("/api/weather", query_string=query_string).get_json()
+        if not response or not response.get("response"):
+            break
+        rows = rows + len(response["response"])
+        if cursor:
+            if response["next_cursor"] is None:
+                break
+            query_string["cursor"] = response["next_cursor"]
+        elif page >= response["total_pages"]:
+            break
+    return time.perf_counter() - start_time, rows
+
+
+def export_timer(client, station, export_format):
+    """
+    Times streaming /api/weather/export to completion
+    Returns (seconds, rows)
+    """
+    query_string = {"format": export_format}
+    if station is not None:
+        query_string["station"] = station
+    start_time = time.perf_counter()
+    response = client.get("/api/weather/export", query_string=query_string)
+    rows = sum(chunk.count(b"\n") for chunk in response.response)
+    response.close()
+    if export_format == "csv":
+        # CSV header row
+        rows = rows - 1
+    return time.perf_counter() - start_time, rows
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument(
+        "--database",
+        type=str,
+        default=f"{Config.ROOT_DIR}/application/database.db",
+        help="Populated SQLite database to read from",
+    )
+    argument_parser.add_argument(
+        "--station", type=str, default=None, help="Restrict both paths to a station"
+    )
+    argument_parser.add_argument(
+        "--pages",
+        type=int,
+        default=100,
+        help="Maximum pages fetched by the paginated path",
+    )
+    arguments = argument_parser.parse_args()
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{arguments.database}"
+        # Time the query and serialization paths rather than cached responses
+        API_CACHE_MAX_ENTRIES = 0
+
+    app = create_app(config_class=BenchmarkConfig)
+    client = app.test_client()
+    timings = {
+        "paginated (page)": paginated_timer(
+            client, arguments.station, arguments.pages, cursor=False
+        ),
+        "paginated (cursor)": paginated_timer(
+            client, arguments.station, arguments.pages, cursor=True
+        ),
+        "export ndjson": export_timer(client, arguments.station, "ndjson"),
+        "export csv": export_timer(client, arguments.station, "csv"),
+    }
+    print(f"{'path':>20} {'seconds':>9} {'rows':>10} {'rows/s':>10}")
+    for path, (seconds, rows) in timings.items():
+        print(f"{path:>20} {seconds:>9.2f} {rows:>10} {rows / seconds:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
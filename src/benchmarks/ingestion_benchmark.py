@@ -0,0 +1,119 @@
+"""
+Benchmarks single wx_data file ingestion latency against 'readings' tables of increasing size
+Usage (from 'src' directory): python3 -m benchmarks.ingestion_benchmark --rows 1000000 10000000
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from application import create_app, db
+from application.config import Config
+from application.data_model import Readings
+from application.ingest.parser_utility import readings_batcher
+
+
+SYNTHETIC_READINGS_SQL = """
+    INSERT INTO readings (station_id, date,
+                          max_temperature, min_temperature, precipitation)
+    WITH RECURSIVE sequence(n) AS (
+        SELECT ? UNION ALL SELECT n + 1 FROM sequence WHERE n + 1 < ?
+    )
+    SELECT printf('BEN%08d', n / 20000), 19000101 + n % 20000, 10, 0, 0
+    FROM sequence
+"""
+
+
+def readings_table_filler(database_path, current_rows, target_rows):
+    """
+    Grows 'readings' to 'target_rows' synthetic records for stations not present in wx_data
+    """
+    connection = sqlite3.connect(database_path)
+    connection.execute(SYNTHETIC_READINGS_SQL, (current_rows, target_rows))
+    connection.commit()
+    connection.close()
+
+
+def single_file_ingestion_timer(ingestion_utility_class, file_name):
+    """
+    Times the parse + write path of IngestionUtility for a single file
+    Returns (seconds, records inserted)
+    """
+    ingestion_object = ingestion_utility_class(
+        ingestion_files=[file_name], ingestion_type="ingestion_benchmark.py"
+    )
+    start_time = time.perf_counter()
+    inserted_records = ingestion_utility_class.batch_writer(
+        self=ingestion_object,
+        readings_batches=readings_batcher(
+            readings_dfs=ingestion_utility_class.file_parser(self=ingestion_object),
+            batch_size=ingestion_object.ingestion_batch_size,
+        ),
+    )
+    seconds = time.perf_counter() - start_time
+    ingestion_utility_class.close_logger(self=ingestion_object)
+    return seconds, inserted_records
+
+
+def legacy_preload_timer():
+    """
+    Times the full 'reading_id' preload previously done before every ingestion run
+    """
+    start_time = time.perf_counter()
+    reading_id_list = db.session.query(Readings.reading_id).all()
+    distinct_reading_id_dict = dict.fromkeys(item[0] for item in reading_id_list)
+    seconds = time.perf_counter() - start_time
+    del distinct_reading_id_dict
+    return seconds
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument(
+        "--rows", type=int, nargs="+", default=[1000000, 10000000, 50000000]
+    )
+    argument_parser.add_argument("--file", default="USC00110072.txt")
+    arguments = argument_parser.parse_args()
+
+    benchmark_directory = tempfile.mkdtemp(prefix="ingestion_benchmark_")
+    database_path = f"{benchmark_directory}/database.db"
+    shutil.copy(f"{Config.ROOT_DIR}/application/database.db", database_path)
+
+    class BenchmarkConfig(Config):
+        ROOT_DIR = benchmark_directory
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{database_path}"
+        INGESTION_WORKERS = 1
+
+    app = create_app(config_class=BenchmarkConfig)
+    print(
+        f"{'table rows':>12} {'new file (s)':>14} {'re-ingest (s)':>14} {'legacy preload (s)':>19}"
+    )
+    with app.app_context():
+        from application.ingest.ingestion_utility import IngestionUtility
+
+        current_rows = 0
+        for target_rows in sorted(arguments.rows):
+            readings_table_filler(database_path, current_rows, target_rows)
+            current_rows = target_rows
+            # Remove the benchmark file so the first run inserts all of its records
+            db.session.query(Readings).filter(
+                Readings.station_id == arguments.file.split(".txt")[0]
+            ).delete()
+            db.session.commit()
+            new_file_seconds, _ = single_file_ingestion_timer(
+                IngestionUtility, arguments.file
+            )
+            reingest_seconds, _ = single_file_ingestion_timer(
+                IngestionUtility, arguments.file
+            )
+            preload_seconds = legacy_preload_timer()
+            print(
+                f"{target_rows:>12} {new_file_seconds:>14.3f} {reingest_seconds:>14.3f} {preload_seconds:>19.3f}"
+            )
+    shutil.rmtree(benchmark_directory)
+
+
+if __name__ == "__main__":
+    main()
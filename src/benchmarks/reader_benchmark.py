@@ -0,0 +1,111 @@
+"""
+Benchmarks wx_data file parsing: the original pd.read_csv + iloc loop, the pandas C reader and the
+memory-mapped fixed-width reader, plus re-reading an appended tail
+Usage (from 'src' directory): python3 -m benchmarks.reader_benchmark --files 20
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import pandas as pd
+from application.config import Config
+from application.ingest.parser_utility import (
+    WX_DATA_LINE_LENGTH,
+    wx_data_csv_reader,
+    wx_data_mmap_reader,
+)
+
+
+def iloc_loop_reader(file_path, start_offset=0):
+    """
+    Original parsing loop: pd.read_csv, then one iloc row at a time into Python values
+    Returns (records, end_offset)
+    """
+    file_df = pd.read_csv(filepath_or_buffer=file_path, sep="\t", header=None)
+    records = []
+    row_counter = 0
+    while row_counter < len(file_df):
+        row_data = file_df.iloc[row_counter].to_list()
+        records.append(tuple(int(str(value)) for value in row_data))
+        row_counter = row_counter + 1
+    return records, os.path.getsize(file_path)
+
+
+def reader_timer(reader, file_paths, start_offsets=None, repeats=1):
+    """
+    Times parsing every file of 'file_paths' with 'reader', keeping the best of 'repeats' runs
+    Returns (seconds, lines)
+    """
+    start_offsets = start_offsets or [0] * len(file_paths)
+    best_seconds = None
+    for _ in range(repeats):
+        lines = 0
+        start_time = time.perf_counter()
+        for file_path, start_offset in zip(file_paths, start_offsets):
+            parsed_lines, _ = reader(file_path, start_offset)
+            lines = lines + len(parsed_lines)
+        seconds = time.perf_counter() - start_time
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    return best_seconds, lines
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument(
+        "--files", type=int, default=20, help="Number of wx_data files parsed"
+    )
+    argument_parser.add_argument(
+        "--repeats", type=int, default=5, help="Runs per reader; the best is kept"
+    )
+    argument_parser.add_argument(
+        "--tail-lines",
+        type=int,
+        default=365,
+        help="Lines appended to every file before timing tail parsing",
+    )
+    arguments = argument_parser.parse_args()
+
+    file_names = sorted(os.listdir(Config.WX_DATA_DIR))[: arguments.files]
+    file_paths = [f"{Config.WX_DATA_DIR}/{file_name}" for file_name in file_names]
+    megabytes = sum(os.path.getsize(file_path) for file_path in file_paths) / 1e6
+    timings = {
+        "read_csv + iloc loop": reader_timer(iloc_loop_reader, file_paths),
+        "pandas C reader": reader_timer(
+            wx_data_csv_reader, file_paths, repeats=arguments.repeats
+        ),
+        "mmap fixed-width": reader_timer(
+            wx_data_mmap_reader, file_paths, repeats=arguments.repeats
+        ),
+    }
+
+    # Append a copy of each file's last lines and parse only the new tail
+    with tempfile.TemporaryDirectory() as temp_directory:
+        tail_paths = []
+        tail_offsets = []
+        for file_name, file_path in zip(file_names, file_paths):
+            tail_path = f"{temp_directory}/{file_name}"
+            shutil.copy(file_path, tail_path)
+            tail_offsets.append(os.path.getsize(tail_path))
+            with open(file_path, mode="rb") as infile:
+                infile.seek(-arguments.tail_lines * WX_DATA_LINE_LENGTH, os.SEEK_END)
+                appended_lines = infile.read()
+            with open(tail_path, mode="ab") as outfile:
+                outfile.write(appended_lines)
+            tail_paths.append(tail_path)
+        timings["mmap fixed-width tail"] = reader_timer(
+            wx_data_mmap_reader, tail_paths, tail_offsets, repeats=arguments.repeats
+        )
+
+    print(f"{len(file_paths)} files, {megabytes:.1f} MB")
+    print(f"{'reader':>22} {'seconds':>9} {'lines':>9} {'lines/s':>11} {'speedup':>8}")
+    baseline_seconds = timings["read_csv + iloc loop"][0]
+    for reader, (seconds, lines) in timings.items():
+        print(
+            f"{reader:>22} {seconds:>9.3f} {lines:>9} {lines / seconds:>11.0f} {baseline_seconds / seconds:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
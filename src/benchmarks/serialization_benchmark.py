@@ -0,0 +1,74 @@
+"""
+Benchmarks p50/p99 latency of /api/weather and /api/weather/stats with the fast row tuple
+serialization path against the ORM + marshmallow path (Config.API_FAST_SERIALIZATION)
+Usage (from 'src' directory): python3 -m benchmarks.serialization_benchmark --database /path/to/database.db
+"""
+
+import argparse
+import statistics
+import time
+from application import create_app
+from application.config import Config
+
+
+BENCHMARK_REQUESTS = {
+    "/api/weather": "/api/weather?page=2",
+    "/api/weather (station)": "/api/weather?station=USC00110072&page=3",
+    "/api/weather (cursor)": "/api/weather?cursor=",
+    "/api/weather/stats": "/api/weather/stats?page=2",
+    "/api/weather/stats (year)": "/api/weather/stats?year=2012",
+}
+
+
+def latency_timer(client, url, requests):
+    """
+    Times 'requests' sequential GET requests of 'url'
+    Returns (p50, p99) in milliseconds
+    """
+    # Warm up the connection pool and SQLite page cache
+    client.get(url)
+    latencies = []
+    for _ in range(requests):
+        start_time = time.perf_counter()
+        response = client.get(url)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        assert response.status_code == 200, f"{url} returned {response.status_code}"
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return percentiles[49], percentiles[98]
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument(
+        "--database",
+        type=str,
+        default=f"{Config.ROOT_DIR}/application/database.db",
+        help="Populated SQLite database to read from",
+    )
+    argument_parser.add_argument(
+        "--requests", type=int, default=200, help="Requests timed per endpoint and path"
+    )
+    arguments = argument_parser.parse_args()
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{arguments.database}"
+        # Time the query and serialization paths rather than cached responses
+        API_CACHE_MAX_ENTRIES = 0
+
+    app = create_app(config_class=BenchmarkConfig)
+    client = app.test_client()
+    print(
+        f"{'endpoint':>26} {'orm p50':>9} {'orm p99':>9} {'fast p50':>9} {'fast p99':>9} {'speedup':>8}"
+    )
+    for endpoint, url in BENCHMARK_REQUESTS.items():
+        app.config["API_FAST_SERIALIZATION"] = False
+        orm_p50, orm_p99 = latency_timer(client, url, arguments.requests)
+        app.config["API_FAST_SERIALIZATION"] = True
+        fast_p50, fast_p99 = latency_timer(client, url, arguments.requests)
+        print(
+            f"{endpoint:>26} {orm_p50:>9.2f} {orm_p99:>9.2f} {fast_p50:>9.2f} {fast_p99:>9.2f} {orm_p50 / fast_p50:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
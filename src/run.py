@@ -1,5 +1,13 @@
+import os
 from application import create_app
+from application.ingest.watcher_utility import watcher_starter
+from application.jobs.job_queue import job_worker_starter
 
 if __name__ == "__main__":
     app = create_app()
+    # The debug reloader runs this script twice; only its serving child watches WX_DATA_DIR
+    # and resumes jobs queued before a restart
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        job_worker_starter(app=app)
+        watcher_starter(app=app)
     app.run(host="localhost", port=5000, debug=True)
@@ -0,0 +1,70 @@
+"""
+Base TestCase of the tests running against an app with its own database and directories
+"""
+
+import os
+import tempfile
+import unittest
+from application import create_app, db
+from application.analytics.rollup_utility import MONTHLY_CUBE
+from application.analytics.station_utility import STATION_INDEX
+from application.apis.response_cache import READINGS_COUNT_CACHE, RESPONSE_CACHE
+from application.config import Config
+
+
+class AppTestCase(unittest.TestCase):
+    """
+    Runs every test in the context of an app whose ROOT_DIR (logs and results), WX_DATA_DIR,
+    COLUMNAR_STORE_DIR and database.db live in a temporary directory
+    The job worker is disabled, so enqueued jobs stay pending unless a test runs them
+    Subclasses add settings in config_overrides() and create files the app must find at startup
+    in database_preparer()
+    """
+
+    def setUp(self):
+        self.temp_directory = tempfile.TemporaryDirectory()
+        self.root_directory = self.temp_directory.name
+        self.database_path = os.path.join(self.root_directory, "database.db")
+        self.wx_data_directory = os.path.join(self.root_directory, "wx_data")
+        os.mkdir(self.wx_data_directory)
+        self.database_preparer()
+        config = {
+            "ROOT_DIR": self.root_directory,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{self.database_path}",
+            "WX_DATA_DIR": self.wx_data_directory,
+            "COLUMNAR_STORE_DIR": os.path.join(self.root_directory, "columnar"),
+            "JOB_WORKER_ENABLED": False,
+            **self.config_overrides(),
+        }
+        # In-process caches outlive the apps of previous tests
+        AppTestCase.caches_clearer(self=self)
+        self.app = create_app(config_class=type("TestConfig", (Config,), config))
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        AppTestCase.caches_clearer(self=self)
+        db.session.remove()
+        db.engine.dispose()
+        self.app_context.pop()
+        self.temp_directory.cleanup()
+
+    def config_overrides(self):
+        """
+        Returns Config attributes of the test app set on top of the temporary directories
+        """
+        return {}
+
+    def database_preparer(self):
+        """
+        Called before the app is created, e.g. to write a database.db of an earlier layout
+        """
+
+    def caches_clearer(self):
+        """
+        Drops the API response and readings count caches, the monthly cube and the station index
+        """
+        RESPONSE_CACHE.clear()
+        READINGS_COUNT_CACHE.clear()
+        MONTHLY_CUBE.invalidate()
+        STATION_INDEX.invalidate()
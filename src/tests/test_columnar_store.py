@@ -0,0 +1,125 @@
+import unittest
+from sqlalchemy import insert
+from application import db
+from application.data_model import Readings
+from tests.app_test_case import AppTestCase
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestColumnarStore(AppTestCase):
+    readings_records = [
+        {
+            "station_id": "USC00110072",
+            "date": 20111231,
+            "max_temperature": -22,
+            "min_temperature": -128,
+            "precipitation": 94,
+        },
+        {
+            "station_id": "USC00110072",
+            "date": 20120101,
+            "max_temperature": 11,
+            "min_temperature": None,
+            "precipitation": None,
+        },
+        {
+            "station_id": "USC00110072",
+            "date": 20120102,
+            "max_temperature": 27,
+            "min_temperature": -33,
+            "precipitation": 0,
+        },
+        {
+            "station_id": "USC00110187",
+            "date": 20120101,
+            "max_temperature": None,
+            "min_temperature": None,
+            "precipitation": None,
+        },
+    ]
+
+    def config_overrides(self):
+        return {"COLUMNAR_STORE_ENABLED": True}
+
+    def setUp(self):
+        super().setUp()
+        db.session.execute(insert(Readings.__table__), self.readings_records)
+        db.session.commit()
+
+    def test_rebuild_matches_readings_statistics(self):
+        from application.analytics.columnar_store import (
+            columnar_partition_keys,
+            columnar_partitions_writer,
+        )
+        from application.analytics.stats_utility import StatsUtilities
+
+        self.assertEqual(columnar_partitions_writer(), len(self.readings_records))
+        self.assertEqual(
+            columnar_partition_keys(),
+            {(2011, "USC00110072"), (2012, "USC00110072"), (2012, "USC00110187")},
+        )
+        readings_stats = StatsUtilities(source="readings")
+        columnar_stats = StatsUtilities(source="columnar")
+        for stats_object in (readings_stats, columnar_stats):
+            StatsUtilities.data_extractor(self=stats_object)
+            StatsUtilities.statistics_calculator(self=stats_object)
+            StatsUtilities.close_logger(self=stats_object)
+        self.assertEqual(columnar_stats.stats_dict, readings_stats.stats_dict)
+
+    def test_partitions_writer_and_filters(self):
+        from application.analytics.columnar_store import (
+            columnar_aggregates,
+            columnar_partitions_writer,
+        )
+
+        columnar_partitions_writer()
+        db.session.execute(
+            insert(Readings.__table__),
+            [
+                {
+                    "station_id": "USC00110072",
+                    "date": 20120103,
+                    "max_temperature": 5,
+                    "min_temperature": -5,
+                    "precipitation": 25,
+                }
+            ],
+        )
+        db.session.commit()
+        # Only the changed station file is rewritten
+        self.assertEqual(
+            columnar_partitions_writer(partitions={(2012, "USC00110072")}), 4
+        )
+        self.assertEqual(
+            columnar_aggregates(
+                group_by="station", stations=["USC00110072"], years=(2012, 2012)
+            ),
+            [
+                {
+                    "date_count": 3,
+                    "max_temperature_count": 3,
+                    "max_temperature_sum": 1.1 + 2.7 + 0.5,
+                    "min_temperature_count": 2,
+                    "min_temperature_sum": -3.3 + -0.5,
+                    "precipitation_count": 2,
+                    "precipitation_sum": 0.0 + 0.25,
+                    "station_id": "USC00110072",
+                }
+            ],
+        )
+        self.assertEqual(
+            [
+                row["year"]
+                for row in columnar_aggregates(group_by="year", years=(2012, 2020))
+            ],
+            [2012],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from sqlalchemy import inspect, text
+from application import db
+from application.data_model import IngestManifest, Readings
+from tests.app_test_case import AppTestCase
+
+
+class TestIngestManifest(AppTestCase):
+    wx_data_lines = [
+        "19850101\t  -22\t -128\t   94\n",
+        "19850102\t -122\t -217\t    0\n",
+        "19850103\t -106\t -244\t    0\n",
+    ]
+    appended_lines = [
+        "19850104\t  -56\t -189\t    0\n",
+        "19850105\t   11\t  -78\t   51\n",
+    ]
+
+    def config_overrides(self):
+        return {"INGESTION_WORKERS": 1}
+
+    def setUp(self):
+        super().setUp()
+        for station_id in ("USC00110072", "USC00110187"):
+            with open(f"{self.wx_data_directory}/{station_id}.txt", "w") as outfile:
+                outfile.writelines(self.wx_data_lines)
+
+    def ingestion_runner(self, **ingestion_params):
+        """
+        Runs a batch ingestion of the temporary wx_data directory
+        Params: ingestion_params --> keyword arguments of IngestionUtility
+        Returns the IngestionUtility object
+        """
+        from application.ingest.ingestion_utility import IngestionUtility
+
+        ingestion_object = IngestionUtility(**ingestion_params)
+        IngestionUtility.ingestor(self=ingestion_object)
+        return ingestion_object
+
+    def test_unchanged_and_appended_files(self):
+        first_run = self.ingestion_runner()
+        self.assertEqual(
+            first_run.file_offsets, {"USC00110072.txt": 0, "USC00110187.txt": 0}
+        )
+        self.assertEqual(db.session.query(Readings).count(), 6)
+        manifest_row = db.session.get(IngestManifest, "USC00110072.txt")
+        self.assertEqual(manifest_row.ingested_offset, 3 * 27)
+        self.assertEqual(manifest_row.file_size, 3 * 27)
+
+        # Nothing changed: no file is parsed
+        self.assertEqual(self.ingestion_runner().file_offsets, {})
+
+        with open(f"{self.wx_data_directory}/USC00110072.txt", "a") as outfile:
+            outfile.writelines(self.appended_lines)
+        appended_run = self.ingestion_runner()
+        self.assertEqual(appended_run.file_offsets, {"USC00110072.txt": 3 * 27})
+        self.assertEqual(appended_run.parsed_offsets, {"USC00110072.txt": 5 * 27})
+        self.assertEqual(db.session.query(Readings).count(), 8)
+
+        # Rewritten bytes before the ingested offset: the file is parsed whole
+        with open(f"{self.wx_data_directory}/USC00110187.txt", "w") as outfile:
+            outfile.writelines(self.wx_data_lines[1:] + self.appended_lines)
+        rewritten_run = self.ingestion_runner()
+        self.assertEqual(rewritten_run.file_offsets, {"USC00110187.txt": 0})
+        self.assertEqual(db.session.query(Readings).count(), 10)
+
+    def test_bulk_load_index_rebuild(self):
+        self.assertEqual(
+            db.session.execute(text("PRAGMA journal_mode")).scalar(), "wal"
+        )
+        bulk_load_params = {"bulk_load": True, "rebuild_indexes": True}
+        # Empty 'readings': the indexes are dropped and rebuilt
+        self.assertTrue(self.ingestion_runner(**bulk_load_params).rebuild_indexes)
+        # Two appended records against six stored: the indexes stay in place
+        with open(f"{self.wx_data_directory}/USC00110072.txt", "a") as outfile:
+            outfile.writelines(self.appended_lines)
+        appended_run = self.ingestion_runner(**bulk_load_params)
+        self.assertIsNone(appended_run.ingestion_error)
+        self.assertFalse(appended_run.rebuild_indexes)
+        self.assertEqual(db.session.query(Readings).count(), 8)
+        self.assertIn(
+            "ix_readings_date_station_id",
+            [index["name"] for index in inspect(db.engine).get_indexes("readings")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+import json
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from application import db
+from application.data_model import Jobs, Stations, Yields
+from application.ingest.upload_utility import (
+    WxDataUploadStream,
+    upload_staging_directory,
+)
+from application.jobs.job_queue import (
+    JobWorker,
+    job_claimer,
+    job_enqueuer,
+    job_finisher,
+    job_recoverer,
+)
+from tests.app_test_case import AppTestCase
+
+
+class TestJobQueue(AppTestCase):
+    ingestion_params = {
+        "ingestion_files": ["USC00110072.txt"],
+        "ingestion_type": "ingest.data_loader_batch",
+    }
+
+    def config_overrides(self):
+        return {
+            "JOB_MAX_ATTEMPTS": 2,
+            "YLD_DATA_FILE": f"{self.root_directory}/US_corn_grain_yield.txt",
+            "STATIONS_DATA_FILE": f"{self.root_directory}/ghcnd-stations.txt",
+        }
+
+    def test_deduplication_and_coalescing(self):
+        job_id = job_enqueuer(job_type="ingestion", params=self.ingestion_params)
+        self.assertEqual(
+            job_enqueuer(job_type="ingestion", params=self.ingestion_params), job_id
+        )
+        analytics_job_id = job_enqueuer(
+            job_type="analytics",
+            params={"partitions": [[2012, "USC00110072"]], "source": "aggregates"},
+        )
+        self.assertEqual(
+            job_enqueuer(
+                job_type="analytics",
+                params={
+                    "partitions": [[2011, "USC00110072"], [2012, "USC00110072"]],
+                    "source": "aggregates",
+                },
+            ),
+            analytics_job_id,
+        )
+        self.assertEqual(
+            json.loads(db.session.get(Jobs, analytics_job_id).params),
+            {
+                "partitions": [[2011, "USC00110072"], [2012, "USC00110072"]],
+                "source": "aggregates",
+            },
+        )
+
+        # A running job no longer absorbs new submissions
+        claimed_job = job_claimer(
+            job_type="ingestion", concurrency=1, worker_id="host:1"
+        )
+        self.assertEqual(claimed_job.job_id, job_id)
+        self.assertNotEqual(
+            job_enqueuer(job_type="ingestion", params=self.ingestion_params), job_id
+        )
+        # Concurrency limit of running ingestion jobs
+        self.assertIsNone(
+            job_claimer(job_type="ingestion", concurrency=1, worker_id="host:1")
+        )
+        self.assertIsNotNone(
+            job_claimer(job_type="ingestion", concurrency=2, worker_id="host:1")
+        )
+
+    def test_retries_and_recovery(self):
+        job_id = job_enqueuer(job_type="ingestion", params=self.ingestion_params)
+        job_claimer(job_type="ingestion", concurrency=1, worker_id="host:1")
+        job_finisher(job_id=job_id, error="OperationalError: database is locked")
+        job = db.session.get(Jobs, job_id)
+        self.assertEqual((job.state, job.attempts), ("pending", 1))
+        # Not due before its retry delay
+        self.assertGreater(job.run_after, datetime.now())
+        self.assertIsNone(
+            job_claimer(job_type="ingestion", concurrency=1, worker_id="host:1")
+        )
+
+        db.session.query(Jobs).update(
+            {"run_after": datetime.now() - timedelta(seconds=1)}
+        )
+        db.session.commit()
+        # Claimed by this process before it restarted
+        job_claimer(
+            job_type="ingestion", concurrency=1, worker_id=f"host:{os.getpid()}"
+        )
+        self.assertEqual(job_recoverer(host_name="other-host"), 0)
+        self.assertEqual(job_recoverer(host_name="host"), 1)
+        db.session.expire_all()
+        job = db.session.get(Jobs, job_id)
+        self.assertEqual((job.state, job.attempts), ("failed", 2))
+        self.assertIn("stopped while running", job.error)
+
+    def test_reference_data_job(self):
+        job_worker = JobWorker(app=self.app)
+        with open(self.app.config["STATIONS_DATA_FILE"], "w") as outfile:
+            outfile.write("USC00110072  41.7500  -87.9000  210.0 IL ARGONNE NATL LAB\n")
+        for yld_data, state in (
+            ("1985\t-\n", "failed"),
+            ("1985\t225447\n", "succeeded"),
+        ):
+            with open(self.app.config["YLD_DATA_FILE"], "w") as outfile:
+                outfile.write(yld_data)
+            job_id = job_enqueuer(
+                job_type="reference_data", params={"datasets": ["yields", "stations"]}
+            )
+            JobWorker.job_runner(
+                self=job_worker,
+                job_type="reference_data",
+                job=job_claimer(
+                    job_type="reference_data", concurrency=1, worker_id="host:1"
+                ),
+            )
+            job = db.session.get(Jobs, job_id)
+            # A malformed file is not retried
+            self.assertEqual((job.state, job.attempts), (state, 1))
+        self.assertEqual(
+            json.loads(job.progress), {"years_loaded": 1, "stations_loaded": 1}
+        )
+        self.assertEqual(db.session.get(Yields, 1985).corn_grain_yield, 225447)
+        self.assertEqual(db.session.get(Stations, "USC00110072").state, "IL")
+
+    def test_missing_reference_data_file(self):
+        job_worker = JobWorker(app=self.app)
+        job_id = job_enqueuer(
+            job_type="reference_data", params={"datasets": ["stations"]}
+        )
+        JobWorker.job_runner(
+            self=job_worker,
+            job_type="reference_data",
+            job=job_claimer(
+                job_type="reference_data", concurrency=1, worker_id="host:1"
+            ),
+        )
+        job = db.session.get(Jobs, job_id)
+        # Skipped, neither failed nor retried
+        self.assertEqual((job.state, job.attempts), ("succeeded", 1))
+        self.assertEqual(
+            json.loads(job.progress),
+            {"stations_skipped": f"{self.app.config['STATIONS_DATA_FILE']} not found"},
+        )
+        cli_result = self.app.test_cli_runner().invoke(
+            args=["analytics", "load-stations"]
+        )
+        self.assertEqual(cli_result.exit_code, 0)
+        self.assertIn("Skipped loading stations", cli_result.output)
+        cli_result = self.app.test_cli_runner().invoke(
+            args=["analytics", "load-stations", f"{self.root_directory}/missing.txt"]
+        )
+        self.assertEqual(cli_result.exit_code, 1)
+
+    def test_failed_upload_publish(self):
+        job_worker = JobWorker(app=self.app)
+        staging_directory = upload_staging_directory()
+        upload_stream = WxDataUploadStream(
+            staging_directory=staging_directory, file_name="USC00110072.txt"
+        )
+        upload_stream.write(b"19850101\t  -22\t -128\t   94\n")
+        WxDataUploadStream.finish(self=upload_stream)
+        job_id = job_enqueuer(
+            job_type="upload",
+            params={
+                "staged_files": [[upload_stream.staged_path, "USC00110072.txt"]],
+                "ingestion_type": "ingest.data_loader_single",
+            },
+        )
+        with mock.patch(
+            "application.ingest.upload_utility.os.replace",
+            side_effect=OSError(28, "No space left on device"),
+        ):
+            JobWorker.job_runner(
+                self=job_worker,
+                job_type="upload",
+                job=job_claimer(job_type="upload", concurrency=1, worker_id="host:1"),
+            )
+        job = db.session.get(Jobs, job_id)
+        # The staged upload is discarded, so the job is not retried
+        self.assertEqual((job.state, job.attempts), ("failed", 1))
+        self.assertIn("No space left on device", job.error)
+        self.assertEqual(os.listdir(staging_directory), [])
+        self.assertEqual(db.session.query(Jobs).count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
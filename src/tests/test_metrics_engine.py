@@ -0,0 +1,96 @@
+import unittest
+import numpy as np
+from application.analytics.metrics_engine import (
+    METRICS_REGISTRY,
+    StationSeries,
+    station_metrics_calculator,
+)
+
+
+class TestMetricsEngine(unittest.TestCase):
+    def station_series_builder(self):
+        """
+        Builds a StationSeries of 1985-12-28 to 1986-01-06 (10 days) with missing values
+        """
+        dates = np.array(
+            [19851228, 19851229, 19851230, 19851231]
+            + [19860101 + day for day in range(6)]
+        )
+        max_temperature = np.array(
+            [12.0, 25.0, np.nan, 35.0, 5.0, 8.0, 11.0, 14.0, 20.0, 31.0]
+        )
+        min_temperature = np.array(
+            [-2.0, 8.0, 15.0, 20.0, -5.0, -1.0, 0.0, 2.0, np.nan, 12.0]
+        )
+        # Centimeters; 'precipitation' >= 0.1 is a wet day
+        precipitation = np.array([0.0, 0.0, 0.5, 0.0, 0.0, 0.05, np.nan, 0.0, 1.2, 0.3])
+        return StationSeries(
+            dates=dates,
+            max_temperature=max_temperature,
+            min_temperature=min_temperature,
+            precipitation=precipitation,
+        )
+
+    def test_registered_metrics(self):
+        series = self.station_series_builder()
+        self.assertEqual(series.years.tolist(), [1985, 1986])
+        metrics_values = station_metrics_calculator(series=series)
+        self.assertEqual(set(metrics_values), set(METRICS_REGISTRY))
+        expected_values = {
+            # 1985: 1 + 7.5 + 15; days missing a temperature are skipped
+            "growing_degree_days": [23.5, 13.5],
+            "frost_days": [1, 2],
+            "highest_max_temperature": [35.0, 31.0],
+            "lowest_min_temperature": [-2.0, -5.0],
+            "wet_days": [1, 2],
+            # The missing 1986-01-03 precipitation ends the first 1986 run
+            "longest_dry_spell": [2, 2],
+            "wet_day_precipitation_p50": [0.5, 0.75],
+        }
+        for metric_name, values in expected_values.items():
+            np.testing.assert_allclose(
+                metrics_values[metric_name], values, err_msg=metric_name
+            )
+
+    def test_segment_percentile_and_runs(self):
+        random_generator = np.random.default_rng(seed=0)
+        dates = np.concatenate(
+            [year * 10000 + 101 + np.arange(200) for year in (2000, 2001, 2002)]
+        )
+        values = random_generator.normal(size=len(dates))
+        values[random_generator.random(len(dates)) < 0.2] = np.nan
+        # A year without any known value
+        values[400:] = np.nan
+        series = StationSeries(
+            dates=dates,
+            max_temperature=values,
+            min_temperature=values,
+            precipitation=values,
+        )
+        for percentile in (0, 37, 90, 100):
+            percentile_values = series.segment_percentile(
+                values=values, percentile=percentile
+            )
+            np.testing.assert_allclose(
+                percentile_values[:2],
+                [
+                    np.nanpercentile(values[start : start + 200], percentile)
+                    for start in (0, 200)
+                ],
+            )
+            self.assertTrue(np.isnan(percentile_values[2]))
+
+        mask = values > 0
+        longest_runs = []
+        for start in (0, 200, 400):
+            run_length = 0
+            longest_run = 0
+            for matches in mask[start : start + 200]:
+                run_length = run_length + 1 if matches else 0
+                longest_run = max(longest_run, run_length)
+            longest_runs.append(longest_run)
+        self.assertEqual(series.segment_longest_run(mask=mask).tolist(), longest_runs)
+
+
+if __name__ == "__main__":
+    unittest.main()
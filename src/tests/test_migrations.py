@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import unittest
+from application import db
+from application.data_model import Aggregates
+from tests.app_test_case import AppTestCase
+
+
+class TestMigrations(AppTestCase):
+    # (station_id, year, month, day, max_temperature, min_temperature, precipitation)
+    legacy_readings = [
+        ("USC00110072", 1985, 1, 1, -2.2, -12.8, 0.94),
+        ("USC00110072", 1985, 1, 2, -12.2, -21.7, 0.0),
+        ("USC00110187", 1986, 7, 4, 30.6, 18.3, None),
+    ]
+
+    def database_preparer(self):
+        # 'readings' as created by the first version, without the 'aggregates' tables
+        connection = sqlite3.connect(self.database_path)
+        connection.execute(
+            "CREATE TABLE readings (reading_id VARCHAR(18) NOT NULL PRIMARY KEY, "
+            "station_id VARCHAR(11) NOT NULL, year INTEGER, month INTEGER, day INTEGER, "
+            "max_temperature FLOAT, min_temperature FLOAT, precipitation FLOAT)"
+        )
+        connection.execute(
+            "CREATE INDEX ix_readings_station_id ON readings (station_id)"
+        )
+        connection.executemany(
+            "INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    f"{station_id}{year}{month:02d}{day:02d}",
+                    station_id,
+                    year,
+                    month,
+                    day,
+                )
+                + tuple(measurements)
+                for station_id, year, month, day, *measurements in self.legacy_readings
+            ],
+        )
+        connection.commit()
+        connection.close()
+
+    def test_weather_date_filters(self):
+        # Running sums backfilled from the migrated records
+        self.assertEqual(db.session.query(Aggregates).count(), 2)
+        client = self.app.test_client()
+        for query_string, dates in (
+            ("date=19850101", [19850101]),
+            ("start=19850101&end=19851231", [19850101, 19850102]),
+            ("start=19860101", [19860704]),
+            ("station=USC00110187&date=19860704", [19860704]),
+        ):
+            response = client.get(f"/api/weather?{query_string}")
+            self.assertEqual(response.status_code, 200, query_string)
+            self.assertEqual(
+                [
+                    reading["year"] * 10000 + reading["month"] * 100 + reading["day"]
+                    for reading in response.get_json()["response"]
+                ],
+                dates,
+            )
+
+    def test_station_periods(self):
+        from application.analytics.station_utility import (
+            nearest_stations,
+            stations_loader,
+        )
+
+        file_path = os.path.join(self.root_directory, "ghcnd-stations.txt")
+        with open(file_path, "w") as outfile:
+            outfile.write(
+                "USC00110072  41.7500  -87.9000  210.0 IL ARGONNE NATL LAB\n"
+                "USC00110187  41.7833  -88.3333  189.0 IL AURORA\n"
+            )
+        stations_loader(file_path=file_path)
+        nearest = nearest_stations(
+            latitude=41.75, longitude=-87.9, count=2, with_records=True
+        )
+        # Periods of record come from the backfilled 'aggregates'
+        self.assertEqual(
+            [
+                (station["station_id"], station["first_year"], station["last_year"])
+                for station in nearest
+            ],
+            [("USC00110072", 1985, 1985), ("USC00110187", 1986, 1986)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from application.ingest.parser_utility import (
+    wx_data_csv_reader,
+    wx_data_mmap_reader,
+    wx_data_parser,
+    wx_data_reader,
+    readings_batcher,
+    records_builder,
+)
+
+
+class TestParserUtility(unittest.TestCase):
+    wx_data_lines = [
+        "19850101\t  -22\t -128\t   94\n",
+        "19850102\t -122\t -217\t    0\n",
+        "19850103\t-9999\t -244\t-9999\n",
+        "19850103\t   11\t  -78\t    0\n",
+    ]
+
+    def setUp(self):
+        self.temp_directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_directory.name, "USC00110072.txt")
+        with open(self.file_path, mode="w") as outfile:
+            outfile.writelines(self.wx_data_lines)
+
+    def tearDown(self):
+        self.temp_directory.cleanup()
+
+    def test_wx_data_parser(self):
+        readings_df = wx_data_parser(self.file_path, "USC00110072")
+        # Repeated dates keep their first occurrence
+        self.assertEqual(len(readings_df), 3)
+        self.assertEqual(readings_df["date"].to_list(), [19850101, 19850102, 19850103])
+        self.assertEqual(readings_df["station_id"].unique().tolist(), ["USC00110072"])
+
+    def test_wx_data_mmap_reader(self):
+        mmap_df, mmap_end_offset = wx_data_mmap_reader(self.file_path)
+        csv_df, csv_end_offset = wx_data_csv_reader(self.file_path)
+        self.assertTrue(mmap_df.equals(csv_df))
+        self.assertEqual(mmap_end_offset, csv_end_offset)
+        self.assertEqual(mmap_end_offset, os.path.getsize(self.file_path))
+
+    def test_wx_data_reader_tail(self):
+        _, end_offset = wx_data_reader(self.file_path)
+        # A partially written line is left for the next read
+        with open(self.file_path, mode="a") as outfile:
+            outfile.write("19850104\t   -5\t  -10\t    0\n19850105\t   1")
+        tail_df, tail_end_offset = wx_data_reader(self.file_path, end_offset)
+        self.assertEqual(tail_df.values.tolist(), [[19850104, -5, -10, 0]])
+        with open(self.file_path, mode="a") as outfile:
+            outfile.write("2\t    3\t    4\n")
+        tail_df, _ = wx_data_reader(self.file_path, tail_end_offset)
+        self.assertEqual(tail_df.values.tolist(), [[19850105, 12, 3, 4]])
+
+    def test_wx_data_reader_malformed_lines(self):
+        with open(self.file_path, mode="a") as outfile:
+            outfile.writelines(
+                ["19850104\t  1-2\t -128\t   94\n", self.wx_data_lines[0]]
+            )
+        with self.assertRaisesRegex(ValueError, r"byte offsets: \[108\]"):
+            wx_data_reader(self.file_path)
+        with self.assertRaisesRegex(ValueError, "not a line start"):
+            wx_data_reader(self.file_path, 5)
+
+    def test_records_builder(self):
+        records = records_builder(wx_data_parser(self.file_path, "USC00110072"))
+        # Measurements are stored as the raw wx_data integers
+        self.assertEqual(records[0], ("USC00110072", 19850101, -22, -128, 94))
+        self.assertEqual(
+            [type(value) for value in records[1]], [str, int, int, int, int]
+        )
+        # Missing value sentinel is stored as NULL
+        self.assertEqual(records[2], ("USC00110072", 19850103, None, -244, None))
+
+    def test_readings_batcher(self):
+        readings_df = wx_data_parser(self.file_path, "USC00110072")
+        batches = list(readings_batcher([readings_df, readings_df[:0], readings_df], 2))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 2])
+        self.assertEqual(
+            batches[1]["date"].to_list(),
+            [19850103, 19850101],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
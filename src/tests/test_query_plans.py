@@ -0,0 +1,77 @@
+import unittest
+from sqlalchemy import func, select, text, tuple_
+from application import db
+from application.data_model import Readings, readings_schema
+from tests.app_test_case import AppTestCase
+
+
+class TestQueryPlans(AppTestCase):
+    readings_filters = [
+        {"start": 20120101, "end": 20120101, "stations": None},
+        {"start": None, "end": None, "stations": ["USC00110072"]},
+        {"start": 20120101, "end": 20120101, "stations": ["USC00110072"]},
+        {"start": 20120101, "end": 20121231, "stations": None},
+        {"start": 20120101, "end": None, "stations": ["USC00110072", "USC00110187"]},
+    ]
+
+    def query_plan(self, statement):
+        compiled_statement = statement.compile(
+            dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+        return " | ".join(
+            row[-1]
+            for row in db.session.execute(
+                text(f"EXPLAIN QUERY PLAN {compiled_statement}")
+            )
+        )
+
+    def assert_index_seek(self, statement):
+        query_plan = self.query_plan(statement)
+        self.assertIn("SEARCH readings USING", query_plan)
+        self.assertNotIn("SCAN readings", query_plan)
+        # Rows come out of the primary key in (station, date) order
+        self.assertNotIn("TEMP B-TREE FOR ORDER BY", query_plan)
+
+    def test_readings_filters_use_index_seek(self):
+        from application.apis.weather_utils import (
+            readings_filter_builder,
+            schema_select,
+        )
+
+        for readings_filter in self.readings_filters:
+            with self.subTest(**readings_filter):
+                conditions = readings_filter_builder(**readings_filter)
+                # Offset paginated page, its total count and a keyset cursor page
+                self.assert_index_seek(
+                    schema_select(schema=readings_schema)
+                    .where(*conditions)
+                    .order_by(Readings.station_id, Readings.date)
+                    .limit(1000)
+                    .offset(1000)
+                )
+                self.assert_index_seek(
+                    select(func.count()).select_from(Readings).where(*conditions)
+                )
+                self.assert_index_seek(
+                    schema_select(schema=readings_schema)
+                    .where(
+                        *conditions,
+                        tuple_(Readings.station_id, Readings.date)
+                        > tuple_("USC00110072", 19850101),
+                    )
+                    .order_by(Readings.station_id, Readings.date)
+                    .limit(1001)
+                )
+
+    def test_partition_filter_uses_index_seek(self):
+        from application.analytics.stats_utility import partition_filter
+
+        self.assert_index_seek(
+            select(Readings.max_temperature).where(
+                *partition_filter(year=2012, station="USC00110072")
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+from urllib.parse import parse_qsl
+from werkzeug.datastructures import MultiDict
+from application.apis.response_cache import (
+    READINGS_COUNT_CACHE,
+    RESPONSE_CACHE,
+    cache_key_builder,
+    readings_cache_invalidator,
+    results_cache_invalidator,
+    scope_builder,
+)
+
+
+class TestResponseCache(unittest.TestCase):
+    # Query strings of the cached responses
+    scopes = {
+        "weather": ("/weather", ""),
+        "weather_station": ("/weather", "station=USC00110072"),
+        "weather_date": ("/weather", "date=20120101"),
+        "weather_date_station": ("/weather", "date=20120101&station=usc00110072"),
+        "weather_other_station": ("/weather", "station=USC00339312"),
+        "weather_range": ("/weather", "start=20121201&end=20130131"),
+        "weather_stations": ("/weather", "station=USC00339312,USC00110072"),
+        "stats": ("/weather/stats", ""),
+        "stats_year_station": ("/weather/stats", "year=2012&station=USC00110072"),
+        "stats_other_year": ("/weather/stats", "year=1990"),
+        "stats_stations": ("/weather/stats", "station=USC00339312,USC00110072"),
+    }
+
+    def setUp(self):
+        RESPONSE_CACHE.clear()
+        for name, (endpoint, query_string) in self.scopes.items():
+            RESPONSE_CACHE.set(
+                cache_key=name,
+                entry={
+                    "scope": scope_builder(
+                        endpoint=endpoint,
+                        request_args=MultiDict(parse_qsl(query_string)),
+                    ),
+                    "body": b"{}",
+                },
+                max_entries=100,
+                max_bytes=1024,
+            )
+
+    def tearDown(self):
+        RESPONSE_CACHE.clear()
+
+    def test_cache_key_builder(self):
+        self.assertEqual(
+            cache_key_builder(
+                "/weather", MultiDict({"station": "usc00110072", "page": "01"})
+            ),
+            cache_key_builder(
+                "/weather", MultiDict({"page": "1", "station": "USC00110072"})
+            ),
+        )
+
+    def test_lru_eviction(self):
+        RESPONSE_CACHE.get("weather")
+        RESPONSE_CACHE.set(
+            cache_key="new",
+            entry={"body": b"{}"},
+            max_entries=len(self.scopes),
+            max_bytes=1024,
+        )
+        # The least recently used entry is evicted, the entry just read is kept
+        self.assertIsNone(RESPONSE_CACHE.get("weather_station"))
+        self.assertIsNotNone(RESPONSE_CACHE.get("weather"))
+        self.assertEqual(RESPONSE_CACHE.counters()["evictions"], 1)
+
+    def test_size_eviction(self):
+        self.assertEqual(RESPONSE_CACHE.counters()["bytes"], 2 * len(self.scopes))
+        RESPONSE_CACHE.get("weather")
+        RESPONSE_CACHE.set(
+            cache_key="large",
+            entry={"body": b"x" * 16},
+            max_entries=100,
+            max_bytes=2 * len(self.scopes) + 10,
+        )
+        # Least recently used entries are evicted until the bodies fit in max_bytes
+        self.assertEqual(RESPONSE_CACHE.counters()["evictions"], 3)
+        self.assertNotIn("weather_station", RESPONSE_CACHE.entries)
+        self.assertIn("weather", RESPONSE_CACHE.entries)
+        self.assertEqual(RESPONSE_CACHE.counters()["bytes"], 2 * len(self.scopes) + 10)
+
+    def test_readings_cache_invalidator(self):
+        evicted = readings_cache_invalidator(
+            touched_dates={"USC00110072": (20120102, 20121231)}
+        )
+        self.assertEqual(evicted, 4)
+        remaining = set(RESPONSE_CACHE.entries)
+        self.assertNotIn("weather", remaining)
+        self.assertNotIn("weather_station", remaining)
+        self.assertNotIn("weather_range", remaining)
+        self.assertNotIn("weather_stations", remaining)
+        self.assertIn("weather_date", remaining)
+        self.assertIn("weather_date_station", remaining)
+        self.assertIn("weather_other_station", remaining)
+        self.assertIn("stats", remaining)
+        # A range ending before the touched dates is kept
+        self.assertEqual(
+            readings_cache_invalidator(
+                touched_dates={"USC00339312": (20130201, 20130301)}
+            ),
+            1,
+        )
+        self.assertIn("weather_date", RESPONSE_CACHE.entries)
+
+    def test_results_cache_invalidator(self):
+        evicted = results_cache_invalidator(partitions={(2012, "USC00110072")})
+        self.assertEqual(evicted, 3)
+        self.assertNotIn("stats_stations", RESPONSE_CACHE.entries)
+        self.assertIn("stats_other_year", RESPONSE_CACHE.entries)
+        self.assertIn("weather", RESPONSE_CACHE.entries)
+        self.assertEqual(results_cache_invalidator(partitions=None), 1)
+
+    def test_readings_count_cache_bounds(self):
+        READINGS_COUNT_CACHE.clear()
+        for count_key in range(5):
+            READINGS_COUNT_CACHE.set(
+                count_key=count_key, count=count_key, max_age=60, max_entries=3
+            )
+        # The oldest counts are evicted beyond max_entries
+        self.assertEqual(list(READINGS_COUNT_CACHE.counts), [2, 3, 4])
+        self.assertEqual(READINGS_COUNT_CACHE.get(count_key=4, max_age=60), 4)
+        # Expired counts are not served and are pruned on the next set
+        self.assertIsNone(READINGS_COUNT_CACHE.get(count_key=4, max_age=0))
+        READINGS_COUNT_CACHE.set(count_key=5, count=5, max_age=0, max_entries=3)
+        self.assertEqual(len(READINGS_COUNT_CACHE.counts), 0)
+        READINGS_COUNT_CACHE.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+from application.analytics.rollup_utility import (
+    full_months_splitter,
+    month_index,
+    window_keys,
+    window_label,
+)
+
+
+class TestRollupUtility(unittest.TestCase):
+    def test_full_months_splitter(self):
+        self.assertEqual(
+            full_months_splitter(start_date=19900101, end_date=19921231),
+            ((199001, 199212), []),
+        )
+        self.assertEqual(
+            full_months_splitter(start_date=19900115, end_date=19920229),
+            ((199002, 199202), [(19900115, 19900131)]),
+        )
+        self.assertEqual(
+            full_months_splitter(start_date=19901215, end_date=19920310),
+            ((199101, 199202), [(19901215, 19901231), (19920301, 19920310)]),
+        )
+        self.assertEqual(
+            full_months_splitter(start_date=None, end_date=19920310),
+            ((None, 199202), [(19920301, 19920310)]),
+        )
+        # Both edges within a single month are read once
+        self.assertEqual(
+            full_months_splitter(start_date=20010117, end_date=20010123),
+            (None, [(20010117, 20010123)]),
+        )
+        self.assertEqual(
+            full_months_splitter(start_date=20010117, end_date=20010213),
+            (None, [(20010117, 20010131), (20010201, 20010213)]),
+        )
+
+    def test_window_keys(self):
+        month_indexes = np.arange(month_index(199011), month_index(199104) + 1)
+        season_keys = window_keys(window="season", month_indexes=month_indexes)
+        self.assertEqual(
+            [window_label(window="season", window_key=key) for key in season_keys],
+            ["1990-SON", "1991-DJF", "1991-DJF", "1991-DJF", "1991-MAM", "1991-MAM"],
+        )
+        self.assertEqual(
+            window_keys(window="month", month_indexes=month_indexes).tolist(),
+            [199011, 199012, 199101, 199102, 199103, 199104],
+        )
+        self.assertEqual(
+            window_keys(window="year", month_indexes=month_indexes).tolist(),
+            [1990, 1990, 1991, 1991, 1991, 1991],
+        )
+        self.assertEqual(
+            window_label(
+                window="range", window_key=0, start_date=19900101, end_date=None
+            ),
+            "19900101-",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
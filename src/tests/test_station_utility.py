@@ -0,0 +1,122 @@
+import os
+import unittest
+import numpy as np
+from tests.app_test_case import AppTestCase
+
+
+class TestStationUtility(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_path = os.path.join(self.root_directory, "ghcnd-stations.txt")
+
+    def test_ghcnd_stations_parser(self):
+        from application.analytics.station_utility import ghcnd_stations_parser
+
+        with open(self.file_path, "w") as outfile:
+            outfile.write(
+                "USC00110072  41.7500  -87.9000  210.0 IL ARGONNE NATL LAB\n"
+                "ASN00008255 -32.3000  115.7000 -999.9    SUMMERHILL\n\n"
+            )
+        self.assertEqual(
+            ghcnd_stations_parser(file_path=self.file_path),
+            [
+                {
+                    "station_id": "USC00110072",
+                    "latitude": 41.75,
+                    "longitude": -87.9,
+                    "elevation": 210.0,
+                    "state": "IL",
+                    "name": "ARGONNE NATL LAB",
+                },
+                {
+                    "station_id": "ASN00008255",
+                    "latitude": -32.3,
+                    "longitude": 115.7,
+                    "elevation": None,
+                    "state": None,
+                    "name": "SUMMERHILL",
+                },
+            ],
+        )
+        with open(self.file_path, "a") as outfile:
+            outfile.write("USC00110187  95.0000  -87.9000  210.0 IL OUT OF RANGE\n")
+        with self.assertRaises(ValueError):
+            ghcnd_stations_parser(file_path=self.file_path)
+
+    def test_nearest_and_bbox_stations(self):
+        from application.analytics.station_utility import (
+            STATION_INDEX,
+            bbox_stations,
+            haversine_distances,
+            nearest_stations,
+            stations_loader,
+        )
+
+        random_generator = np.random.default_rng(seed=0)
+        latitudes = np.degrees(np.arcsin(random_generator.uniform(-1, 1, size=2000)))
+        longitudes = random_generator.uniform(-180, 180, size=2000)
+        # Stations at the poles and on the antimeridian
+        latitudes[:4] = [90.0, -90.0, 10.0, -10.0]
+        longitudes[:4] = [0.0, 0.0, 180.0, -180.0]
+        with open(self.file_path, "w") as outfile:
+            for position, (latitude, longitude) in enumerate(
+                zip(latitudes, longitudes)
+            ):
+                outfile.write(
+                    f"TST{position:08d} {latitude:8.4f} {longitude:9.4f} -999.9\n"
+                )
+        self.assertEqual(stations_loader(file_path=self.file_path), 2000)
+        grid = STATION_INDEX.get()["all"]
+        self.assertEqual(len(STATION_INDEX.get()["with_records"]["stations"]), 0)
+        station_ids = np.array([station["station_id"] for station in grid["stations"]])
+
+        for latitude, longitude, count in (
+            (41.9, -87.6, 5),
+            (89.5, 120.0, 3),
+            (-5.0, 179.9, 10),
+            (0.0, -180.0, 1),
+        ):
+            distances = haversine_distances(
+                latitude=latitude,
+                longitude=longitude,
+                latitudes=grid["latitudes"],
+                longitudes=grid["longitudes"],
+            )
+            nearest = nearest_stations(
+                latitude=latitude,
+                longitude=longitude,
+                count=count,
+                with_records=False,
+            )
+            self.assertEqual(
+                [station["station_id"] for station in nearest],
+                station_ids[np.argsort(distances, kind="stable")[:count]].tolist(),
+            )
+        self.assertEqual(
+            nearest_stations(latitude=0.0, longitude=0.0, count=5, with_records=True),
+            [],
+        )
+
+        for south, west, north, east in ((30, -100, 45, -80), (-20, 170, 20, -170)):
+            inside = (grid["latitudes"] >= south) & (grid["latitudes"] <= north)
+            if west <= east:
+                inside &= (grid["longitudes"] >= west) & (grid["longitudes"] <= east)
+            else:
+                inside &= (grid["longitudes"] >= west) | (grid["longitudes"] <= east)
+            self.assertEqual(
+                [
+                    station["station_id"]
+                    for station in bbox_stations(
+                        south=south,
+                        west=west,
+                        north=north,
+                        east=east,
+                        with_records=False,
+                    )
+                ],
+                sorted(station_ids[inside].tolist()),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import gzip
+import os
+import tempfile
+import unittest
+import zipfile
+from flask import Flask
+from application.ingest.upload_utility import (
+    WxDataUploadStream,
+    staged_uploads_publisher,
+    upload_staging_directory,
+)
+
+
+class TestWxDataUploadStream(unittest.TestCase):
+    wx_data_content = (
+        b"19850101\t  -22\t -128\t   94\n"
+        b"19850102\t -122\t -217\t    0\n"
+        b"19850103\t -106\t -244\t    0\n"
+    )
+
+    def setUp(self):
+        self.temp_directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_directory.cleanup()
+
+    def upload_streamer(self, file_name, content, chunk_size=10):
+        """
+        Writes 'content' into a WxDataUploadStream 'chunk_size' bytes at a time
+        Returns (WxDataUploadStream object, error message)
+        """
+        upload_stream = WxDataUploadStream(
+            staging_directory=self.temp_directory.name, file_name=file_name
+        )
+        for start in range(0, len(content), chunk_size):
+            upload_stream.write(content[start : start + chunk_size])
+        return upload_stream, WxDataUploadStream.finish(self=upload_stream)
+
+    def test_txt_and_gz_uploads(self):
+        for file_name, content in (
+            ("USC00110072.txt", self.wx_data_content),
+            ("USC00110072.txt.gz", gzip.compress(self.wx_data_content)),
+        ):
+            upload_stream, error = self.upload_streamer(file_name, content)
+            self.assertIsNone(error)
+            self.assertEqual(upload_stream.target_name, "USC00110072.txt")
+            with open(upload_stream.staged_path, "rb") as staged_file:
+                self.assertEqual(staged_file.read(), self.wx_data_content)
+
+    def test_malformed_uploads(self):
+        # Malformed second line split across chunks
+        malformed_content = self.wx_data_content.replace(b" -122", b" -1x2")
+        upload_stream, error = self.upload_streamer(
+            "USC00110072.txt", malformed_content
+        )
+        self.assertEqual(error, "malformed wx_data line at byte offset 27")
+        self.assertFalse(os.path.exists(upload_stream.staged_path))
+
+        _, error = self.upload_streamer(
+            "USC00110072.txt.gz", gzip.compress(self.wx_data_content)[:-12]
+        )
+        self.assertEqual(error, "truncated gzip stream")
+        _, error = self.upload_streamer("USC00110072.csv", self.wx_data_content)
+        self.assertIn("unsupported file type", error)
+        self.assertEqual(os.listdir(self.temp_directory.name), [])
+
+    def test_failed_publish_discards_staged_uploads(self):
+        app = Flask(__name__)
+        app.config["WX_DATA_DIR"] = self.temp_directory.name
+        with app.app_context():
+            staging_directory = upload_staging_directory()
+            upload_stream = WxDataUploadStream(
+                staging_directory=staging_directory, file_name="USC00110072.txt"
+            )
+            upload_stream.write(self.wx_data_content)
+            WxDataUploadStream.finish(self=upload_stream)
+            archive_path = f"{staging_directory}/archive.zip"
+            with zipfile.ZipFile(archive_path, "w") as archive:
+                archive.writestr("USC00110187.txt", self.wx_data_content)
+                archive.writestr("USC00110338.txt", b"19850101\t  -22\n")
+            with self.assertRaises(ValueError):
+                staged_uploads_publisher(
+                    staged_files=[
+                        (upload_stream.staged_path, upload_stream.target_name),
+                        (archive_path, "archive.zip"),
+                    ]
+                )
+            self.assertEqual(os.listdir(staging_directory), [])
+            self.assertEqual(os.listdir(self.temp_directory.name), [".uploads"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import json
+import time
+import unittest
+from application import db
+from application.data_model import Jobs
+from application.ingest.watcher_utility import PollingReader, WatcherUtility
+from application.jobs.job_queue import job_enqueuer, job_finisher
+from tests.app_test_case import AppTestCase
+
+
+class TestWatcherUtility(AppTestCase):
+    def config_overrides(self):
+        return {
+            "WX_DATA_WATCHER_DEBOUNCE_SECONDS": 1.0,
+            "WX_DATA_WATCHER_MAX_DELAY_SECONDS": 10.0,
+            "WX_DATA_WATCHER_MAX_BATCH_FILES": 2,
+        }
+
+    def setUp(self):
+        super().setUp()
+        self.watcher_object = WatcherUtility(app=self.app)
+
+    def tearDown(self):
+        WatcherUtility.close_logger(self=self.watcher_object)
+        super().tearDown()
+
+    def wx_data_file_writer(self, file_name):
+        with open(f"{self.wx_data_directory}/{file_name}", "w") as outfile:
+            outfile.write("19850101\t  -22\t -128\t   94\n")
+
+    def test_micro_batch_debounce_and_cap(self):
+        for file_name in ("USC00110072.txt", "USC00110187.txt", "USC00110338.txt"):
+            self.wx_data_file_writer(file_name=file_name)
+        WatcherUtility.pending_files_adder(
+            self=self.watcher_object,
+            file_names=[
+                "USC00110072.txt",
+                "USC00110187.txt",
+                "USC00110338.txt",
+                ".USC00110072.txt.part",
+                "notes.md",
+            ],
+        )
+        self.assertEqual(len(self.watcher_object.pending_files), 3)
+        # Still being written
+        self.assertEqual(
+            WatcherUtility.micro_batch_selector(self=self.watcher_object), []
+        )
+
+        now = time.monotonic()
+        self.watcher_object.pending_files = {
+            "USC00110338.txt": (now - 5, now - 2),
+            "USC00110072.txt": (now - 3, now - 2),
+            "USC00110187.txt": (now - 4, now - 2),
+        }
+        # Quiet for longer than the debounce period: oldest changes first, capped
+        self.assertEqual(
+            WatcherUtility.micro_batch_selector(self=self.watcher_object),
+            ["USC00110187.txt", "USC00110338.txt"],
+        )
+        self.assertEqual(list(self.watcher_object.pending_files), ["USC00110072.txt"])
+
+        # Continuous writes cannot hold a file past the maximum delay
+        self.watcher_object.pending_files["USC00110072.txt"] = (now - 11, now)
+        self.assertEqual(
+            WatcherUtility.micro_batch_selector(self=self.watcher_object),
+            ["USC00110072.txt"],
+        )
+
+    def test_failed_micro_batch_backoff(self):
+        self.wx_data_file_writer(file_name="USC00110072.txt")
+        WatcherUtility.pending_files_restorer(
+            self=self.watcher_object, file_names=["USC00110072.txt"]
+        )
+        first_change_time, _ = self.watcher_object.pending_files["USC00110072.txt"]
+        self.assertGreater(first_change_time, time.monotonic())
+        # Backing off: not due although past the maximum delay of other files
+        self.assertEqual(
+            WatcherUtility.micro_batch_selector(self=self.watcher_object), []
+        )
+
+        now = time.monotonic()
+        self.watcher_object.pending_files["USC00110072.txt"] = (now - 11, now - 11)
+        self.assertEqual(
+            WatcherUtility.micro_batch_selector(self=self.watcher_object),
+            ["USC00110072.txt"],
+        )
+        # A second failure doubles the backoff
+        WatcherUtility.pending_files_restorer(
+            self=self.watcher_object, file_names=["USC00110072.txt"]
+        )
+        retry_time, _ = self.watcher_object.pending_files["USC00110072.txt"]
+        self.assertGreater(retry_time, time.monotonic() + 1.5)
+        self.assertEqual(self.watcher_object.failed_files, {"USC00110072.txt": 2})
+
+    def test_micro_batch_enqueuer(self):
+        for file_name in ("USC00110072.txt", "USC00110187.txt"):
+            self.wx_data_file_writer(file_name=file_name)
+        self.watcher_object.failed_files = {"USC00110072.txt": 1}
+        with self.app.app_context():
+            for _ in range(2):
+                WatcherUtility.micro_batch_enqueuer(
+                    self=self.watcher_object,
+                    ingestion_files=["USC00110072.txt", "USC00110187.txt"],
+                )
+            # The same micro-batch queued twice shares one pending job
+            jobs = db.session.query(Jobs).all()
+            self.assertEqual(len(jobs), 1)
+            self.assertEqual(jobs[0].job_type, "ingestion")
+            self.assertEqual(jobs[0].state, "pending")
+            self.assertEqual(
+                json.loads(jobs[0].params)["ingestion_files"],
+                ["USC00110072.txt", "USC00110187.txt"],
+            )
+            db.session.remove()
+        self.assertEqual(self.watcher_object.failed_files, {})
+
+    def test_micro_batch_backpressure(self):
+        self.wx_data_file_writer(file_name="USC00110072.txt")
+        for ingestion_files in (["USC00110187.txt"], ["USC00110338.txt"]):
+            job_id = job_enqueuer(
+                job_type="ingestion", params={"ingestion_files": ingestion_files}
+            )
+        now = time.monotonic()
+        self.watcher_object.pending_files = {"USC00110072.txt": (now - 5, now - 2)}
+        # Two ingestion jobs queued: the due file stays pending
+        self.assertEqual(
+            WatcherUtility.micro_batch_selector(self=self.watcher_object), []
+        )
+        self.assertIn("USC00110072.txt", self.watcher_object.pending_files)
+        self.assertTrue(self.watcher_object.queue_full)
+
+        job_finisher(job_id=job_id)
+        self.assertEqual(
+            WatcherUtility.micro_batch_selector(self=self.watcher_object),
+            ["USC00110072.txt"],
+        )
+        self.assertFalse(self.watcher_object.queue_full)
+
+    def test_polling_reader(self):
+        self.wx_data_file_writer(file_name="USC00110072.txt")
+        polling_reader = PollingReader(directory=self.wx_data_directory, poll_seconds=0)
+        self.assertEqual(polling_reader.read(timeout=0), (set(), False))
+        self.wx_data_file_writer(file_name="USC00110187.txt")
+        with open(f"{self.wx_data_directory}/USC00110072.txt", "a") as outfile:
+            outfile.write("19850102\t -122\t -217\t    0\n")
+        self.assertEqual(
+            polling_reader.read(timeout=0),
+            ({"USC00110072.txt", "USC00110187.txt"}, False),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
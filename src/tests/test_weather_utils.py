@@ -1,5 +1,10 @@
 import requests
 import unittest
+import pandas as pd
+from sqlalchemy import insert
+from application import db
+from application.data_model import Readings, Results
+from tests.app_test_case import AppTestCase
 
 
 class TestWeatherUtils(unittest.TestCase):
@@ -169,5 +174,126 @@ class TestWeatherUtils(unittest.TestCase):
         self.assertEqual(self.response_status_code, 404)
 
 
+class TestWeatherUtilsClient(AppTestCase):
+    """
+    Requests the weather APIs of a test app through its test client
+    """
+
+    def setUp(self):
+        super().setUp()
+        # 1500 consecutive days of one station, more than a page of 1000 records
+        db.session.execute(
+            insert(Readings.__table__),
+            [
+                {
+                    "station_id": "USC00110072",
+                    "date": int(date.strftime("%Y%m%d")),
+                    "max_temperature": -22,
+                    "min_temperature": -128,
+                    "precipitation": 94,
+                }
+                for date in pd.date_range("2011-01-01", periods=1500)
+            ],
+        )
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def test_apiweather_cursor_get(self):
+        # First page of a cursor paginated response
+        self.response = self.client.get(
+            "/api/weather?cursor=&station=USC00110072&count=true"
+        )
+        self.assertEqual(self.response.status_code, 200)
+        first_page = self.response.get_json()
+        self.assertEqual(len(first_page["response"]), 1000)
+        self.assertIsNotNone(first_page["next_cursor"])
+        self.assertEqual(first_page["output_count"], 1500)
+
+        # Next page continues after the last reading_id of the previous page
+        self.response = self.client.get(
+            "/api/weather",
+            query_string={
+                "cursor": first_page["next_cursor"],
+                "station": "USC00110072",
+            },
+        )
+        self.assertEqual(self.response.status_code, 200)
+        next_page = self.response.get_json()
+        self.assertEqual(len(next_page["response"]), 500)
+        self.assertGreater(
+            next_page["response"][0]["reading_id"],
+            first_page["response"][-1]["reading_id"],
+        )
+
+        # Other Response Codes
+        self.response = self.client.get("/api/weather?cursor=@@@")
+        self.assertEqual(self.response.status_code, 400)
+        self.response = self.client.get("/api/weather?cursor=&station=USC12345678")
+        self.assertEqual(self.response.status_code, 404)
+
+    def test_apiweatherexport_get(self):
+        # NDJSON export of a single station
+        self.response = self.client.get(
+            "/api/weather/export?station=USC00110072&date=20120101"
+        )
+        self.assertEqual(self.response.status_code, 200)
+        self.assertEqual(len(self.response.get_data(as_text=True).splitlines()), 1)
+
+        # CSV export starts with a header row
+        self.response = self.client.get(
+            "/api/weather/export?station=USC00110072&format=csv"
+        )
+        self.assertEqual(self.response.status_code, 200)
+        csv_lines = self.response.get_data(as_text=True).splitlines()
+        self.assertTrue(csv_lines[0].startswith("reading_id,station_id,"))
+        self.assertEqual(len(csv_lines), 1501)
+
+        # Other Response Codes
+        self.response = self.client.get("/api/weather/export?format=xml")
+        self.assertEqual(self.response.status_code, 400)
+
+    def test_apiweatherstats_get(self):
+        db.session.execute(
+            insert(Results),
+            [
+                {
+                    "result_id": f"{year}USC00110072",
+                    "year": year,
+                    "station_id": "USC00110072",
+                }
+                for year in (2011, 2012)
+            ],
+        )
+        db.session.commit()
+        # Every combination of filters goes through the same conditions
+        for query_string, years in (
+            ("", [2011, 2012]),
+            ("year=2012", [2012]),
+            ("station=usc00110072", [2011, 2012]),
+            ("station=USC00110072&year=2011&page=1", [2011]),
+        ):
+            self.response = self.client.get(f"/api/weather/stats?{query_string}")
+            self.assertEqual(self.response.status_code, 200, query_string)
+            self.assertEqual(
+                sorted(
+                    result["year"] for result in self.response.get_json()["response"]
+                ),
+                years,
+            )
+
+        # Other Response Codes
+        self.response = self.client.get(
+            "/api/weather/stats?station=USC00110072&year=2023"
+        )
+        self.assertEqual(self.response.status_code, 404)
+        self.assertEqual(
+            self.response.get_json()["message"],
+            "Records for given year and station could not be found",
+        )
+        for query_string in ("year=201", "year=20a2", "station=USC001100"):
+            self.response = self.client.get(f"/api/weather/stats?{query_string}")
+            self.assertEqual(self.response.status_code, 400, query_string)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from application.analytics.yield_utility import yield_regressions, yld_data_parser
+
+
+class TestYieldUtility(unittest.TestCase):
+    def test_yld_data_parser(self):
+        with tempfile.TemporaryDirectory() as temp_directory:
+            file_path = os.path.join(temp_directory, "US_corn_grain_yield.txt")
+            with open(file_path, "w") as outfile:
+                outfile.write("1985\t225447\n1986\t208944\n\n")
+            self.assertEqual(
+                yld_data_parser(file_path=file_path),
+                [
+                    {"year": 1985, "corn_grain_yield": 225447},
+                    {"year": 1986, "corn_grain_yield": 208944},
+                ],
+            )
+            with open(file_path, "a") as outfile:
+                outfile.write("1987\t-\n")
+            with self.assertRaises(ValueError):
+                yld_data_parser(file_path=file_path)
+
+    def test_yield_regressions(self):
+        random_generator = np.random.default_rng(seed=0)
+        yields = random_generator.normal(200000, 20000, size=12)
+        statistics = random_generator.normal(15, 3, size=(2, 3, 12))
+        # Missing statistics, too few years and a constant statistic
+        statistics[0, 1, [2, 5]] = np.nan
+        statistics[1, 1, 3:] = np.nan
+        statistics[1, 2] = 10.0
+        regressions = yield_regressions(statistics=statistics, yields=yields)
+
+        for metric_index, series_index in ((0, 0), (0, 1), (1, 0)):
+            series = statistics[metric_index, series_index]
+            known = ~np.isnan(series)
+            slope, intercept = np.polyfit(series[known], yields[known], 1)
+            self.assertEqual(
+                regressions["years_count"][metric_index, series_index], known.sum()
+            )
+            self.assertAlmostEqual(
+                regressions["correlation"][metric_index, series_index],
+                np.corrcoef(series[known], yields[known])[0, 1],
+            )
+            self.assertAlmostEqual(
+                regressions["slope"][metric_index, series_index], slope, places=4
+            )
+            self.assertAlmostEqual(
+                regressions["intercept"][metric_index, series_index],
+                intercept,
+                places=2,
+            )
+        self.assertEqual(regressions["years_count"][1, 1], 3)
+        self.assertFalse(np.isnan(regressions["correlation"][1, 1]))
+        self.assertTrue(np.isnan(regressions["correlation"][1, 2]))
+        self.assertTrue(np.isnan(regressions["slope"][1, 2]))
+
+
+if __name__ == "__main__":
+    unittest.main()